@@ -4,7 +4,7 @@ AI服务API：提供RAG检索、知识问答等AI功能
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import List
+from typing import List, Dict, Optional
 from app.database.connection import get_db
 from app.api.auth import get_current_user
 from app.models.user import User
@@ -36,10 +36,17 @@ class QuestionRequest(BaseModel):
     question: str
     position_category: str = None
 
+class BatchSearchRequest(BaseModel):
+    """批量检索请求模型"""
+    queries: List[str]
+    position_category: Optional[str] = None
+    top_k: int = 5
+
 class AnswerResponse(BaseModel):
     """答案响应模型"""
     answer: str
     sources: List[dict] = []
+    trace: Dict = {}
 
 @router.post("/ask", response_model=AnswerResponse)
 async def ask_question(
@@ -58,24 +65,14 @@ async def ask_question(
         else:
             primary_position = request.position_category or ""
 
-        answer = rag_service.generate_answer_with_context(
+        # 一次检索同时用于生成答案和返回来源
+        result = rag_service.answer_question(
             question=request.question,
             position_category=primary_position,
             db=db
         )
 
-        # 检索相关文档
-        sources = rag_service.search_knowledge(
-            query=request.question,
-            position_category=primary_position,
-            db=db,
-            top_k=3
-        )
-
-        return {
-            "answer": answer,
-            "sources": sources
-        }
+        return result
     except Exception as e:
         print(f"RAG服务错误: {e}")
         # 如果RAG失败，使用LLM直接回答
@@ -117,4 +114,31 @@ async def generate_custom_questions(
         position=primary_position,
         count=count
     )
-    return {"questions": questions}
\ No newline at end of file
+    return {"questions": questions}
+
+@router.post("/search-batch")
+async def search_knowledge_batch(
+    request: BatchSearchRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """批量检索知识库：一次请求为多个查询返回各自的相关段落"""
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="查询不能为空")
+    if len(request.queries) > 32:
+        raise HTTPException(status_code=400, detail="单次最多检索32个查询")
+
+    results = get_rag_service().search_knowledge_batch(
+        request.queries,
+        position_category=request.position_category,
+        db=db,
+        top_k=min(max(request.top_k, 1), 20)
+    )
+    return {
+        "results": [{"query": query, "documents": documents} for query, documents in zip(request.queries, results)]
+    }
+
+@router.get("/rag-stats")
+async def get_rag_stats(current_user: User = Depends(get_current_user)):
+    """获取RAG服务运行指标（缓存命中率等）"""
+    return get_rag_service().get_stats()
\ No newline at end of file
@@ -183,6 +183,11 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    if settings.GREETING_PREWARM_ENABLED:
+        # 后台预生成各模块的欢迎消息，进入对话页面时直接命中缓存
+        from app.api.chat import get_chat_service
+        get_chat_service().prewarm_greetings(user.id)
+
     access_token = create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
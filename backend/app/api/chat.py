@@ -24,6 +24,12 @@ def get_chat_service():
     return _chat_service
 
 
+def close_chat_service():
+    """服务停止时写入缓冲中的对话消息"""
+    if _chat_service is not None:
+        _chat_service.close()
+
+
 class ChatMessageRequest(BaseModel):
     """对话消息请求"""
     message: str
@@ -36,6 +42,7 @@ class ChatMessageResponse(BaseModel):
     response: str
     session_id: str
     intent: str
+    intents: List[Dict] = []
     recommendations: List[Dict] = []
     suggested_actions: List[str] = []
 
@@ -88,6 +95,7 @@ async def send_message(
             "response": response,
             "session_id": session_id,
             "intent": metadata.get("intent", "general"),
+            "intents": metadata.get("intents", []),
             "recommendations": metadata.get("recommendations", []),
             "suggested_actions": metadata.get("suggested_actions", [])
         }
@@ -106,24 +114,16 @@ async def get_greeting(
         chat_service = get_chat_service()
         greeting = chat_service.generate_greeting(current_user, db, context_type)
 
-        # 创建新会话
+        # 创建新会话，与欢迎消息在同一事务中提交
         session_id = chat_service.get_or_create_session(
             current_user.id,
             context_type,
-            db
+            db,
+            commit=False
         )
 
-        # 保存欢迎消息
-        from app.models.chat import ChatMessage
-        welcome_msg = ChatMessage(
-            user_id=current_user.id,
-            session_id=session_id,
-            role="assistant",
-            content=greeting,
-            meta_data={"type": "greeting"}
-        )
-        db.add(welcome_msg)
-        db.commit()
+        # 保存欢迎消息（重复打开页面时不重复写入）
+        chat_service.save_greeting(current_user.id, session_id, greeting, db)
 
         return {
             "message": greeting,
@@ -136,14 +136,16 @@ async def get_greeting(
 @router.get("/history/{session_id}")
 async def get_history(
         session_id: str,
+        before_id: Optional[int] = None,
+        limit: int = 20,
         current_user: User = Depends(get_current_user),
         db: Session = Depends(get_db)
 ):
-    """获取对话历史"""
+    """获取对话历史（按消息id向前翻页，before_id 为上一页返回的 next_cursor）"""
     try:
         chat_service = get_chat_service()
-        history = chat_service.get_conversation_history(session_id, db=db)
-        return {"history": history}
+        history, next_cursor = chat_service.history.get_page(session_id, before_id, max(1, min(limit, 100)), db)
+        return {"history": history, "next_cursor": next_cursor, "has_more": next_cursor is not None}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取历史失败: {str(e)}")
 
@@ -151,32 +153,47 @@ async def get_history(
 @router.get("/sessions")
 async def get_sessions(
         context_type: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 20,
         current_user: User = Depends(get_current_user),
         db: Session = Depends(get_db)
 ):
-    """获取用户的会话列表"""
+    """获取用户的会话列表（按最后活跃时间倒序分页，cursor 为上一页返回的 next_cursor）"""
     try:
-        query = db.query(ChatSession).filter(ChatSession.user_id == current_user.id)
-        if context_type:
-            query = query.filter(ChatSession.context_type == context_type)
+        chat_service = get_chat_service()
+        sessions, next_cursor = chat_service.list_sessions(
+            current_user.id,
+            context_type,
+            cursor,
+            max(1, min(limit, 100)),
+            db
+        )
+        return {"sessions": sessions, "next_cursor": next_cursor, "has_more": next_cursor is not None}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取会话列表失败: {str(e)}")
 
-        sessions = query.order_by(ChatSession.updated_at.desc()).all()
 
-        return {
-            "sessions": [
-                {
-                    "id": s.id,
-                    "session_id": s.session_id,
-                    "name": s.summary or "未命名会话",
-                    "context_type": s.context_type,
-                    "created_at": s.created_at.isoformat(),
-                    "updated_at": s.updated_at.isoformat()
-                }
-                for s in sessions
-            ]
-        }
+@router.get("/search")
+def search_messages(
+        q: str,
+        session_id: Optional[str] = None,
+        limit: int = 20,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    """
+    检索当前用户的对话消息，返回按相关度排序的命中消息和高亮片段（highlights 为片段内的字符区间）
+
+    首次检索时索引在后台构建，未完成时返回 status="building" 和空结果，客户端稍后重试
+    （普通函数，由FastAPI在线程池中执行，检索和读取片段不阻塞事件循环）
+    """
+    try:
+        chat_service = get_chat_service()
+        return chat_service.search.search(current_user.id, q, db, limit=max(1, min(limit, 50)), session_id=session_id)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取会话列表失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"检索对话失败: {str(e)}")
 
 
 @router.post("/save-session")
@@ -237,4 +254,10 @@ async def update_analytics(
         chat_service.update_learning_analytics(current_user.id, interview_id, db)
         return {"message": "分析已更新"}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"更新分析失败: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"更新分析失败: {str(e)}")
+
+
+@router.get("/stats")
+async def get_chat_stats(current_user: User = Depends(get_current_user)):
+    """获取对话服务运行指标（缓存命中率、各意图命中次数等）"""
+    return get_chat_service().get_stats()
@@ -119,6 +119,7 @@ async def generate_resume_questions(
         from app.models.resume import Resume
         from app.models.user_preference import UserPreference
         from app.services.personalization_service import PersonalizationService
+        from app.services.resume_service import resume_snippet
 
         # 获取简历
         resume = db.query(Resume).filter(
@@ -137,10 +138,11 @@ async def generate_resume_questions(
         # 生成问题
         personalization_service = PersonalizationService()
         questions = personalization_service.generate_personalized_questions(
-            resume.parsed_data or {},
+            resume_snippet(resume, db),
             preference,
             count
         )
+        db.commit()
 
         return {"questions": questions}
     except Exception as e:
@@ -25,8 +25,80 @@ class Settings(BaseSettings):
 
     # RAG配置
     EMBEDDING_MODEL: str = "text2vec-base-chinese"  # 使用中文embedding模型
+    EMBEDDING_MODEL_PATH: Optional[str] = None  # 本地模型目录，优先于EMBEDDING_MODEL加载
+    EMBEDDING_ALLOW_DOWNLOAD: bool = True  # 本地没有模型时是否允许从镜像下载
+    EMBEDDING_PRELOAD: bool = True  # 应用启动时在后台线程加载并预热模型
+    EMBEDDING_READY_WAIT_SECONDS: float = 0  # 请求到达时模型未就绪的最长等待秒数，0为不等待
+    EMBEDDING_USE_SERVICE: bool = False  # 使用独立的embedding服务进程（python -m app.services.embedding_server）
+    EMBEDDING_SERVICE_ADDRESS: str = "127.0.0.1:8765"  # embedding服务监听地址
+    EMBEDDING_SERVICE_AUTHKEY: str = ""  # embedding服务IPC认证密钥，启用embedding服务时必须设置为随机值
+    EMBEDDING_SERVICE_CONNECT_TIMEOUT: float = 60  # 连接embedding服务的最长等待秒数
+    EMBEDDING_SERVICE_REQUEST_TIMEOUT: float = 30  # embedding服务中单个编码请求的最长等待秒数
+    EMBEDDING_WORKERS: int = 2  # embedding服务的工作进程数
+    EMBEDDING_MAX_BATCH_SIZE: int = 64  # 微批处理的单批最大文本数
+    EMBEDDING_MAX_WAIT_MS: float = 5  # 微批处理的最长合批等待毫秒数
     VECTOR_DIMENSION: int = 768
     TOP_K_RETRIEVAL: int = 5
+    CHUNK_MAX_TOKENS: int = 256  # 知识库分块的最大token数
+    CHUNK_OVERLAP_TOKENS: int = 48  # 相邻分块的重叠token数
+    CHUNK_CANDIDATE_FACTOR: int = 4  # 段落候选数相对top_k的倍数（按文档去重前）
+    VECTOR_QUANTIZATION: str = "int8"  # 向量索引量化方式: none, int8, binary
+    VECTOR_RESCORE_FACTOR: int = 4  # 量化粗排候选数相对top_k的倍数，候选再用float32精确打分
+    VECTOR_INDEX_DIR: Optional[str] = "./data/vector_index"  # float32向量落盘目录（mmap，只常驻量化码），为空则float32向量常驻内存
+    VECTOR_DELTA_MAX_RATIO: float = 0.1  # 增量段与删除标记超过主段的该比例时后台合并
+    VECTOR_DELTA_MIN_SIZE: int = 512  # 触发合并的最小增量条数
+    KNOWLEDGE_INDEX_POLL_SECONDS: float = 2.0  # 各worker轮询知识库变更日志的间隔
+    KNOWLEDGE_INDEX_SYNC_BATCH: int = 1000  # 单次同步的最大变更条数
+    RERANK_ENABLED: bool = False  # 是否启用交叉编码器重排
+    RERANK_MODEL: str = "BAAI/bge-reranker-base"  # 交叉编码器模型
+    RERANK_MODEL_PATH: Optional[str] = None  # 本地交叉编码器模型目录
+    RERANK_CANDIDATES: int = 50  # 送入重排的候选数
+    RERANK_LATENCY_BUDGET_MS: float = 150  # 重排延迟预算，预估超出时跳过重排
+    RERANK_MAX_CONCURRENT: int = 2  # 同时进行的重排请求上限，超出时跳过重排
+    RERANK_CACHE_SIZE: int = 20000  # (查询, 段落)分数缓存条目数
+    RAG_CONTEXT_TOKEN_BUDGET: int = 1200  # RAG提示词中知识库上下文的token预算
+    RAG_CONTEXT_DEDUP_THRESHOLD: float = 0.8  # 句子二元组相似度达到该值视为重复
+    ANSWER_CACHE_ENABLED: bool = True  # 是否对/ask启用语义答案缓存
+    ANSWER_CACHE_SIMILARITY: float = 0.92  # 同类别问题向量相似度达到该值时直接复用答案
+    ANSWER_CACHE_TTL_SECONDS: float = 3600  # 缓存答案的有效期
+    ANSWER_CACHE_MAX_ENTRIES: int = 2000  # 每个岗位类别最多缓存的答案数
+    KNOWLEDGE_BASE_DIR: str = "../data/knowledge_base"  # 知识库源文件目录（Markdown/JSONL/TXT）
+    KNOWLEDGE_INGEST_BATCH_SIZE: int = 32  # 目录导入时每批提交的记录数
+    KNOWLEDGE_INGEST_MMAP_THRESHOLD_MB: int = 8  # 超过该大小的文件使用mmap读取
+    KNOWLEDGE_INGEST_MAX_DOC_BYTES: int = 60000  # 单条知识记录的最大UTF-8字节数，超出时拆分（不能超过MySQL TEXT的65535字节）
+    EMBEDDING_CACHE_SIZE: int = 10000  # 查询向量LRU缓存条目数
+    EMBEDDING_CACHE_PATH: Optional[str] = None  # 查询向量缓存持久化路径（.npz），为空则不持久化
+
+    # 对话配置
+    CHAT_HISTORY_PROMPT_MESSAGES: int = 6  # 滚动摘要时始终原样保留的最近消息条数
+    CHAT_HISTORY_BUFFER_SIZE: int = 50  # 每个活跃会话在进程内缓存的最近消息条数
+    CHAT_HISTORY_CACHED_SESSIONS: int = 1000  # 最多缓存的会话数
+    CHAT_HISTORY_VERIFY_WITH_DB: bool = False  # 多worker部署时开启，读取缓存前核对数据库中的最新消息
+    CHAT_SUMMARY_TRIGGER_TOKENS: int = 1500  # 摘要之后的历史超过该token数时在后台合并进滚动摘要
+    CHAT_PROMPT_TOKEN_BUDGET: int = 4000  # 对话提示词的输入token预算：系统提示词和本条消息之外的部分从新到旧填充历史消息
+    TOKENIZER_PATH: Optional[str] = None  # 本地分词器目录（如Qwen的tokenizer），配置后精确计数，否则估算
+    TOKEN_CALIBRATION_PATH: Optional[str] = None  # 估算权重校准文件（python -m training.token_calibration 生成）
+    CHAT_SUMMARY_MAX_TOKENS: int = 400  # 滚动摘要的最大长度
+    CHAT_WRITE_BEHIND_ENABLED: bool = False  # 对话消息写后缓冲：先进内存队列再批量写入（进程被强制终止时可能丢失最近一个刷新间隔的消息）
+    CHAT_WRITE_BEHIND_FLUSH_SECONDS: float = 0.5  # 写后缓冲的刷新间隔
+    CHAT_WRITE_BEHIND_BATCH_SIZE: int = 200  # 队列达到该长度时立即刷新，也是单条INSERT的最大行数
+    CHAT_WRITE_BEHIND_MAX_PENDING: int = 5000  # 队列上限，超过时在请求中同步刷新
+    CHAT_WRITE_BEHIND_HARD_LIMIT: int = 20000  # 队列硬上限（数据库长时间不可用时），达到后拒绝新消息
+    GREETING_CACHE_TTL_SECONDS: float = 1800  # 欢迎消息缓存有效期（用户上下文变化时提前失效）
+    GREETING_CACHE_MAX_ENTRIES: int = 5000  # 最多缓存的欢迎消息数
+    GREETING_PREWARM_ENABLED: bool = False  # 登录后是否在后台预生成各模块的欢迎消息
+    CHAT_INTENT_KEYWORDS_PATH: Optional[str] = None  # 意图关键词表JSON（意图 -> {关键词: 权重}），为空则使用内置关键词表
+    CHAT_SEARCH_MAX_USERS: int = 100  # 对话检索最多在内存中保留索引的用户数（每万条消息约占几MB）
+    CHAT_SEARCH_SNIPPET_CHARS: int = 80  # 检索结果片段的最大字符数
+    CHAT_SEARCH_BUILD_WORKERS: int = 2  # 后台构建检索索引的线程数
+    CHAT_SEARCH_BUILD_WAIT_SECONDS: float = 0.5  # 首次检索等待索引构建的时间，超时返回building状态
+    CHAT_ARCHIVE_ENABLED: bool = False  # 是否读取归档的对话消息（运行归档任务 python -m app.services.chat_archive 前需开启）
+    CHAT_ARCHIVE_DIR: str = "./data/chat_archive"  # 对话归档文件目录（多实例部署时需为共享存储）
+    CHAT_ARCHIVE_IDLE_DAYS: int = 30  # 最后一条消息早于该天数的会话被归档
+    USER_CONTEXT_CACHE_ENABLED: bool = True  # 是否缓存对话用的用户上下文和系统提示词
+    USER_CONTEXT_CACHE_TTL_SECONDS: float = 300  # 用户上下文缓存有效期（多worker部署时其他进程写入的最长延迟）
+    USER_CONTEXT_CACHE_MAX_USERS: int = 5000  # 最多缓存的用户数
+    RESUME_SNIPPET_MAX_TOKENS: int = 300  # 保存简历时渲染的简历摘要的token上限（对话和出题提示词共用）
 
     # 训练配置
     MODEL_PATH: str = "./models"
@@ -3,9 +3,11 @@ FastAPI主应用：定义API路由和中间件
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.database.connection import engine, Base
 from app.api import auth, tasks, interviews, ai_service, chat, resume
 from app.config import settings
+from app.services.embedding_model import embedding_model_loader
 
 # 创建数据库表
 Base.metadata.create_all(bind=engine)
@@ -41,6 +43,17 @@ app.include_router(ai_service.router, prefix="/api/ai", tags=["AI服务"])
 app.include_router(chat.router, prefix="/api/chat", tags=["对话"])
 app.include_router(resume.router, prefix="/api/resume", tags=["简历"])
 
+@app.on_event("startup")
+async def preload_models():
+    """启动时在后台加载并预热embedding模型，不阻塞服务启动"""
+    if settings.EMBEDDING_PRELOAD:
+        embedding_model_loader.start()
+
+@app.on_event("shutdown")
+async def flush_chat_messages():
+    """停止时写入写后缓冲中的对话消息"""
+    chat.close_chat_service()
+
 @app.get("/")
 async def root():
     """根路径"""
@@ -48,8 +61,20 @@ async def root():
 
 @app.get("/api/health")
 async def health_check():
-    """健康检查"""
-    return {"status": "healthy"}
+    """健康检查（含embedding模型就绪状态）"""
+    return {
+        "status": "healthy",
+        "ready": embedding_model_loader.is_ready,
+        "embedding_model": embedding_model_loader.status()
+    }
+
+@app.get("/api/health/ready")
+async def readiness_check():
+    """就绪检查：embedding模型加载完成前返回503，供负载均衡摘除流量"""
+    status = embedding_model_loader.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content={"ready": False, "embedding_model": status})
+    return {"ready": True, "embedding_model": status}
 
 if __name__ == "__main__":
     import uvicorn
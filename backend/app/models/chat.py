@@ -13,7 +13,7 @@ class ChatMessage(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
-    session_id = Column(String(100), nullable=False, index=True, comment='对话会话ID')
+    session_id = Column(String(100), nullable=False, comment='对话会话ID')
     role = Column(String(20), nullable=False, comment='角色: user, assistant, system')
     content = Column(Text, nullable=False, comment='消息内容')
     meta_data = Column(JSON, nullable=True, comment='元数据: 功能类型、推荐内容等')
@@ -21,6 +21,11 @@ class ChatMessage(Base):
 
     user = relationship("User", backref="chat_messages")
 
+    __table_args__ = (
+        # 按会话倒序读取最近消息的键集查询
+        Index('idx_session_message', 'session_id', 'id'),
+    )
+
     def __repr__(self):
         return f"<ChatMessage(id={self.id}, role={self.role}, session_id={self.session_id})>"
 
@@ -33,10 +38,21 @@ class ChatSession(Base):
     session_id = Column(String(100), unique=True, nullable=False, index=True)
     context_type = Column(String(50), nullable=True, comment='上下文类型: learning, personalized, general')
     summary = Column(Text, nullable=True, comment='会话摘要')
+    context_summary = Column(Text, nullable=True, comment='较早对话的滚动摘要，用于构建对话提示词')
+    summarized_until_id = Column(Integer, nullable=False, default=0, server_default='0', comment='已合并进滚动摘要的最后一条消息ID')
+    archived_at = Column(TIMESTAMP, nullable=True, comment='消息归档时间，为空表示未归档')
+    archive_info = Column(JSON, nullable=True, comment='归档位置: file, offset, length, messages, last_message_at')
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
 
     user = relationship("User", backref="chat_sessions")
 
+    __table_args__ = (
+        # 会话列表按 (updated_at, id) 倒序的键集分页，也用于查找用户在某个模块的最近会话
+        Index('idx_user_context_updated', 'user_id', 'context_type', 'updated_at', 'id'),
+        # 不按模块过滤的会话列表分页
+        Index('idx_user_updated', 'user_id', 'updated_at', 'id'),
+    )
+
     def __repr__(self):
         return f"<ChatSession(id={self.id}, session_id={self.session_id}, context_type={self.context_type})>"
\ No newline at end of file
@@ -0,0 +1,30 @@
+"""
+知识库段落模型：存储文档分块后的段落及其在原文中的字符偏移
+"""
+from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, ForeignKey, Index
+from sqlalchemy.dialects.mysql import JSON
+from sqlalchemy.sql import func
+from app.database.connection import Base
+
+
+class KnowledgeChunk(Base):
+    """知识库段落表模型"""
+    __tablename__ = "knowledge_chunks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    doc_id = Column(Integer, ForeignKey("knowledge_base.id", ondelete="CASCADE"), nullable=False, index=True, comment='所属文档ID')
+    chunk_index = Column(Integer, nullable=False, comment='段落在文档中的序号')
+    content = Column(Text, nullable=False, comment='段落内容')
+    start_offset = Column(Integer, nullable=False, comment='段落在原文中的起始字符偏移')
+    end_offset = Column(Integer, nullable=False, comment='段落在原文中的结束字符偏移')
+    token_count = Column(Integer, default=0, comment='估算token数')
+    position_category = Column(String(100), index=True, comment='岗位类别（冗余自所属文档，便于过滤）')
+    embedding_vector = Column(JSON, comment='段落向量')
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+    __table_args__ = (
+        Index('idx_doc_chunk', 'doc_id', 'chunk_index'),
+    )
+
+    def __repr__(self):
+        return f"<KnowledgeChunk(id={self.id}, doc_id={self.doc_id}, chunk_index={self.chunk_index})>"
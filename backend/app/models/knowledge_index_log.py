@@ -0,0 +1,20 @@
+"""
+知识库索引变更日志模型：记录知识库文档的增删改，各worker进程据此增量同步内存向量索引
+"""
+from sqlalchemy import Column, Integer, String, TIMESTAMP
+from sqlalchemy.sql import func
+from app.database.connection import Base
+
+
+class KnowledgeIndexLog(Base):
+    """知识库索引变更日志表模型（自增id即索引代数）"""
+    __tablename__ = "knowledge_index_log"
+
+    id = Column(Integer, primary_key=True, index=True)
+    doc_id = Column(Integer, nullable=False, index=True, comment='变更的文档ID（文档删除后仍保留）')
+    position_category = Column(String(100), comment='变更前后涉及的岗位类别')
+    operation = Column(String(20), nullable=False, comment='变更类型：upsert/delete')
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+    def __repr__(self):
+        return f"<KnowledgeIndexLog(id={self.id}, doc_id={self.doc_id}, operation={self.operation})>"
@@ -23,6 +23,7 @@ class Resume(Base):
     # 解析后的结构化数据
     parsed_data = Column(JSON, nullable=True, comment='解析后的简历数据: name, education, experience, skills等')
     raw_text = Column(Text, nullable=True, comment='原始文本内容')
+    context_snippet = Column(Text, nullable=True, comment='保存时渲染的简历摘要，供各类提示词直接使用')
 
     # 元数据
     is_active = Column(Integer, default=1, comment='是否激活: 1-是, 0-否')
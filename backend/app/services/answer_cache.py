@@ -0,0 +1,171 @@
+"""
+语义答案缓存：同一岗位类别下语义相近的问题直接复用已生成的答案，跳过检索和大模型生成
+"""
+import threading
+import time
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.services.vector_index import PartitionedVectorIndex, normalize_rows
+
+
+class SemanticAnswerCache:
+    """
+    语义答案缓存
+
+    - 按岗位类别分组，每组保存问题向量矩阵，查找时一次矩阵乘法得到与所有已缓存问题的相似度
+    - 相似度达到阈值且未过期的条目视为命中
+    - 知识库某个类别发生变化时清除该类别及全局（不限类别）的缓存
+    - 每个类别有一个版本号，清除时递增；生成答案前取版本号，写入时版本已变化说明答案可能基于旧知识库，不再缓存
+    """
+
+    def __init__(self, similarity_threshold: float = 0.92, ttl_seconds: float = 3600, max_entries: int = 2000):
+        """
+        Args:
+            similarity_threshold: 命中所需的最小余弦相似度
+            ttl_seconds: 条目有效期（秒）
+            max_entries: 每个类别最多缓存的条目数，超出时淘汰最久未命中的条目
+        """
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._groups = {}  # 类别 -> {"vectors": 矩阵, "entries": 条目列表}
+        self._versions = {}  # 类别 -> 被清除的次数
+        self._epoch = 0  # clear() 的次数
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "invalidated": 0, "evicted": 0, "stale_skipped": 0}
+
+    def version(self, position_category: Optional[str]) -> Tuple[int, int]:
+        """返回类别当前的缓存版本，生成答案前获取，写入时传给 put"""
+        key = PartitionedVectorIndex.partition_key(position_category)
+        with self._lock:
+            return self._epoch, self._versions.get(key, 0)
+
+    def get(self, position_category: Optional[str], query_vector: np.ndarray) -> Optional[Dict]:
+        """
+        查找语义相近的已缓存答案
+
+        Args:
+            position_category: 岗位类别
+            query_vector: 问题向量
+
+        Returns:
+            命中时返回 {"question", "answer", "sources", "similarity"}，否则返回None
+        """
+        key = PartitionedVectorIndex.partition_key(position_category)
+        query = normalize_rows(query_vector).reshape(-1)
+        now = time.monotonic()
+
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None or not np.any(query):
+                self._stats["misses"] += 1
+                return None
+
+            self._drop_expired(key, group, now)
+            if not group["entries"]:
+                self._stats["misses"] += 1
+                return None
+
+            similarities = group["vectors"] @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self._stats["misses"] += 1
+                return None
+
+            entry = group["entries"][best]
+            entry["last_used"] = now
+            entry["hits"] += 1
+            self._stats["hits"] += 1
+            return {
+                "question": entry["question"],
+                "answer": entry["answer"],
+                "sources": entry["sources"],
+                "similarity": round(float(similarities[best]), 4)
+            }
+
+    def put(self, position_category: Optional[str], question: str, query_vector: np.ndarray, answer: str,
+            sources: List[Dict], version: Optional[Tuple[int, int]] = None):
+        """
+        缓存问题的答案
+
+        Args:
+            position_category: 岗位类别
+            question: 问题
+            query_vector: 问题向量
+            answer: 生成的答案
+            sources: 答案引用的来源
+            version: 检索前通过 version() 取得的版本，期间该类别被清除时不写入
+        """
+        vector = normalize_rows(query_vector).reshape(1, -1)
+        if not np.any(vector):
+            return
+        key = PartitionedVectorIndex.partition_key(position_category)
+        now = time.monotonic()
+
+        with self._lock:
+            if version is not None and version != (self._epoch, self._versions.get(key, 0)):
+                self._stats["stale_skipped"] += 1
+                return
+            group = self._groups.setdefault(key, {"vectors": np.zeros((0, vector.shape[1]), dtype=np.float32), "entries": []})
+            if len(group["entries"]) >= self.max_entries:
+                victim = min(range(len(group["entries"])), key=lambda i: group["entries"][i]["last_used"])
+                self._remove(group, [victim])
+                self._stats["evicted"] += 1
+
+            group["vectors"] = np.vstack([group["vectors"], vector])
+            group["entries"].append({
+                "question": question,
+                "answer": answer,
+                "sources": sources,
+                "created_at": now,
+                "last_used": now,
+                "hits": 0
+            })
+
+    def invalidate(self, position_categories: Iterable[Optional[str]]):
+        """清除指定类别及全局检索的缓存（知识库对应分区变化时调用）"""
+        keys = {PartitionedVectorIndex.partition_key(category) for category in position_categories}
+        keys.add(PartitionedVectorIndex.DEFAULT_PARTITION)
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+                group = self._groups.pop(key, None)
+                if group is not None:
+                    self._stats["invalidated"] += len(group["entries"])
+
+    def clear(self):
+        """清空全部缓存"""
+        with self._lock:
+            self._stats["invalidated"] += sum(len(group["entries"]) for group in self._groups.values())
+            self._groups = {}
+            self._epoch += 1
+
+    def stats(self) -> Dict:
+        """返回命中率等指标"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "size": sum(len(group["entries"]) for group in self._groups.values()),
+                "categories": len(self._groups),
+                "similarity_threshold": self.similarity_threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                **self._stats
+            }
+
+    def _drop_expired(self, key: str, group: Dict, now: float):
+        """删除过期条目（调用方需持有锁）"""
+        expired = [i for i, entry in enumerate(group["entries"]) if now - entry["created_at"] > self.ttl_seconds]
+        if expired:
+            self._remove(group, expired)
+            self._stats["expired"] += len(expired)
+            if not group["entries"]:
+                self._groups.pop(key, None)
+
+    @staticmethod
+    def _remove(group: Dict, rows: List[int]):
+        """按行号删除条目（调用方需持有锁）"""
+        drop = set(rows)
+        keep = [i for i in range(len(group["entries"])) if i not in drop]
+        group["vectors"] = group["vectors"][keep]
+        group["entries"] = [group["entries"][i] for i in keep]
@@ -0,0 +1,269 @@
+"""
+对话归档：把长期未活跃会话的消息压缩追加到按用户划分的归档文件，并从 chat_messages 中删除
+
+用法（在backend目录下运行，建议由定时任务每天执行一次）：
+    python -m app.services.chat_archive [--idle-days 30] [--limit 1000] [--optimize]
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import exists, text
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.chat import ChatMessage, ChatSession
+from app.services.chat_history import message_to_dict
+from app.utils.lru_cache import LRUCache
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:  # Windows没有fcntl，只能保证同时只运行一个归档任务
+    fcntl = None
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zst":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zst":
+        if zstandard is None:
+            raise RuntimeError("读取zstd归档需要安装 zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class ChatArchive:
+    """
+    对话冷存储归档
+
+    - 归档文件按用户划分（{user_id}.jsonl.zst，未安装 zstandard 时为 .jsonl.gz），每个会话追加为
+      一个独立的压缩帧，会话行的 archive_info 记录帧的位置，读取时只解压该会话
+    - 会话以最后一条消息的时间判断是否空闲；归档后的会话又有新消息时，下次归档把旧帧与新消息
+      合并写入新帧（旧帧成为文件中的无效数据）
+    - 先追加写文件再在一个事务中更新会话、删除消息，中途失败只会在文件中留下无人引用的帧
+    - 追加写入时对归档文件加排他锁（fcntl.flock），多个归档任务可以同时运行；
+      没有fcntl的系统上同时只能运行一个归档任务
+    - 历史读取通过 ChatHistoryStore.archive_source 合并归档消息，消息保留原id，翻页游标不变
+    - 查询过未归档的会话在最后一条消息之后 idle_days 内不会被归档，期间读取不再查询会话行
+    """
+
+    def __init__(self, archive_dir: str, idle_days: int = 30, cache_sessions: int = 64):
+        """
+        Args:
+            archive_dir: 归档文件目录
+            idle_days: 最后一条消息早于该天数的会话被归档
+            cache_sessions: 进程内缓存的已解压会话数
+        """
+        self.archive_dir = os.path.abspath(archive_dir)
+        self.idle_days = idle_days
+        self.codec = "zst" if zstandard is not None else "gz"
+        self._cache = LRUCache(cache_sessions)
+        self._not_archived = LRUCache(cache_sessions * 16)  # 会话ID -> 最早可能被归档的时间
+        self._write_lock = threading.Lock()
+        self._stats = {"reads": 0, "skipped_lookups": 0, "archived_sessions": 0, "archived_messages": 0, "archived_bytes": 0}
+
+    def read_session(self, session_id: str, db: Session, last_message_at: Optional[datetime] = None) -> List[Dict]:
+        """
+        读取会话已归档的消息
+
+        Args:
+            session_id: 会话ID
+            db: 数据库会话
+            last_message_at: 热表中该会话已知最新消息的时间；会话未归档时据此记住
+                在 last_message_at + idle_days 之前都不需要再查询
+
+        Returns:
+            message_to_dict 格式的消息（按id升序），会话未归档时返回空列表
+        """
+        not_before = self._not_archived.get(session_id)
+        if not_before is not None and datetime.now() < not_before:
+            self._stats["skipped_lookups"] += 1
+            return []
+        row = db.query(ChatSession.archived_at, ChatSession.archive_info).filter(
+            ChatSession.session_id == session_id
+        ).first()
+        if row is None or row.archived_at is None or not row.archive_info:
+            if last_message_at is not None:
+                self._not_archived.put(session_id, last_message_at + timedelta(days=self.idle_days))
+            return []
+        info = row.archive_info
+        key = (session_id, info["file"], info["offset"])
+        messages = self._cache.get(key)
+        if messages is None:
+            messages = self._read_frame(info)
+            self._cache.put(key, messages)
+            self._stats["reads"] += 1
+        return messages
+
+    def find_idle_sessions(self, db: Session, limit: int) -> List[ChatSession]:
+        """
+        查找需要归档的会话：有未归档消息，且最后一条消息早于空闲阈值
+
+        Args:
+            db: 数据库会话
+            limit: 最多返回的会话数
+        """
+        cutoff = datetime.now() - timedelta(days=self.idle_days)
+        has_messages = exists().where(ChatMessage.session_id == ChatSession.session_id)
+        has_recent = exists().where(
+            ChatMessage.session_id == ChatSession.session_id,
+            ChatMessage.created_at >= cutoff
+        )
+        return db.query(ChatSession).filter(
+            ChatSession.updated_at < cutoff,
+            has_messages,
+            ~has_recent
+        ).order_by(ChatSession.user_id, ChatSession.id).limit(limit).all()
+
+    def archive_session(self, session: ChatSession, db: Session) -> int:
+        """
+        归档一个会话
+
+        Args:
+            session: 会话
+            db: 数据库会话
+
+        Returns:
+            归档的消息数（含此前已归档的消息）
+        """
+        rows = db.query(ChatMessage).filter(
+            ChatMessage.session_id == session.session_id
+        ).order_by(ChatMessage.id).all()
+        if not rows:
+            return 0
+        messages = self.read_session(session.session_id, db) + [message_to_dict(row) for row in rows]
+        payload = "".join(json.dumps(message, ensure_ascii=False) + "\n" for message in messages)
+        frame = _compress(payload.encode("utf-8"), self.codec)
+
+        file_name = f"{session.user_id}.jsonl.{self.codec}"
+        os.makedirs(self.archive_dir, exist_ok=True)
+        with self._write_lock:
+            with open(os.path.join(self.archive_dir, file_name), "ab") as f:
+                if fcntl is not None:
+                    # 其他进程的归档任务可能同时追加同一个用户的文件，加锁后重新定位到文件末尾
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    f.seek(0, os.SEEK_END)
+                    offset = f.tell()
+                    f.write(frame)
+                    f.flush()
+                    os.fsync(f.fileno())
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+        info = {
+            "file": file_name,
+            "offset": offset,
+            "length": len(frame),
+            "messages": len(messages),
+            "last_message_at": messages[-1]["created_at"]
+        }
+        db.query(ChatSession).filter(ChatSession.id == session.id).update({
+            ChatSession.archived_at: datetime.now(),
+            ChatSession.archive_info: info,
+            # 归档不算会话活动，保持会话的最后活跃时间不变
+            ChatSession.updated_at: ChatSession.updated_at
+        }, synchronize_session=False)
+        db.query(ChatMessage).filter(
+            ChatMessage.session_id == session.session_id,
+            ChatMessage.id <= rows[-1].id
+        ).delete(synchronize_session=False)
+        db.commit()
+        self._not_archived.pop(session.session_id)
+
+        self._stats["archived_sessions"] += 1
+        self._stats["archived_messages"] += len(rows)
+        self._stats["archived_bytes"] += len(frame)
+        return len(messages)
+
+    def run(self, db: Session, limit: int = 1000) -> Dict:
+        """
+        归档一批空闲会话
+
+        Args:
+            db: 数据库会话
+            limit: 本次最多归档的会话数
+
+        Returns:
+            {"sessions", "messages", "bytes", "failures", "elapsed_s"}
+        """
+        start = time.perf_counter()
+        before = dict(self._stats)
+        failures = 0
+        for session in self.find_idle_sessions(db, limit):
+            try:
+                self.archive_session(session, db)
+            except Exception as e:
+                db.rollback()
+                failures += 1
+                print(f"归档会话失败 {session.session_id}: {e}")
+        return {
+            "sessions": self._stats["archived_sessions"] - before["archived_sessions"],
+            "messages": self._stats["archived_messages"] - before["archived_messages"],
+            "bytes": self._stats["archived_bytes"] - before["archived_bytes"],
+            "failures": failures,
+            "elapsed_s": round(time.perf_counter() - start, 3)
+        }
+
+    def stats(self) -> Dict:
+        """返回归档统计"""
+        return dict(self._stats, codec=self.codec, cached_sessions=len(self._cache))
+
+    def _read_frame(self, info: Dict) -> List[Dict]:
+        """读取并解压一个会话帧"""
+        codec = info["file"].rsplit(".", 1)[-1]
+        with open(os.path.join(self.archive_dir, info["file"]), "rb") as f:
+            f.seek(info["offset"])
+            data = f.read(info["length"])
+        return [json.loads(line) for line in _decompress(data, codec).decode("utf-8").splitlines() if line]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="归档长期未活跃的对话会话")
+    parser.add_argument("--idle-days", type=int, default=settings.CHAT_ARCHIVE_IDLE_DAYS, help="空闲天数阈值")
+    parser.add_argument("--limit", type=int, default=1000, help="本次最多归档的会话数")
+    parser.add_argument("--optimize", action="store_true", help="归档后执行 OPTIMIZE TABLE 回收 chat_messages 空间（MySQL）")
+    args = parser.parse_args(argv)
+
+    if not settings.CHAT_ARCHIVE_ENABLED:
+        # 未开启时历史读取不会合并归档消息，归档后的消息将无法读取
+        print("CHAT_ARCHIVE_ENABLED 未开启，已跳过归档")
+        return 1
+    if args.idle_days < settings.CHAT_ARCHIVE_IDLE_DAYS:
+        # 服务进程按配置的天数判断会话在多久内不会被归档，更短的天数会让其读不到刚归档的消息
+        print(f"--idle-days 不能小于 CHAT_ARCHIVE_IDLE_DAYS（{settings.CHAT_ARCHIVE_IDLE_DAYS}）")
+        return 1
+
+    from app.database.connection import SessionLocal
+
+    db = SessionLocal()
+    try:
+        archive = ChatArchive(settings.CHAT_ARCHIVE_DIR, idle_days=args.idle_days)
+        result = archive.run(db, limit=args.limit)
+        print(f"已归档 {result['sessions']} 个会话、{result['messages']} 条消息，"
+              f"压缩后 {result['bytes'] / 1024:.1f}KB（{archive.codec}），失败 {result['failures']} 个，"
+              f"耗时 {result['elapsed_s']}s")
+        if args.optimize and result["sessions"]:
+            db.execute(text("OPTIMIZE TABLE chat_messages"))
+            db.commit()
+        return 0 if not result["failures"] else 2
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
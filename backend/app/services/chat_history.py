@@ -0,0 +1,197 @@
+"""
+对话历史服务：按会话读取最近N条消息，并在进程内为活跃会话维护环形缓冲区
+"""
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.chat import ChatMessage
+from app.utils.lru_cache import LRUCache
+
+
+def message_to_dict(message) -> Dict:
+    """将消息行转换为历史记录格式"""
+    return {
+        "id": message.id,
+        "role": message.role,
+        "content": message.content,
+        "metadata": message.meta_data or {},
+        "created_at": message.created_at.isoformat() if message.created_at else None
+    }
+
+
+class _SessionBuffer:
+    """单个会话的最近消息（按id升序）"""
+
+    def __init__(self, messages: List[Dict], capacity: int, complete: bool):
+        """
+        Args:
+            messages: 最近的消息
+            capacity: 缓冲区容量
+            complete: 是否包含该会话的全部消息
+        """
+        self.messages = deque(messages, maxlen=capacity)
+        self.complete = complete
+
+    @property
+    def last_id(self) -> Optional[int]:
+        return self.messages[-1]["id"] if self.messages else None
+
+    def covers(self, limit: int) -> bool:
+        """缓冲区能否直接满足最近limit条的读取"""
+        return self.complete or len(self.messages) >= limit
+
+
+class ChatHistoryStore:
+    """
+    对话历史存储
+
+    - 读取：按 (session_id, id DESC) 键集查询最近N条，只取需要的列
+    - 缓存：最近活跃的会话在进程内保留最近若干条消息，写入消息时同步追加，
+      正常的一轮对话不需要查询历史
+    - 多worker部署时可开启 verify_with_db，每次读取前用一次索引查询核对最新消息id
+    - 启用写后缓冲时，从数据库加载后追加尚未写入的消息（pending_source）
+    - 启用归档时，热表中的消息不足所需条数时在前面补上已归档的消息（archive_source）
+    """
+
+    def __init__(self, buffer_size: int = 50, max_sessions: int = 1000, verify_with_db: bool = False):
+        """
+        Args:
+            buffer_size: 每个会话缓存的消息条数
+            max_sessions: 最多缓存的会话数
+            verify_with_db: 读取缓冲区前是否核对数据库中的最新消息id
+        """
+        self.buffer_size = buffer_size
+        self.verify_with_db = verify_with_db
+        self._buffers = LRUCache(max_sessions)
+        self._lock = threading.Lock()
+        self._generation = 0  # 每次丢弃缓冲区时递增，加载期间发生丢弃时不缓存加载结果
+        self.pending_source: Optional[Callable[[str], List[Dict]]] = None
+        # (会话ID, 数据库会话, 热表中已知最新消息的时间) -> 已归档的消息
+        self.archive_source: Optional[Callable[[str, Session, Optional[datetime]], List[Dict]]] = None
+        self.loads = 0
+
+    def get_recent(self, session_id: str, limit: int, db: Session) -> List[Dict]:
+        """
+        获取会话最近的limit条消息（按时间正序）
+
+        Args:
+            session_id: 会话ID
+            limit: 消息条数
+            db: 数据库会话
+
+        Returns:
+            消息列表
+        """
+        if limit <= 0:
+            return []
+
+        buffer = self._buffers.get(session_id)
+        if buffer is not None and buffer.covers(limit):
+            if not self.verify_with_db or self._latest_id(session_id, db) == buffer.last_id:
+                return list(buffer.messages)[-limit:]
+
+        generation = self._generation
+        messages, complete = self._load(session_id, max(limit, self.buffer_size), db)
+        with self._lock:
+            if generation == self._generation:
+                # 加载条数大于缓冲区容量时只保留最近的部分，此时缓冲区不再包含会话全部消息
+                buffered = messages[-self.buffer_size:]
+                self._buffers.put(session_id, _SessionBuffer(buffered, self.buffer_size, complete and len(messages) <= self.buffer_size))
+        return messages[-limit:]
+
+    def get_page(self, session_id: str, before_id: Optional[int], limit: int, db: Session):
+        """
+        按消息id向前翻页（键集分页）
+
+        Args:
+            session_id: 会话ID
+            before_id: 上一页最早一条消息的id，为空时返回最新一页
+            limit: 每页条数
+            db: 数据库会话
+
+        Returns:
+            (按时间正序的消息列表, 下一页游标或None)
+        """
+        if before_id is None:
+            # 最新一页走缓冲区（多取一条判断是否还有更早的消息）
+            messages = self.get_recent(session_id, limit + 1, db)
+        else:
+            rows = self._query_rows(session_id, limit + 1, db, before_id)
+            messages = [message_to_dict(row) for row in reversed(rows)]
+            if len(rows) <= limit and self.archive_source is not None:
+                last_at = rows[0].created_at if rows else None
+                archived = [message for message in self.archive_source(session_id, db, last_at) if message["id"] < before_id]
+                messages = archived[-(limit + 1 - len(rows)):] + messages
+
+        has_more = len(messages) > limit
+        messages = messages[-limit:] if limit else []
+        stored_ids = [message["id"] for message in messages if message["id"] is not None]
+        next_cursor = stored_ids[0] if has_more and stored_ids else None
+        return messages, next_cursor
+
+    def append(self, session_id: str, message: Dict):
+        """
+        消息提交后追加到会话缓冲区（会话未缓存时忽略，下次读取时从数据库加载）
+
+        Args:
+            session_id: 会话ID
+            message: message_to_dict 格式的消息
+        """
+        with self._lock:
+            buffer = self._buffers.get(session_id)
+            if buffer is None:
+                return
+            if buffer.last_id is not None and message["id"] is not None and message["id"] <= buffer.last_id:
+                # 并发写入导致顺序错乱时放弃缓冲区，下次重新加载
+                self._buffers.pop(session_id)
+                return
+            if len(buffer.messages) == self.buffer_size:
+                buffer.complete = False
+            buffer.messages.append(message)
+
+    def invalidate(self, *session_ids: str):
+        """丢弃会话缓冲区"""
+        with self._lock:
+            self._generation += 1
+            for session_id in session_ids:
+                self._buffers.pop(session_id)
+
+    def stats(self) -> Dict:
+        """返回缓冲区命中统计"""
+        return dict(self._buffers.stats(), loads=self.loads)
+
+    def _load(self, session_id: str, limit: int, db: Session):
+        """键集查询最近limit条消息，返回(消息列表, 是否包含会话全部消息)"""
+        self.loads += 1
+        rows = self._query_rows(session_id, limit, db)
+        messages = [message_to_dict(row) for row in reversed(rows)]
+        complete = len(rows) < limit
+        if complete and self.archive_source is not None:
+            archived = self.archive_source(session_id, db, rows[0].created_at if rows else None)
+            missing = limit - len(rows)
+            messages = archived[-missing:] + messages
+            complete = len(archived) <= missing
+        if self.pending_source is not None:
+            messages.extend(self.pending_source(session_id))
+        return messages, complete
+
+    @staticmethod
+    def _query_rows(session_id: str, limit: int, db: Session, before_id: Optional[int] = None):
+        """按 (session_id, id DESC) 读取limit条消息，只取需要的列"""
+        query = db.query(
+            ChatMessage.id,
+            ChatMessage.role,
+            ChatMessage.content,
+            ChatMessage.meta_data,
+            ChatMessage.created_at
+        ).filter(ChatMessage.session_id == session_id)
+        if before_id is not None:
+            query = query.filter(ChatMessage.id < before_id)
+        return query.order_by(ChatMessage.id.desc()).limit(limit).all()
+
+    @staticmethod
+    def _latest_id(session_id: str, db: Session) -> Optional[int]:
+        return db.query(func.max(ChatMessage.id)).filter(ChatMessage.session_id == session_id).scalar()
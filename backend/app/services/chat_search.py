@@ -0,0 +1,306 @@
+"""
+对话全文检索：按用户构建对话消息的二元组倒排索引，随消息写入增量更新
+"""
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.database.connection import SessionLocal
+from app.models.chat import ChatMessage
+from app.utils.lexical_index import IncrementalBM25Index
+from app.utils.lru_cache import LRUCache
+from app.utils.text_features import text_units
+
+# 冷启动构建索引时每批读取的消息数
+_LOAD_BATCH = 5000
+
+_CJK_PATTERN = re.compile(r'[\u4e00-\u9fff\u3400-\u4dbf]')
+
+
+def highlight_terms(query: str) -> List[str]:
+    """
+    提取用于高亮的词：相邻汉字组成的二字词和完整的英文单词（单独的一个汉字取该字）
+
+    Args:
+        query: 查询文本
+
+    Returns:
+        高亮词列表（按长度降序，便于正则优先匹配长词）
+    """
+    terms = set()
+    # 按空白分开的部分各自切分，不把跨越空格的两个字当成一个词高亮
+    for part in query.split():
+        units = text_units(part)
+        terms.update(unit for unit in units if not _CJK_PATTERN.fullmatch(unit))
+        for first, second in zip(units, units[1:]):
+            if _CJK_PATTERN.fullmatch(first) and _CJK_PATTERN.fullmatch(second):
+                terms.add(first + second)
+        if len(units) == 1:
+            terms.add(units[0])
+    return sorted(terms, key=len, reverse=True)
+
+
+def build_snippet(content: str, pattern: Optional[re.Pattern], max_chars: int = 80) -> Dict:
+    """
+    截取命中词最密集的片段
+
+    Args:
+        content: 消息内容
+        pattern: 高亮词正则（忽略大小写）
+        max_chars: 片段最大字符数
+
+    Returns:
+        {"snippet": 片段文本, "highlights": [[开始, 结束], ...]}（位置相对片段）
+    """
+    spans = []
+    if pattern is not None:
+        for found in pattern.finditer(content):
+            # 二字词相互重叠（如"学习"与"习计"），合并成连续区间
+            if spans and found.start() <= spans[-1][1]:
+                spans[-1][1] = max(spans[-1][1], found.end())
+            else:
+                spans.append([found.start(), found.end()])
+
+    if len(content) <= max_chars or not spans:
+        start = 0
+    else:
+        # 双指针找出窗口内命中区间最多的起点，窗口前留出少量上文
+        best, best_count, right = 0, 0, 0
+        for left in range(len(spans)):
+            while right < len(spans) and spans[right][1] - spans[left][0] <= max_chars:
+                right += 1
+            if right - left > best_count:
+                best, best_count = left, right - left
+        start = max(0, min(spans[best][0] - max_chars // 5, len(content) - max_chars))
+    end = min(len(content), start + max_chars)
+
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(content) else ""
+    offset = len(prefix) - start
+    highlights = [
+        [max(span_start, start) + offset, min(span_end, end) + offset]
+        for span_start, span_end in spans
+        if span_start < end and span_end > start
+    ]
+    return {"snippet": prefix + content[start:end] + suffix, "highlights": highlights}
+
+
+class _UserIndex:
+    """单个用户的消息索引"""
+
+    def __init__(self):
+        self.index = IncrementalBM25Index()
+        self.sessions = {}  # 会话ID -> 分组编号
+        self.until_id = 0  # 已从数据库追平到的消息id
+        self.extra_ids = set()  # 写入时直接加入、id大于until_id的消息
+        self.lock = threading.Lock()
+
+    def add(self, rows):
+        """加入 (消息id, 会话ID, 内容)，跳过已索引的消息"""
+        rows = [row for row in rows if row[0] > self.until_id and row[0] not in self.extra_ids]
+        if rows:
+            self.index.add_many(
+                [message_id for message_id, _, _ in rows],
+                [content for _, _, content in rows],
+                [self.sessions.setdefault(session_id, len(self.sessions)) for _, session_id, _ in rows]
+            )
+
+
+class ChatSearchService:
+    """
+    对话全文检索
+
+    - 索引在用户第一次检索时由后台线程从数据库构建，按LRU保留最近检索过的用户；
+      构建在等待时间内未完成时返回 status="building"，不阻塞请求，同一用户只构建一次
+    - 同步写入的消息直接加入已加载的索引；写后缓冲写入的消息和其他进程写入的消息
+      在检索前按 id > 已追平id 增量读取，一次检索最多多一条按 (user_id, id) 的范围查询
+    - 索引只保存消息id、会话和词频，片段在检索后按命中消息id从数据库读取
+    - 会话被删除后，索引中残留的消息在读取片段时被过滤
+    """
+
+    def __init__(self, max_users: int = 100, snippet_chars: int = 80, build_workers: int = 2,
+                 build_wait_seconds: float = 0.5):
+        """
+        Args:
+            max_users: 最多保留索引的用户数
+            snippet_chars: 片段最大字符数
+            build_workers: 后台构建索引的线程数（限制同时进行的冷启动构建）
+            build_wait_seconds: 检索时等待索引构建完成的最长时间
+        """
+        self.snippet_chars = snippet_chars
+        self.build_wait_seconds = build_wait_seconds
+        self._indexes = LRUCache(max_users)
+        self._builds = {}  # 用户ID -> 构建中的Future
+        self._builds_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, build_workers), thread_name_prefix="chat-search-build")
+        self._stats = {"searches": 0, "builds": 0, "building": 0, "indexed_on_save": 0, "caught_up": 0}
+
+    def search(self, user_id: int, query: str, db: Session, limit: int = 20,
+               session_id: Optional[str] = None) -> Dict:
+        """
+        检索用户的对话消息
+
+        Args:
+            user_id: 用户ID
+            query: 查询文本
+            db: 数据库会话
+            limit: 返回数量
+            session_id: 只检索该会话（为空时检索全部会话）
+
+        Returns:
+            {"status": "ready"/"building", "results": [{"message_id", "session_id", "role", "score", "snippet",
+             "highlights", "created_at"}], "total_messages": 已索引消息数, "took_ms": 耗时}
+        """
+        start = time.perf_counter()
+        self._stats["searches"] += 1
+        if not text_units(query):
+            return {"status": "ready", "results": [], "total_messages": 0, "took_ms": 0.0}
+
+        user_index = self._get_index(user_id)
+        if user_index is None:
+            self._stats["building"] += 1
+            return {
+                "status": "building",
+                "results": [],
+                "total_messages": 0,
+                "took_ms": round((time.perf_counter() - start) * 1000, 3)
+            }
+        self._catch_up(user_id, user_index, db)
+        with user_index.lock:
+            group = user_index.sessions.get(session_id) if session_id else None
+            if session_id and group is None:
+                hits = []
+            else:
+                hits = user_index.index.search(query, limit, group=group)
+            total = len(user_index.index)
+
+        results = []
+        if hits:
+            rows = {
+                row.id: row
+                for row in db.query(
+                    ChatMessage.id, ChatMessage.session_id, ChatMessage.role,
+                    ChatMessage.content, ChatMessage.created_at
+                ).filter(ChatMessage.id.in_([message_id for message_id, _ in hits]))
+            }
+            terms = highlight_terms(query)
+            pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE) if terms else None
+            for message_id, score in hits:
+                row = rows.get(message_id)
+                if row is None:
+                    continue
+                results.append(dict(
+                    {
+                        "message_id": row.id,
+                        "session_id": row.session_id,
+                        "role": row.role,
+                        "score": round(score, 4),
+                        "created_at": row.created_at.isoformat() if row.created_at else None
+                    },
+                    **build_snippet(row.content, pattern, self.snippet_chars)
+                ))
+
+        return {
+            "status": "ready",
+            "results": results,
+            "total_messages": total,
+            "took_ms": round((time.perf_counter() - start) * 1000, 3)
+        }
+
+    def add_messages(self, messages: List[Dict]):
+        """
+        把刚写入的消息加入已加载的索引（索引未加载时忽略，首次检索时从数据库构建）
+
+        Args:
+            messages: [{"id", "user_id", "session_id", "content"}]（id为空的写后缓冲消息在刷新后由检索前的增量读取加入）
+        """
+        for message in messages:
+            if message["id"] is None:
+                continue
+            user_index = self._indexes.get(message["user_id"])
+            if user_index is None:
+                continue
+            with user_index.lock:
+                user_index.add([(message["id"], message["session_id"], message["content"])])
+                user_index.extra_ids.add(message["id"])
+            self._stats["indexed_on_save"] += 1
+
+    def invalidate(self, user_id: int):
+        """丢弃用户的索引（如批量删除消息后）"""
+        self._indexes.pop(user_id)
+
+    def stats(self) -> Dict:
+        """返回检索统计"""
+        with self._builds_lock:
+            pending_builds = len(self._builds)
+        return dict(self._stats, cached_users=len(self._indexes), pending_builds=pending_builds)
+
+    def close(self):
+        """停止后台构建线程（服务停止时调用）"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_index(self, user_id: int) -> Optional[_UserIndex]:
+        """
+        获取用户索引，不存在时提交后台构建并等待一小段时间
+
+        Returns:
+            用户索引；构建未在等待时间内完成时返回None
+        """
+        user_index = self._indexes.get(user_id)
+        if user_index is not None:
+            return user_index
+        with self._builds_lock:
+            user_index = self._indexes.get(user_id)
+            if user_index is not None:
+                return user_index
+            future = self._builds.get(user_id)
+            if future is None:
+                future = self._executor.submit(self._build, user_id)
+                self._builds[user_id] = future
+        try:
+            # 构建失败时异常在这里抛出，下次检索重新提交构建
+            return future.result(timeout=self.build_wait_seconds)
+        except FutureTimeoutError:
+            return None
+
+    def _build(self, user_id: int) -> _UserIndex:
+        """在后台线程中用独立的数据库会话构建用户索引"""
+        start = time.perf_counter()
+        db = SessionLocal()
+        try:
+            user_index = _UserIndex()
+            self._load(user_id, user_index, db)
+            self._indexes.put(user_id, user_index)
+            self._stats["builds"] += 1
+            print(f"用户 {user_id} 的对话检索索引已构建：{len(user_index.index)} 条消息，"
+                  f"耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+            return user_index
+        finally:
+            db.close()
+            with self._builds_lock:
+                self._builds.pop(user_id, None)
+
+    def _catch_up(self, user_id: int, user_index: _UserIndex, db: Session):
+        """读取索引构建后由其他途径写入的消息"""
+        with user_index.lock:
+            before = len(user_index.index)
+            self._load(user_id, user_index, db)
+            self._stats["caught_up"] += len(user_index.index) - before
+
+    @staticmethod
+    def _load(user_id: int, user_index: _UserIndex, db: Session):
+        """按id分批读取 until_id 之后的消息加入索引"""
+        while True:
+            rows = db.query(ChatMessage.id, ChatMessage.session_id, ChatMessage.content).filter(
+                ChatMessage.user_id == user_id,
+                ChatMessage.id > user_index.until_id
+            ).order_by(ChatMessage.id).limit(_LOAD_BATCH).all()
+            user_index.add(rows)
+            if rows:
+                user_index.until_id = rows[-1].id
+                user_index.extra_ids = {message_id for message_id in user_index.extra_ids
+                                        if message_id > user_index.until_id}
+            if len(rows) < _LOAD_BATCH:
+                return
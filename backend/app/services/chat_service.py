@@ -1,16 +1,51 @@
 """
 对话服务：处理AI对话逻辑，包括功能介绍、推荐、反馈收集等
 """
+import base64
 import json
+import threading
 import uuid
+from datetime import datetime
 from typing import List, Dict, Optional, Tuple
+from sqlalchemy import and_, func, or_
 from sqlalchemy.orm import Session
+from app.config import settings
+from app.database.connection import SessionLocal
 from app.services.llm_service import LLMService
+from app.services.chat_archive import ChatArchive
+from app.services.chat_history import ChatHistoryStore
+from app.services.chat_search import ChatSearchService
+from app.services.chat_writer import ChatMessageWriter
+from app.services.greeting_cache import GreetingCache
+from app.services.resume_service import resume_snippet
+from app.services.chat_summary import ConversationSummarizer
+from app.services.user_context import user_context_cache
+from app.utils.intent_matcher import IntentEngine
+from app.utils.token_counter import TokenCounter
 from app.models.chat import ChatMessage, ChatSession
 from app.models.user_preference import UserPreference, UserFeedback
 from app.models.user import User
 from app.models.interview import Interview
 from app.models.task import Task
+from app.models.resume import Resume
+
+# 登录后预生成欢迎消息的模块
+_GREETING_CONTEXT_TYPES = ("general", "learning", "personalized")
+
+
+def _encode_session_cursor(updated_at: datetime, session_pk: int) -> str:
+    """会话列表游标：最后一条记录的 (updated_at, id)"""
+    raw = json.dumps([updated_at.isoformat(), session_pk])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_session_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析会话列表游标，格式错误时抛出ValueError"""
+    try:
+        updated_at, session_pk = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(updated_at), int(session_pk)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
 
 
 class ChatService:
@@ -18,9 +53,51 @@ class ChatService:
 
     def __init__(self):
         self.llm_service = LLMService()
+        self.history = ChatHistoryStore(
+            buffer_size=settings.CHAT_HISTORY_BUFFER_SIZE,
+            max_sessions=settings.CHAT_HISTORY_CACHED_SESSIONS,
+            verify_with_db=settings.CHAT_HISTORY_VERIFY_WITH_DB
+        )
+        self.archive = None
+        if settings.CHAT_ARCHIVE_ENABLED:
+            self.archive = ChatArchive(settings.CHAT_ARCHIVE_DIR, idle_days=settings.CHAT_ARCHIVE_IDLE_DAYS)
+            self.history.archive_source = self.archive.read_session
+        self.writer = ChatMessageWriter(
+            self.history,
+            write_behind=settings.CHAT_WRITE_BEHIND_ENABLED,
+            flush_seconds=settings.CHAT_WRITE_BEHIND_FLUSH_SECONDS,
+            batch_size=settings.CHAT_WRITE_BEHIND_BATCH_SIZE,
+            max_pending=settings.CHAT_WRITE_BEHIND_MAX_PENDING,
+            hard_limit=settings.CHAT_WRITE_BEHIND_HARD_LIMIT
+        )
+        self.intent_engine = IntentEngine.from_file(settings.CHAT_INTENT_KEYWORDS_PATH)
+        self.search = ChatSearchService(
+            max_users=settings.CHAT_SEARCH_MAX_USERS,
+            snippet_chars=settings.CHAT_SEARCH_SNIPPET_CHARS,
+            build_workers=settings.CHAT_SEARCH_BUILD_WORKERS,
+            build_wait_seconds=settings.CHAT_SEARCH_BUILD_WAIT_SECONDS
+        )
+        self.greetings = GreetingCache(
+            ttl_seconds=settings.GREETING_CACHE_TTL_SECONDS,
+            max_entries=settings.GREETING_CACHE_MAX_ENTRIES
+        )
+        self.token_counter = TokenCounter(
+            tokenizer_path=settings.TOKENIZER_PATH,
+            calibration_path=settings.TOKEN_CALIBRATION_PATH
+        )
+        self._prompt_stats = {"turns": 0, "trimmed_turns": 0, "history_tokens": 0, "saved_tokens": 0}
+        self.summarizer = ConversationSummarizer(
+            self.llm_service,
+            trigger_tokens=settings.CHAT_SUMMARY_TRIGGER_TOKENS,
+            keep_messages=settings.CHAT_HISTORY_PROMPT_MESSAGES,
+            summary_max_tokens=settings.CHAT_SUMMARY_MAX_TOKENS,
+            max_sessions=settings.CHAT_HISTORY_CACHED_SESSIONS,
+            token_counter=self.token_counter
+        )
 
-    def get_or_create_session(self, user_id: int, context_type: str = "general", db: Session = None) -> str:
-        """获取或创建对话会话"""
+    def get_or_create_session(self, user_id: int, context_type: str = "general", db: Session = None,
+                              commit: bool = True) -> str:
+        """获取或创建对话会话（commit=False时新会话随调用方的下一次提交写入）"""
         session_id = f"session_{user_id}_{uuid.uuid4().hex[:8]}"
 
         # 查找最近的活跃会话
@@ -42,27 +119,129 @@ class ChatService:
             context_type=context_type
         )
         db.add(new_session)
-        db.commit()
+        if commit:
+            db.commit()
         return session_id
 
     def get_conversation_history(self, session_id: str, limit: int = 20, db: Session = None) -> List[Dict]:
-        """获取对话历史"""
-        messages = db.query(ChatMessage).filter(
-            ChatMessage.session_id == session_id
-        ).order_by(ChatMessage.created_at.asc()).limit(limit).all()
-
-        return [
-            {
-                "role": msg.role,
-                "content": msg.content,
-                "metadata": msg.meta_data or {},
-                "created_at": msg.created_at.isoformat() if msg.created_at else None
+        """获取对话历史（最近limit条，按时间正序）"""
+        return self.history.get_recent(session_id, limit, db)
+
+    def list_sessions(self, user_id: int, context_type: Optional[str], cursor: Optional[str], limit: int,
+                      db: Session) -> Tuple[List[Dict], Optional[str]]:
+        """
+        按最后活跃时间倒序分页列出会话（键集分页，不读取消息内容）
+
+        Args:
+            user_id: 用户ID
+            context_type: 模块类型（为空时不过滤）
+            cursor: 上一页返回的游标，为空时返回第一页
+            limit: 每页条数
+            db: 数据库会话
+
+        Returns:
+            (会话列表, 下一页游标或None)
+
+        Raises:
+            ValueError: 游标格式错误
+        """
+        query = db.query(
+            ChatSession.id,
+            ChatSession.session_id,
+            ChatSession.summary,
+            ChatSession.context_type,
+            ChatSession.created_at,
+            ChatSession.updated_at,
+            ChatSession.archive_info
+        ).filter(ChatSession.user_id == user_id)
+        if context_type:
+            query = query.filter(ChatSession.context_type == context_type)
+        if cursor:
+            updated_at, last_id = _decode_session_cursor(cursor)
+            query = query.filter(or_(
+                ChatSession.updated_at < updated_at,
+                and_(ChatSession.updated_at == updated_at, ChatSession.id < last_id)
+            ))
+        rows = query.order_by(ChatSession.updated_at.desc(), ChatSession.id.desc()).limit(limit + 1).all()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        # 一次分组查询得到本页各会话的消息数和最后一条消息时间
+        counts = {}
+        if rows:
+            counts = {
+                session_id: (count, last_at)
+                for session_id, count, last_at in db.query(
+                    ChatMessage.session_id,
+                    func.count(ChatMessage.id),
+                    func.max(ChatMessage.created_at)
+                ).filter(
+                    ChatMessage.session_id.in_([row.session_id for row in rows])
+                ).group_by(ChatMessage.session_id)
             }
-            for msg in messages
-        ]
+
+        sessions = []
+        for row in rows:
+            count, last_at = counts.get(row.session_id, (0, None))
+            last_at = last_at.isoformat() if last_at else None
+            if row.archive_info:
+                # 已归档的消息不在热表中，数量和时间取自归档记录
+                count += row.archive_info.get("messages", 0)
+                last_at = last_at or row.archive_info.get("last_message_at")
+            sessions.append({
+                "id": row.id,
+                "session_id": row.session_id,
+                "name": row.summary or "未命名会话",
+                "context_type": row.context_type,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+                "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+                "message_count": count,
+                "last_message_at": last_at,
+                "archived": bool(row.archive_info)
+            })
+
+        next_cursor = _encode_session_cursor(rows[-1].updated_at, rows[-1].id) if has_more else None
+        return sessions, next_cursor
 
     def get_user_context(self, user: User, db: Session) -> Dict:
-        """获取用户上下文信息"""
+        """获取用户上下文信息（按用户版本号缓存）"""
+        return self._get_context_entry(user.id, db, user)["context"]
+
+    def _get_context_entry(self, user_id: int, db: Session, user: Optional[User] = None) -> Dict:
+        """
+        获取用户上下文缓存条目，未命中时从数据库加载
+
+        Args:
+            user_id: 用户ID
+            db: 数据库会话
+            user: 已查询到的用户对象（为空时按需查询）
+
+        Returns:
+            user_context_cache 的缓存条目
+        """
+        entry = user_context_cache.get(user_id)
+        if entry is None:
+            # 先读版本号再加载，加载期间发生的写入会使本条目在下次读取时失效
+            version = user_context_cache.version(user_id)
+            if user is None:
+                user = db.query(User).filter(User.id == user_id).first()
+            entry = user_context_cache.put(user_id, version, self._load_user_context(user, db))
+        return entry
+
+    def _get_system_prompt(self, entry: Dict, context_type: str) -> str:
+        """获取与上下文版本绑定的系统提示词"""
+        return user_context_cache.memoize(
+            entry, ("system_prompt", context_type),
+            lambda: self._build_system_prompt(entry["context"], context_type)
+        )
+
+    def _get_resume_info(self, entry: Dict, user_id: int, db: Session) -> Dict:
+        """获取与上下文版本绑定的激活简历信息：{"exists", "context"}"""
+        return user_context_cache.memoize(entry, "resume", lambda: self._load_resume_info(user_id, db))
+
+    def _load_user_context(self, user: User, db: Session) -> Dict:
+        """从数据库加载用户上下文"""
         # 获取用户偏好
         preference = db.query(UserPreference).filter(UserPreference.user_id == user.id).first()
 
@@ -109,10 +288,13 @@ class ChatService:
         }
 
     def generate_greeting(self, user: User, db: Session, context_type: str = "general") -> str:
-        """生成欢迎消息和功能介绍"""
+        """生成欢迎消息和功能介绍（按用户上下文版本缓存）"""
         try:
-            context = self.get_user_context(user, db)
-            system_prompt = self._build_system_prompt(context, context_type)
+            entry = self._get_context_entry(user.id, db, user)
+            cached = self.greetings.get(user.id, context_type, entry["version"])
+            if cached is not None:
+                return cached
+            system_prompt = self._get_system_prompt(entry, context_type)
 
             if context_type == "general":
                 prompt = f"""请生成一条欢迎消息，包括：
@@ -138,13 +320,7 @@ class ChatService:
 """
             else:  # personalized
                 # 检查是否有简历
-                from app.models.resume import Resume
-                resume = db.query(Resume).filter(
-                    Resume.user_id == user.id,
-                    Resume.is_active == 1
-                ).first()
-
-                if resume:
+                if self._get_resume_info(entry, user.id, db)["exists"]:
                     prompt = f"""请生成一条个性化模块的欢迎消息，包括：
 1. 欢迎回来，已检测到用户已上传简历
 2. 说明可以基于简历进行个性化面试训练
@@ -175,6 +351,8 @@ class ChatService:
                 paragraphs = response.split('\n\n')
                 response = paragraphs[0].strip()
 
+            if not response.startswith("生成失败"):
+                self.greetings.put(user.id, context_type, entry["version"], response)
             return response
         except Exception as e:
             print(f"生成欢迎消息失败: {e}")
@@ -186,6 +364,45 @@ class ChatService:
             }
             return default_greetings.get(context_type, default_greetings["general"])
 
+    def save_greeting(self, user_id: int, session_id: str, greeting: str, db: Session):
+        """
+        保存欢迎消息，会话最新一条已是同样的欢迎消息时不重复写入（重复打开页面）
+
+        Args:
+            user_id: 用户ID
+            session_id: 会话ID
+            greeting: 欢迎消息
+            db: 数据库会话
+        """
+        latest = self.get_conversation_history(session_id, limit=1, db=db)
+        if latest and latest[-1]["role"] == "assistant" and latest[-1]["content"] == greeting:
+            return
+        self.save_messages([{
+            "user_id": user_id,
+            "session_id": session_id,
+            "role": "assistant",
+            "content": greeting,
+            "metadata": {"type": "greeting"}
+        }], db)
+
+    def prewarm_greetings(self, user_id: int):
+        """在后台为各模块预生成欢迎消息（登录后调用）"""
+        threading.Thread(target=self._prewarm_greetings, args=(user_id,), name="greeting-prewarm", daemon=True).start()
+
+    def _prewarm_greetings(self, user_id: int):
+        """预生成欢迎消息，使用独立的数据库会话"""
+        db = SessionLocal()
+        try:
+            user = db.query(User).filter(User.id == user_id).first()
+            if user is None:
+                return
+            for context_type in _GREETING_CONTEXT_TYPES:
+                self.generate_greeting(user, db, context_type)
+        except Exception as e:
+            print(f"预生成欢迎消息失败: {e}")
+        finally:
+            db.close()
+
     def process_user_message(
             self,
             user_id: int,
@@ -196,58 +413,22 @@ class ChatService:
     ) -> Tuple[str, Dict]:
         """处理用户消息并生成回复"""
         try:
-            # 获取对话历史
-            history = self.get_conversation_history(session_id, limit=10, db=db)
-
-            # 获取用户上下文
-            user = db.query(User).filter(User.id == user_id).first()
-            context = self.get_user_context(user, db)
+            # 获取用户上下文（缓存命中时不查询数据库）
+            entry = self._get_context_entry(user_id, db)
+            context = entry["context"]
 
-            # 如果是个性化模块，获取简历信息
-            resume_context = ""
+            # 构建系统提示词，个性化模块附加简历信息
+            system_prompt = self._get_system_prompt(entry, context_type)
             if context_type == "personalized":
-                from app.models.resume import Resume
-                resume = db.query(Resume).filter(
-                    Resume.user_id == user_id,
-                    Resume.is_active == 1
-                ).first()
-                if resume and resume.parsed_data:
-                    resume_info = []
-                    if resume.parsed_data.get('name'):
-                        resume_info.append(f"姓名：{resume.parsed_data.get('name')}")
-                    if resume.parsed_data.get('education'):
-                        resume_info.append(f"教育背景：{resume.parsed_data.get('education')}")
-                    if resume.parsed_data.get('experience'):
-                        exp = resume.parsed_data.get('experience')
-                        if isinstance(exp, list):
-                            exp = ', '.join(exp[:3])  # 只取前3个
-                        resume_info.append(f"工作经历：{exp}")
-                    if resume.parsed_data.get('skills'):
-                        skills = resume.parsed_data.get('skills')
-                        if isinstance(skills, list):
-                            skills = ', '.join(skills[:5])  # 只取前5个技能
-                        resume_info.append(f"技能：{skills}")
-
-                    if resume_info:
-                        resume_context = f"""
-用户简历信息：
-{chr(10).join(resume_info)}
+                system_prompt += self._get_resume_info(entry, user_id, db)["context"]
+            # 较早的消息已合并进滚动摘要
+            conversation_summary = self.summarizer.get_state(session_id, db)["summary"]
+            if conversation_summary:
+                system_prompt += f"""
+之前对话的摘要：
+{conversation_summary}
 """
 
-            # 构建系统提示词
-            system_prompt = self._build_system_prompt(context, context_type)
-            if resume_context:
-                system_prompt += resume_context
-
-            # 构建对话历史
-            messages = []
-            for msg in history[-6:]:  # 只取最近6条
-                messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
-            messages.append({"role": "user", "content": message})
-
             # 如果是个性化模块，添加特殊提示让对话更自然
             if context_type == "personalized":
                 system_prompt += """
@@ -267,6 +448,19 @@ class ChatService:
             # 添加重要提示：只返回一条回复
             system_prompt += "\n\n重要：请只返回一条完整的回复，不要分段或多条消息。"
 
+            # 提示词预算扣除系统提示词和本条消息后，剩余部分从新到旧填充摘要之后的历史消息
+            user_message = {"role": "user", "content": message}
+            history_budget = max(0, settings.CHAT_PROMPT_TOKEN_BUDGET
+                                 - self.token_counter.count(system_prompt)
+                                 - self.token_counter.count_message(user_message))
+            recent = self.get_conversation_history(session_id, limit=settings.CHAT_HISTORY_BUFFER_SIZE, db=db)
+            _, history, usage = self.summarizer.build_prompt_history(session_id, recent, db, budget=history_budget)
+            self._record_prompt_usage(usage)
+
+            # 构建对话历史
+            messages = [{"role": msg["role"], "content": msg["content"]} for msg in history]
+            messages.append(user_message)
+
             # 生成回复
             response = self.llm_service.generate_chat(
                 messages,
@@ -285,22 +479,30 @@ class ChatService:
                     response = paragraphs[0]
 
             # 检测意图和推荐功能
-            intent = self._detect_intent(message, context)
+            detection = self.intent_engine.detect(message)
+            intent = detection["intent"]
             recommendations = self._generate_recommendations(intent, context, db)
 
-            # 保存消息
-            self._save_message(user_id, session_id, "user", message, {}, db)
-            self._save_message(
-                user_id,
-                session_id,
-                "assistant",
-                response,
-                {"intent": intent, "recommendations": recommendations},
-                db
-            )
+            # 保存消息（一轮对话的两条消息在同一事务中写入）
+            self.save_messages([
+                {"user_id": user_id, "session_id": session_id, "role": "user", "content": message, "metadata": {}},
+                {
+                    "user_id": user_id,
+                    "session_id": session_id,
+                    "role": "assistant",
+                    "content": response,
+                    "metadata": {
+                        "intent": intent,
+                        "intents": detection["intents"],
+                        "recommendations": recommendations,
+                        "prompt_tokens": dict(usage, budget=history_budget)
+                    }
+                }
+            ], db)
 
             return response, {
                 "intent": intent,
+                "intents": detection["intents"],
                 "recommendations": recommendations,
                 "suggested_actions": self._get_suggested_actions(intent)
             }
@@ -450,23 +652,26 @@ class ChatService:
 
         return system_prompt
 
-    def _detect_intent(self, message: str, context: Dict) -> str:
-        """检测用户意图"""
-        message_lower = message.lower()
-
-        # 简单的关键词匹配（可以升级为更复杂的NLP模型）
-        if any(word in message_lower for word in ['学习', '任务', '练习', '知识']):
-            return "learning"
-        elif any(word in message_lower for word in ['简历', '上传', '个性化', '定制']):
-            return "personalized"
-        elif any(word in message_lower for word in ['面试', '模拟', '测试']):
-            return "interview"
-        elif any(word in message_lower for word in ['反馈', '建议', '改进']):
-            return "feedback"
-        elif any(word in message_lower for word in ['帮助', '功能', '介绍', '怎么用']):
-            return "help"
-        else:
-            return "general"
+    def _load_resume_info(self, user_id: int, db: Session) -> Dict:
+        """查询激活简历，使用保存时渲染的简历摘要生成对话提示词中的简历信息"""
+        row = db.query(Resume.id, Resume.context_snippet).filter(
+            Resume.user_id == user_id,
+            Resume.is_active == 1
+        ).first()
+        if not row:
+            return {"exists": False, "context": ""}
+
+        snippet = row.context_snippet
+        if snippet is None:
+            snippet = resume_snippet(db.query(Resume).filter(Resume.id == row.id).first(), db)
+
+        resume_context = ""
+        if snippet:
+            resume_context = f"""
+用户简历信息：
+{snippet}
+"""
+        return {"exists": True, "context": resume_context}
 
     def _generate_recommendations(self, intent: str, context: Dict, db: Session) -> List[Dict]:
         """生成功能推荐"""
@@ -512,25 +717,50 @@ class ChatService:
         }
         return actions_map.get(intent, ["开始对话", "查看帮助"])
 
-    def _save_message(
-            self,
-            user_id: int,
-            session_id: str,
-            role: str,
-            content: str,
-            metadata: Dict,
-            db: Session
-    ):
-        """保存消息"""
-        message = ChatMessage(
-            user_id=user_id,
-            session_id=session_id,
-            role=role,
-            content=content,
-            meta_data=metadata
-        )
-        db.add(message)
-        db.commit()
+    def save_messages(self, messages: List[Dict], db: Session) -> List[Dict]:
+        """
+        保存一组消息（同一事务，或在写后缓冲模式下批量写入）
+
+        Args:
+            messages: [{"user_id", "session_id", "role", "content", "metadata"}]
+            db: 数据库会话
+
+        Returns:
+            历史记录格式的消息
+        """
+        saved = self.writer.save(messages, db)
+        self.search.add_messages([
+            dict(item, user_id=message["user_id"], session_id=message["session_id"])
+            for message, item in zip(messages, saved)
+        ])
+        return saved
+
+    def get_stats(self) -> Dict:
+        """返回对话相关缓存、意图识别和检索统计"""
+        return {
+            "history": self.history.stats(),
+            "summarizer": self.summarizer.stats(),
+            "writer": self.writer.stats(),
+            "greetings": self.greetings.stats(),
+            "user_context": user_context_cache.stats(),
+            "intents": self.intent_engine.stats(),
+            "search": self.search.stats(),
+            "archive": self.archive.stats() if self.archive else None,
+            "prompt": dict(self._prompt_stats, token_counter=self.token_counter.backend)
+        }
+
+    def _record_prompt_usage(self, usage: Dict):
+        """累计每轮对话放入提示词的历史token数和截断节省的token数"""
+        self._prompt_stats["turns"] += 1
+        self._prompt_stats["history_tokens"] += usage["history_tokens"]
+        self._prompt_stats["saved_tokens"] += usage["saved_tokens"]
+        if usage["dropped_messages"]:
+            self._prompt_stats["trimmed_turns"] += 1
+
+    def close(self):
+        """服务停止时写入缓冲中的消息，停止检索索引的后台构建"""
+        self.writer.close()
+        self.search.close()
 
     def _update_preferences_from_feedback(
             self,
@@ -0,0 +1,216 @@
+"""
+对话摘要服务：会话未摘要的历史超过token阈值时，在后台把较早的消息合并进会话的滚动摘要
+"""
+import threading
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.database.connection import SessionLocal
+from app.models.chat import ChatMessage, ChatSession
+from app.utils.lru_cache import LRUCache
+from app.utils.token_counter import TokenCounter
+
+# 单次摘要最多合并的消息数，积压更多时分多次完成
+_FOLD_BATCH = 100
+
+_SUMMARY_SYSTEM_PROMPT = "你是对话记录员，负责把AI面试学习助手与用户的对话压缩成简洁准确的摘要。"
+
+
+class ConversationSummarizer:
+    """
+    滚动对话摘要
+
+    - 会话的摘要和已合并到的消息id保存在 chat_sessions 上，进程内缓存，避免每条消息查询会话
+    - 构建提示词时使用：摘要 + 摘要之后的消息（按调用方给出的token预算从新到旧截取）
+    - 摘要之后的消息超过触发阈值时启动后台线程，保留最近若干条原样消息，其余合并进摘要
+    - 写回时以旧的已合并id作为条件，多个进程同时摘要同一会话时只有一个生效
+    """
+
+    def __init__(self, llm_service, trigger_tokens: int = 1500, keep_messages: int = 6,
+                 summary_max_tokens: int = 400, max_sessions: int = 1000,
+                 token_counter: Optional[TokenCounter] = None):
+        """
+        Args:
+            llm_service: 生成摘要使用的LLMService
+            trigger_tokens: 摘要之后的消息超过该token数时触发摘要
+            keep_messages: 摘要时原样保留的最近消息条数
+            summary_max_tokens: 摘要的最大token数
+            max_sessions: 最多缓存摘要的会话数
+            token_counter: 计算消息token数（为空时使用未校准的估算）
+        """
+        self.llm_service = llm_service
+        self.token_counter = token_counter or TokenCounter()
+        self.trigger_tokens = trigger_tokens
+        self.keep_messages = keep_messages
+        self.summary_max_tokens = summary_max_tokens
+        self._states = LRUCache(max_sessions)
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stats = {"summaries": 0, "folded_messages": 0, "failures": 0}
+
+    def get_state(self, session_id: str, db: Session) -> Dict:
+        """
+        获取会话的摘要状态
+
+        Args:
+            session_id: 会话ID
+            db: 数据库会话
+
+        Returns:
+            {"summary": 摘要文本, "until_id": 已合并进摘要的最后一条消息id}
+        """
+        state = self._states.get(session_id)
+        if state is None:
+            row = db.query(ChatSession.context_summary, ChatSession.summarized_until_id).filter(
+                ChatSession.session_id == session_id
+            ).first()
+            state = {"summary": row[0] if row else None, "until_id": (row[1] if row else None) or 0}
+            self._states.put(session_id, state)
+        return state
+
+    def build_prompt_history(self, session_id: str, history: List[Dict], db: Session,
+                             budget: Optional[int] = None):
+        """
+        选出放入提示词的历史消息，必要时触发后台摘要
+
+        Args:
+            session_id: 会话ID
+            history: 最近的历史消息（按时间正序，需包含id）
+            db: 数据库会话
+            budget: 历史消息的token预算（为空时使用触发阈值）
+
+        Returns:
+            (摘要文本或None, 放入提示词的消息列表, {"candidate_tokens", "history_tokens", "saved_tokens", "dropped_messages"})
+        """
+        if budget is None:
+            budget = self.trigger_tokens
+        state = self.get_state(session_id, db)
+        # id为空的是写后缓冲中尚未写入数据库的消息
+        pending = [message for message in history if message["id"] is None or message["id"] > state["until_id"]]
+        tokens = [self.token_counter.count_message(message) for message in pending]
+
+        # 从新到旧填充预算，放不下的消息及更早的消息都不再放入，保持对话连续
+        used, kept = 0, 0
+        for message_tokens in reversed(tokens):
+            if used + message_tokens > budget:
+                break
+            used += message_tokens
+            kept += 1
+        selected = pending[len(pending) - kept:]
+
+        candidate = sum(tokens)
+        if candidate > self.trigger_tokens:
+            self.schedule(session_id)
+        usage = {
+            "candidate_tokens": candidate,
+            "history_tokens": used,
+            "saved_tokens": candidate - used,
+            "dropped_messages": len(pending) - kept
+        }
+        return state["summary"], selected, usage
+
+    def schedule(self, session_id: str):
+        """在后台线程中摘要会话（同一会话同时只运行一个）"""
+        with self._lock:
+            if session_id in self._running:
+                return
+            self._running.add(session_id)
+        threading.Thread(target=self._run, args=(session_id,), name="chat-summarizer", daemon=True).start()
+
+    def stats(self) -> Dict:
+        """返回摘要统计"""
+        return dict(self._stats, running=len(self._running), cached_sessions=len(self._states))
+
+    def _run(self, session_id: str):
+        """后台摘要入口：使用独立的数据库会话"""
+        db = SessionLocal()
+        try:
+            self.summarize(session_id, db)
+        except Exception as e:
+            self._stats["failures"] += 1
+            print(f"会话摘要失败 {session_id}: {e}")
+        finally:
+            db.close()
+            with self._lock:
+                self._running.discard(session_id)
+
+    def summarize(self, session_id: str, db: Session) -> Optional[Dict]:
+        """
+        把摘要之后、最近keep_messages条之前的消息合并进摘要
+
+        Args:
+            session_id: 会话ID
+            db: 数据库会话
+
+        Returns:
+            新的摘要状态，无需摘要或写回冲突时返回None
+        """
+        row = db.query(ChatSession.context_summary, ChatSession.summarized_until_id).filter(
+            ChatSession.session_id == session_id
+        ).first()
+        if row is None:
+            return None
+        summary, until_id = row[0], row[1] or 0
+
+        messages = db.query(ChatMessage.id, ChatMessage.role, ChatMessage.content).filter(
+            ChatMessage.session_id == session_id,
+            ChatMessage.id > until_id
+        ).order_by(ChatMessage.id).limit(_FOLD_BATCH + self.keep_messages).all()
+        fold = messages[:max(0, len(messages) - self.keep_messages)]
+        if not fold:
+            self._states.put(session_id, {"summary": summary, "until_id": until_id})
+            return None
+
+        new_summary = self._generate_summary(summary, fold)
+        if not new_summary:
+            self._stats["failures"] += 1
+            return None
+
+        new_until_id = fold[-1].id
+        updated = db.query(ChatSession).filter(
+            ChatSession.session_id == session_id,
+            ChatSession.summarized_until_id == row[1]
+        ).update({
+            ChatSession.context_summary: new_summary,
+            ChatSession.summarized_until_id: new_until_id,
+            # 摘要不算会话活动，保持会话的最后活跃时间不变
+            ChatSession.updated_at: ChatSession.updated_at
+        }, synchronize_session=False)
+        db.commit()
+
+        if not updated:
+            # 其他进程已经更新了摘要，丢弃本地缓存，下次读取时重新加载
+            self._states.pop(session_id)
+            return None
+
+        state = {"summary": new_summary, "until_id": new_until_id}
+        self._states.put(session_id, state)
+        self._stats["summaries"] += 1
+        self._stats["folded_messages"] += len(fold)
+        print(f"会话 {session_id} 已摘要 {len(fold)} 条消息（至消息 {new_until_id}）")
+        return state
+
+    def _generate_summary(self, summary: Optional[str], messages) -> Optional[str]:
+        """调用大模型生成新的滚动摘要"""
+        role_names = {"user": "用户", "assistant": "助手"}
+        transcript = "\n".join(
+            f"{role_names.get(message.role, message.role)}：{message.content}" for message in messages
+        )
+        prompt = f"""已有摘要：
+{summary or '（无）'}
+
+新的对话内容：
+{transcript}
+
+请把新的对话内容合并进已有摘要，输出更新后的完整摘要。
+要求：
+- 保留用户的目标、背景、已讨论的问题和结论、用户的回答表现及尚未解决的问题
+- 省略寒暄和重复内容
+- 使用第三人称陈述，不超过{self.summary_max_tokens}字
+- 只输出摘要本身
+"""
+        result = self.llm_service.generate(prompt, _SUMMARY_SYSTEM_PROMPT, temperature=0.3,
+                                           max_tokens=self.summary_max_tokens)
+        result = (result or "").strip()
+        if not result or result.startswith("生成失败"):
+            return None
+        return result
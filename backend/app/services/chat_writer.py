@@ -0,0 +1,261 @@
+"""
+对话消息持久化：一轮对话的消息在同一事务中写入，可选写后缓冲模式批量插入
+"""
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy import insert
+from sqlalchemy.exc import InterfaceError, OperationalError, StatementError
+from sqlalchemy.orm import Session
+from app.database.connection import SessionLocal
+from app.models.chat import ChatMessage
+from app.services.chat_history import message_to_dict
+
+
+class ChatMessageWriter:
+    """
+    对话消息写入器
+
+    - 同步模式：一次请求的所有消息在一个事务中写入，只提交一次
+    - 写后缓冲模式：消息先进入内存队列并立即对历史读取可见（id为空），后台线程按时间间隔
+      或队列长度批量 INSERT；队列超过上限时由写入方同步刷新；服务停止时刷新剩余消息
+    - 每个INSERT批次单独提交；批次因数据错误失败时二分拆开重试，最终单独失败的消息记录日志后丢弃，
+      不会阻塞后续消息；连接类错误（数据库不可用）保留队列等待下次刷新
+    - 数据库长时间不可用导致队列达到硬上限时拒绝新消息，内存占用有界
+    - 写后缓冲模式下进程被强制终止时，最多丢失一个刷新间隔内的消息
+    """
+
+    def __init__(self, history, write_behind: bool = False, flush_seconds: float = 0.5,
+                 batch_size: int = 200, max_pending: int = 5000, hard_limit: int = 20000):
+        """
+        Args:
+            history: ChatHistoryStore实例，写入后同步更新会话缓冲区
+            write_behind: 是否启用写后缓冲
+            flush_seconds: 后台刷新间隔（秒）
+            batch_size: 队列达到该长度时立即刷新，也是单条 INSERT 的最大行数
+            max_pending: 队列上限，超过时写入方同步刷新
+            hard_limit: 队列硬上限，同步刷新后仍达到该长度时拒绝新消息
+        """
+        self.history = history
+        self.write_behind = write_behind
+        self.flush_seconds = flush_seconds
+        self.batch_size = max(1, batch_size)
+        self.max_pending = max(self.batch_size, max_pending)
+        self.hard_limit = max(self.max_pending, hard_limit)
+        self._pending = OrderedDict()  # 会话ID -> [(user_id, 写入时间, message_to_dict格式的消息)]
+        self._pending_count = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+        self._stats = {"messages": 0, "commits": 0, "flushes": 0, "flush_failures": 0, "dropped": 0, "rejected": 0}
+
+        if self.write_behind:
+            self.history.pending_source = self.pending_for
+            self._thread = threading.Thread(target=self._flush_loop, name="chat-message-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def save(self, messages: List[Dict], db: Session) -> List[Dict]:
+        """
+        写入一组消息
+
+        Args:
+            messages: [{"user_id", "session_id", "role", "content", "metadata"}]，按先后顺序
+            db: 数据库会话（同步模式下与会话中其他待提交的写入一起提交）
+
+        Returns:
+            message_to_dict 格式的消息（写后缓冲模式下id为空，刷新后可从历史中读到）
+
+        Raises:
+            RuntimeError: 写后缓冲队列已达到硬上限（数据库持续不可用）
+        """
+        now = datetime.now()
+        if not self.write_behind:
+            rows = [
+                ChatMessage(
+                    user_id=message["user_id"],
+                    session_id=message["session_id"],
+                    role=message["role"],
+                    content=message["content"],
+                    meta_data=message.get("metadata") or {},
+                    created_at=now
+                )
+                for message in messages
+            ]
+            db.add_all(rows)
+            db.flush()
+            # 提交前取出字段，提交后不需要再次查询刷新对象
+            saved = [message_to_dict(row) for row in rows]
+            db.commit()
+            self._stats["messages"] += len(saved)
+            self._stats["commits"] += 1
+            for row, message in zip(rows, saved):
+                self.history.append(row.session_id, message)
+            return saved
+
+        if self._pending_count + len(messages) > self.hard_limit:
+            self.flush()
+            if self._pending_count + len(messages) > self.hard_limit:
+                self._stats["rejected"] += len(messages)
+                raise RuntimeError(f"对话消息写入队列已满（{self._pending_count} 条待写入），请稍后重试")
+
+        # 同一请求中其他待提交的写入（如新建会话）仍立即提交
+        if db.new or db.dirty or db.deleted:
+            db.commit()
+
+        saved = []
+        with self._lock:
+            for message in messages:
+                item = {
+                    "id": None,
+                    "role": message["role"],
+                    "content": message["content"],
+                    "metadata": message.get("metadata") or {},
+                    "created_at": now.isoformat()
+                }
+                self._pending.setdefault(message["session_id"], []).append((message["user_id"], now, item))
+                self._pending_count += 1
+                saved.append(item)
+            pending_count = self._pending_count
+        self._stats["messages"] += len(saved)
+        for message, item in zip(messages, saved):
+            self.history.append(message["session_id"], item)
+
+        if pending_count >= self.max_pending:
+            self.flush()
+        elif pending_count >= self.batch_size:
+            self._wakeup.set()
+        return saved
+
+    def pending_for(self, session_id: str) -> List[Dict]:
+        """返回会话中尚未写入数据库的消息"""
+        with self._lock:
+            return [item for _, _, item in self._pending.get(session_id, [])]
+
+    def flush(self) -> int:
+        """
+        把队列中的消息批量写入数据库
+
+        Returns:
+            写入的消息数
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = [(session_id, list(items)) for session_id, items in self._pending.items()]
+            if not batch:
+                return 0
+
+            rows = []
+            for session_id, items in batch:
+                for user_id, created_at, item in items:
+                    rows.append({
+                        "user_id": user_id,
+                        "session_id": session_id,
+                        "role": item["role"],
+                        "content": item["content"],
+                        "meta_data": item["metadata"],
+                        "created_at": created_at
+                    })
+
+            # 按顺序处理，done 之前的消息已写入或已丢弃，可以从队列移除
+            done, written = 0, 0
+            db = SessionLocal()
+            try:
+                for start in range(0, len(rows), self.batch_size):
+                    chunk = rows[start:start + self.batch_size]
+                    written += self._insert_rows(db, chunk)
+                    done += len(chunk)
+            except (OperationalError, InterfaceError) as e:
+                self._stats["flush_failures"] += 1
+                print(f"批量写入对话消息失败，稍后重试: {e}")
+            finally:
+                db.close()
+            if not done:
+                return 0
+
+            with self._lock:
+                for session_id, items in batch:
+                    count = min(len(items), done)
+                    done -= count
+                    remaining = self._pending.get(session_id, [])[count:]
+                    if remaining:
+                        self._pending[session_id] = remaining
+                    else:
+                        self._pending.pop(session_id, None)
+                    self._pending_count -= count
+                    if not done:
+                        break
+            # 已写入的消息在缓冲区中没有id，丢弃缓冲区，下次读取时带上数据库id重新加载
+            self.history.invalidate(*(session_id for session_id, _ in batch))
+            self._stats["flushes"] += 1
+            return written
+
+    def _insert_rows(self, db: Session, rows: List[Dict]) -> int:
+        """
+        在一个事务中插入一批消息；因数据错误失败时二分拆开重试，单独失败的消息记录日志后丢弃
+
+        Args:
+            db: 数据库会话
+            rows: 待插入的消息行
+
+        Returns:
+            写入的消息数
+
+        Raises:
+            OperationalError/InterfaceError: 连接类错误，由调用方保留队列稍后重试
+        """
+        try:
+            db.execute(insert(ChatMessage), rows)
+            db.commit()
+            self._stats["commits"] += 1
+            return len(rows)
+        except StatementError as e:
+            db.rollback()
+            if isinstance(e, (OperationalError, InterfaceError)) or getattr(e, "connection_invalidated", False):
+                raise
+            if len(rows) == 1:
+                row = rows[0]
+                self._stats["dropped"] += 1
+                print(f"丢弃无法写入的对话消息 session={row['session_id']} user={row['user_id']} "
+                      f"role={row['role']} content={str(row['content'])[:50]!r}: {getattr(e, 'orig', e)}")
+                return 0
+        middle = len(rows) // 2
+        return self._insert_rows(db, rows[:middle]) + self._insert_rows(db, rows[middle:])
+
+    def close(self):
+        """停止后台线程并写入剩余消息（服务停止时调用）"""
+        if not self.write_behind or self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_seconds * 4 + 5)
+        # 写入失败时重试几次，尽量不丢消息
+        for _ in range(3):
+            self.flush()
+            if not self._pending_count:
+                break
+            time.sleep(0.5)
+        if self._pending_count:
+            print(f"服务停止时仍有 {self._pending_count} 条对话消息未能写入")
+
+    def stats(self) -> Dict:
+        """返回写入统计"""
+        return dict(self._stats, write_behind=self.write_behind, pending=self._pending_count)
+
+    def _flush_loop(self):
+        """后台刷新线程"""
+        while not self._closed:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            if self._closed:
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"对话消息刷新线程异常: {e}")
@@ -0,0 +1,110 @@
+"""
+查询向量缓存：缓存归一化查询文本到embedding的映射，支持批量查找和跨重启持久化
+"""
+import atexit
+import os
+import re
+import unicodedata
+import numpy as np
+from typing import List, Dict, Optional
+from app.utils.lru_cache import LRUCache
+
+# 查询末尾可忽略的标点
+_TRAILING_PUNCT = re.compile(r'[\s?？!！。.,，;；~～]+$')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_query(text: str) -> str:
+    """
+    归一化查询文本，使等价问题共享缓存条目
+
+    处理：NFKC全半角统一、去首尾空白、合并空白、英文小写、去除末尾标点
+    """
+    text = unicodedata.normalize("NFKC", text or "")
+    text = _WHITESPACE.sub(" ", text.strip()).lower()
+    return _TRAILING_PUNCT.sub("", text)
+
+
+class EmbeddingCache:
+    """查询embedding的LRU缓存"""
+
+    def __init__(self, max_size: int = 10000, persist_path: Optional[str] = None, model_name: str = ""):
+        """
+        初始化缓存
+
+        Args:
+            max_size: 最大缓存条目数
+            persist_path: 持久化文件路径（.npz），为空则不持久化
+            model_name: 生成向量的模型名，模型变化时不加载旧缓存
+        """
+        self._cache = LRUCache(max_size)
+        self.persist_path = persist_path
+        self.model_name = model_name
+
+        if self.persist_path:
+            self.load()
+            atexit.register(self.save)
+
+    def get_many(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        """
+        批量查找缓存
+
+        Args:
+            texts: 原始查询文本列表
+
+        Returns:
+            命中的 {归一化文本: 向量}
+        """
+        keys = list(dict.fromkeys(normalize_query(text) for text in texts))
+        return self._cache.get_many(keys)
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """批量写入缓存，键为归一化文本"""
+        for key, vector in items.items():
+            self._cache.put(key, np.asarray(vector, dtype=np.float32))
+
+    def stats(self) -> Dict:
+        """返回命中统计"""
+        return self._cache.stats()
+
+    def clear(self):
+        """清空缓存"""
+        self._cache.clear()
+
+    def load(self):
+        """从持久化文件加载缓存"""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            data = np.load(self.persist_path, allow_pickle=False)
+            if str(data["model"]) != self.model_name:
+                print(f"向量缓存模型不一致，忽略: {self.persist_path}")
+                return
+            for key, vector in zip(data["keys"], data["vectors"]):
+                self._cache.put(str(key), vector)
+            print(f"已加载 {len(self._cache)} 条查询向量缓存")
+        except Exception as e:
+            print(f"加载向量缓存失败: {e}")
+
+    def save(self):
+        """将缓存写入持久化文件（先写临时文件再原子替换）"""
+        if not self.persist_path:
+            return
+        items = self._cache.items()
+        if not items:
+            return
+        try:
+            directory = os.path.dirname(self.persist_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.persist_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    model=np.array(self.model_name),
+                    keys=np.array([key for key, _ in items]),
+                    vectors=np.stack([vector for _, vector in items])
+                )
+            os.replace(tmp_path, self.persist_path)
+        except Exception as e:
+            print(f"保存向量缓存失败: {e}")
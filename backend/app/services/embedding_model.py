@@ -0,0 +1,227 @@
+"""
+Embedding模型生命周期：启动时后台加载、预热，并对外提供就绪状态
+
+配置 EMBEDDING_USE_SERVICE 后不在本进程加载模型，而是连接共享的embedding服务进程（见 embedding_server）
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional
+from app.config import settings
+
+# 预热用的样例文本，覆盖中英文混合的常见长度
+WARMUP_TEXTS = [
+    "什么是微服务架构？",
+    "请介绍一下你在项目中遇到的最大挑战以及解决方法。",
+    "How does a HashMap handle collisions in Java?",
+    "产品经理如何进行需求优先级排序",
+]
+
+
+def get_resident_memory_mb() -> Optional[float]:
+    """获取当前进程的常驻内存（MB），无法获取时返回None"""
+    try:
+        import psutil
+        return round(psutil.Process(os.getpid()).memory_info().rss / 1024 / 1024, 1)
+    except ImportError:
+        pass
+
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def resolve_cached_model(model_name: str) -> Optional[str]:
+    """
+    在本地缓存中查找模型目录，不访问网络
+
+    依次查找 huggingface_hub 缓存（local_files_only）和 sentence-transformers 自己的缓存目录；
+    模型名不含组织名时同时按 sentence-transformers/ 前缀查找
+
+    Args:
+        model_name: 模型名或本地目录
+
+    Returns:
+        本地模型目录，未找到时返回None
+    """
+    if os.path.isdir(model_name):
+        return model_name
+    candidates = [model_name] if "/" in model_name else [model_name, f"sentence-transformers/{model_name}"]
+
+    try:
+        from huggingface_hub import snapshot_download
+        for repo_id in candidates:
+            try:
+                return snapshot_download(repo_id, local_files_only=True)
+            except Exception:
+                continue
+    except ImportError:
+        pass
+
+    cache_root = os.environ.get("SENTENCE_TRANSFORMERS_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache", "torch", "sentence_transformers"
+    )
+    for repo_id in candidates:
+        path = os.path.join(cache_root, repo_id.replace("/", "_"))
+        if os.path.isdir(path):
+            return path
+    return None
+
+
+def load_sentence_transformer():
+    """
+    加载SentenceTransformer模型
+
+    优先从EMBEDDING_MODEL_PATH指定的本地目录加载；仅在允许下载时才访问网络镜像并尝试备用模型
+
+    Returns:
+        SentenceTransformer模型实例
+
+    Raises:
+        RuntimeError: 本地模型不存在且不允许下载时
+    """
+    if settings.EMBEDDING_ALLOW_DOWNLOAD:
+        # 使用国内镜像；huggingface_hub 在导入时读取该变量，必须在导入前设置
+        os.environ.setdefault('HF_ENDPOINT', 'https://hf-mirror.com')
+    from sentence_transformers import SentenceTransformer
+
+    local_path = settings.EMBEDDING_MODEL_PATH
+    if local_path and os.path.isdir(local_path):
+        return SentenceTransformer(local_path)
+
+    if not settings.EMBEDDING_ALLOW_DOWNLOAD:
+        # 只从本地缓存目录加载，避免无网络时卡住（环境变量在导入时已被读取，导入后设置不生效）
+        cached_path = resolve_cached_model(settings.EMBEDDING_MODEL)
+        if cached_path is None:
+            raise RuntimeError(f"本地未找到embedding模型 {local_path or settings.EMBEDDING_MODEL}")
+        return SentenceTransformer(cached_path)
+
+    # 失败时依次尝试备用模型
+    try:
+        return SentenceTransformer(settings.EMBEDDING_MODEL)
+    except Exception as e:
+        print(f"加载 {settings.EMBEDDING_MODEL} 失败: {e}")
+        print("使用备用embedding模型...")
+        try:
+            return SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+        except Exception:
+            print("使用基础embedding模型")
+            return SentenceTransformer('all-MiniLM-L6-v2')
+
+
+class EmbeddingModelLoader:
+    """Embedding模型加载器：后台线程加载+预热，记录耗时和内存"""
+
+    NOT_STARTED = "not_started"
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self):
+        self._model = None
+        self._state = self.NOT_STARTED
+        self._error = None
+        self._lock = threading.Lock()
+        self._ready_event = threading.Event()
+        self._load_ms = None
+        self._warmup_ms = None
+        self._memory_before_mb = None
+        self._memory_after_mb = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self._state == self.READY
+
+    def start(self):
+        """在后台线程中开始加载（重复调用无副作用）"""
+        with self._lock:
+            if self._state != self.NOT_STARTED:
+                return
+            self._state = self.LOADING
+
+        thread = threading.Thread(target=self._load, name="embedding-model-loader", daemon=True)
+        thread.start()
+
+    def get_model(self, wait: Optional[float] = 0):
+        """
+        获取已加载的模型
+
+        Args:
+            wait: 未就绪时的最长等待秒数；0表示不等待，None表示一直等待到加载结束
+
+        Returns:
+            模型实例，未就绪或加载失败时返回None
+        """
+        self.start()
+        if not self._ready_event.is_set() and wait != 0:
+            self._ready_event.wait(wait)
+        return self._model if self.is_ready else None
+
+    def status(self) -> Dict:
+        """返回加载状态、耗时和内存占用"""
+        memory_delta = None
+        if self._memory_before_mb is not None and self._memory_after_mb is not None:
+            memory_delta = round(self._memory_after_mb - self._memory_before_mb, 1)
+        return {
+            "state": self._state,
+            "ready": self.is_ready,
+            "model": settings.EMBEDDING_MODEL_PATH or settings.EMBEDDING_MODEL,
+            "backend": f"service({settings.EMBEDDING_SERVICE_ADDRESS})" if settings.EMBEDDING_USE_SERVICE else "local",
+            "load_ms": self._load_ms,
+            "warmup_ms": self._warmup_ms,
+            "model_memory_mb": memory_delta,
+            "resident_memory_mb": get_resident_memory_mb(),
+            "error": self._error
+        }
+
+    def _connect_service(self):
+        """连接独立的embedding服务进程，服务未启动时在超时内重试"""
+        from app.services.embedding_server import EmbeddingClient
+
+        client = EmbeddingClient()
+        deadline = time.monotonic() + settings.EMBEDDING_SERVICE_CONNECT_TIMEOUT
+        while True:
+            try:
+                client.ping()
+                return client
+            except (OSError, EOFError) as e:
+                if time.monotonic() >= deadline:
+                    raise RuntimeError(f"无法连接embedding服务 {settings.EMBEDDING_SERVICE_ADDRESS}: {e}")
+                time.sleep(1)
+
+    def _load(self):
+        """加载并预热模型"""
+        self._memory_before_mb = get_resident_memory_mb()
+        try:
+            start = time.perf_counter()
+            if settings.EMBEDDING_USE_SERVICE:
+                model = self._connect_service()
+            else:
+                model = load_sentence_transformer()
+            self._load_ms = round((time.perf_counter() - start) * 1000, 1)
+
+            # 预热：首批推理会触发算子初始化和内存分配
+            start = time.perf_counter()
+            model.encode(WARMUP_TEXTS, convert_to_numpy=True)
+            self._warmup_ms = round((time.perf_counter() - start) * 1000, 1)
+
+            self._model = model
+            self._state = self.READY
+            print(f"embedding模型已就绪，加载 {self._load_ms}ms，预热 {self._warmup_ms}ms")
+        except Exception as e:
+            self._error = str(e)
+            self._state = self.FAILED
+            print(f"初始化embedding模型失败: {e}")
+            print("RAG功能将使用简化模式（仅文本检索）")
+        finally:
+            self._memory_after_mb = get_resident_memory_mb()
+            self._ready_event.set()
+
+
+# 进程内共享的加载器实例
+embedding_model_loader = EmbeddingModelLoader()
@@ -0,0 +1,299 @@
+"""
+Embedding服务进程：在独立的工作进程池中运行embedding模型，供所有API worker通过本地IPC共享
+
+启动方式：
+    python -m app.services.embedding_server
+
+API进程开启 EMBEDDING_USE_SERVICE 后，embedding_model_loader 会改为通过 EmbeddingClient 调用本服务，
+不再在每个uvicorn worker中各自加载一份模型。
+"""
+import queue
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.connection import Client, Listener
+from typing import Callable, Dict, List, Tuple
+from app.config import settings
+
+# 工作进程内的模型实例
+_worker_model = None
+
+# 不能用于启动服务的认证密钥：空值、.env.example 中的占位符和曾经提交到仓库的默认值
+_INSECURE_AUTHKEYS = ("", "change-me", "smart-interview-embedding")
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """将 "host:port" 解析为 (host, port)"""
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def _init_worker():
+    """工作进程初始化：加载并预热模型"""
+    global _worker_model
+    from app.services.embedding_model import load_sentence_transformer, WARMUP_TEXTS
+    _worker_model = load_sentence_transformer()
+    _worker_model.encode(WARMUP_TEXTS, convert_to_numpy=True)
+
+
+def create_executor() -> ProcessPoolExecutor:
+    """创建embedding工作进程池"""
+    return ProcessPoolExecutor(max_workers=settings.EMBEDDING_WORKERS, initializer=_init_worker)
+
+
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    """在工作进程中编码一个批次"""
+    embeddings = _worker_model.encode(texts, convert_to_numpy=True, batch_size=len(texts))
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+class MicroBatcher:
+    """
+    微批处理器：合并并发请求，达到最大批量或最长等待时间后整批提交给进程池
+
+    工作进程异常退出会使进程池损坏（BrokenProcessPool），此时用 executor_factory 新建进程池替换；
+    提交时发现损坏则在新进程池上重试本批，执行中损坏则只让当时在执行的批次失败
+    """
+
+    def __init__(self, executor_factory: Callable[[], ProcessPoolExecutor], max_batch_size: int,
+                 max_wait_ms: float, max_in_flight: int):
+        """
+        Args:
+            executor_factory: 创建工作进程池的函数（初始化和进程池损坏后重建时调用）
+            max_batch_size: 单批最大文本数
+            max_wait_ms: 首个请求到达后最长等待合批的毫秒数
+            max_in_flight: 同时在进程池中执行的最大批次数
+        """
+        self.executor_factory = executor_factory
+        self.executor = executor_factory()
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._in_flight = threading.Semaphore(max_in_flight)
+        self._executor_lock = threading.Lock()
+        self._stats = {"requests": 0, "texts": 0, "batches": 0, "pool_restarts": 0}
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """提交一组文本，返回结果Future"""
+        if not texts:
+            raise ValueError("texts不能为空")
+        future = Future()
+        self._queue.put((texts, future))
+        return future
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["avg_batch_size"] = round(stats["texts"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+    def _run(self):
+        """合批循环"""
+        while True:
+            pending = [self._queue.get()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+
+            while size < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            # 进程池满载时在此等待，期间新请求继续排队，下一批会更大
+            self._in_flight.acquire()
+            texts = [text for item_texts, _ in pending for text in item_texts]
+            try:
+                executor, batch_future = self._submit(texts)
+            except Exception as e:
+                # 重建进程池后仍无法提交时本批请求失败，合批线程继续运行
+                self._in_flight.release()
+                print(f"提交embedding批次失败: {e}")
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            batch_future.add_done_callback(
+                lambda f, pending=pending, executor=executor: self._dispatch(f, pending, executor)
+            )
+
+            with self._stats_lock:
+                self._stats["requests"] += len(pending)
+                self._stats["texts"] += len(texts)
+                self._stats["batches"] += 1
+
+    def _submit(self, texts: List[str]) -> Tuple[ProcessPoolExecutor, Future]:
+        """提交批次，进程池已损坏时重建后重试一次，返回 (所用进程池, 批次Future)"""
+        executor = self.executor
+        try:
+            return executor, executor.submit(_encode_batch, texts)
+        except BrokenProcessPool:
+            executor = self._replace_executor(executor)
+            return executor, executor.submit(_encode_batch, texts)
+
+    def _replace_executor(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """替换已损坏的进程池（多个批次同时发现损坏时只重建一次）"""
+        with self._executor_lock:
+            if self.executor is broken:
+                print("embedding工作进程异常退出，重建进程池")
+                self.executor = self.executor_factory()
+                broken.shutdown(wait=False)
+                with self._stats_lock:
+                    self._stats["pool_restarts"] += 1
+            return self.executor
+
+    def _dispatch(self, batch_future: Future, pending: List, executor: ProcessPoolExecutor):
+        """将批次结果按请求拆分回各自的Future"""
+        self._in_flight.release()
+        try:
+            embeddings = batch_future.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                # 执行中的批次可能就是导致进程退出的批次，不重试，只让本批失败
+                self._replace_executor(executor)
+            for _, future in pending:
+                future.set_exception(e)
+            return
+
+        offset = 0
+        for texts, future in pending:
+            future.set_result(embeddings[offset:offset + len(texts)])
+            offset += len(texts)
+
+
+class EmbeddingServer:
+    """
+    Embedding IPC服务：每个客户端连接一个线程，请求交给微批处理器
+
+    multiprocessing.connection 会反序列化认证通过的客户端发来的任意对象，
+    认证密钥必须由运维单独设置，使用空值或公开的默认值时拒绝启动
+    """
+
+    def __init__(self):
+        if settings.EMBEDDING_SERVICE_AUTHKEY in _INSECURE_AUTHKEYS:
+            raise RuntimeError("请先设置 EMBEDDING_SERVICE_AUTHKEY（不能为空或使用示例/默认值），"
+                               "可用 python -c \"import secrets; print(secrets.token_hex(32))\" 生成")
+        self.address = parse_address(settings.EMBEDDING_SERVICE_ADDRESS)
+        self.batcher = MicroBatcher(
+            create_executor,
+            max_batch_size=settings.EMBEDDING_MAX_BATCH_SIZE,
+            max_wait_ms=settings.EMBEDDING_MAX_WAIT_MS,
+            max_in_flight=settings.EMBEDDING_WORKERS
+        )
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """当前的工作进程池（进程池损坏重建后指向新进程池）"""
+        return self.batcher.executor
+
+    def serve_forever(self):
+        """启动监听"""
+        # 预先拉起所有工作进程，模型加载完成后再接受请求
+        warmups = [self.executor.submit(_encode_batch, ["warmup"]) for _ in range(settings.EMBEDDING_WORKERS)]
+        for future in warmups:
+            future.result()
+
+        # 默认backlog为1，多个API worker同时连接时握手会超时重传，需调大
+        listener = Listener(self.address, backlog=128, authkey=settings.EMBEDDING_SERVICE_AUTHKEY.encode())
+        print(f"embedding服务已启动: {self.address}，工作进程 {settings.EMBEDDING_WORKERS} 个")
+        try:
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+            self.executor.shutdown()
+
+    def _handle(self, conn):
+        """处理单个客户端连接上的请求"""
+        try:
+            while True:
+                request = conn.recv()
+                op = request.get("op")
+                try:
+                    if op == "encode":
+                        texts = request.get("texts")
+                        if not texts:
+                            conn.send({"error": "texts不能为空"})
+                            continue
+                        embeddings = self.batcher.submit(texts).result(
+                            timeout=settings.EMBEDDING_SERVICE_REQUEST_TIMEOUT
+                        )
+                        conn.send({"embeddings": embeddings})
+                    elif op == "ping":
+                        conn.send({"ok": True})
+                    elif op == "stats":
+                        conn.send({"stats": self.batcher.stats()})
+                    else:
+                        conn.send({"error": f"未知操作: {op}"})
+                except FutureTimeoutError:
+                    conn.send({"error": f"编码超时（{settings.EMBEDDING_SERVICE_REQUEST_TIMEOUT}s）"})
+                except Exception as e:
+                    conn.send({"error": str(e)})
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+
+class EmbeddingClient:
+    """Embedding服务客户端：接口与SentenceTransformer.encode兼容，每个线程复用一个连接"""
+
+    def __init__(self, address: str = None, authkey: str = None):
+        self.address = parse_address(address or settings.EMBEDDING_SERVICE_ADDRESS)
+        self.authkey = (authkey or settings.EMBEDDING_SERVICE_AUTHKEY).encode()
+        self._local = threading.local()
+
+    def encode(self, texts, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        """
+        编码文本
+
+        Args:
+            texts: 单个文本或文本列表
+
+        Returns:
+            单个文本返回一维向量，列表返回二维矩阵
+        """
+        single = isinstance(texts, str)
+        response = self._request({"op": "encode", "texts": [texts] if single else list(texts)})
+        embeddings = response["embeddings"]
+        return embeddings[0] if single else embeddings
+
+    def ping(self) -> bool:
+        return bool(self._request({"op": "ping"}).get("ok"))
+
+    def stats(self) -> Dict:
+        return self._request({"op": "stats"})["stats"]
+
+    def _request(self, payload: Dict) -> Dict:
+        """发送请求，连接断开时重连一次"""
+        for attempt in range(2):
+            conn = getattr(self._local, "conn", None)
+            try:
+                if conn is None:
+                    conn = Client(self.address, authkey=self.authkey)
+                    self._local.conn = conn
+                conn.send(payload)
+                response = conn.recv()
+                break
+            except (EOFError, OSError, ConnectionError):
+                self._local.conn = None
+                if attempt == 1:
+                    raise
+        if "error" in response:
+            raise RuntimeError(f"embedding服务错误: {response['error']}")
+        return response
+
+
+if __name__ == "__main__":
+    EmbeddingServer().serve_forever()
@@ -0,0 +1,53 @@
+"""
+欢迎消息缓存：按 (用户, 模块, 用户上下文版本) 缓存生成的欢迎消息
+"""
+import time
+from typing import Dict, Optional
+from app.utils.lru_cache import LRUCache
+
+
+class GreetingCache:
+    """
+    欢迎消息缓存
+
+    - 用户上下文版本变化（如上传简历、完成任务）后键随之变化，旧欢迎消息不再命中
+    - 条目超过有效期后重新生成，避免长期显示同一条欢迎消息
+    """
+
+    def __init__(self, ttl_seconds: float = 1800, max_entries: int = 5000):
+        """
+        Args:
+            ttl_seconds: 欢迎消息有效期（秒）
+            max_entries: 最多缓存的欢迎消息数
+        """
+        self.ttl_seconds = ttl_seconds
+        self._entries = LRUCache(max_entries)
+
+    def get(self, user_id: int, context_type: str, version: int) -> Optional[str]:
+        """
+        获取未过期的欢迎消息
+
+        Args:
+            user_id: 用户ID
+            context_type: 模块类型
+            version: 用户上下文版本号
+
+        Returns:
+            欢迎消息，未命中时返回None
+        """
+        key = (user_id, context_type, version)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] > self.ttl_seconds:
+            self._entries.pop(key)
+            return None
+        return entry[0]
+
+    def put(self, user_id: int, context_type: str, version: int, greeting: str):
+        """缓存欢迎消息"""
+        self._entries.put((user_id, context_type, version), (greeting, time.monotonic()))
+
+    def stats(self) -> Dict:
+        """返回命中统计"""
+        return dict(self._entries.stats(), ttl_seconds=self.ttl_seconds)
@@ -75,11 +75,11 @@ class PersonalizationService:
 
     def generate_personalized_questions(
             self,
-            resume_data: Dict,
+            resume_context: str,
             user_preference: Optional[UserPreference],
             count: int = 5
     ) -> List[str]:
-        """基于简历生成个性化问题"""
+        """基于简历摘要（Resume.context_snippet）生成个性化问题"""
         system_prompt = """你是一位经验丰富的HR，擅长根据简历设计针对性面试问题。"""
 
         weak_areas = []
@@ -90,7 +90,7 @@ class PersonalizationService:
 基于以下简历信息生成{count}个针对性面试问题：
 
 简历信息：
-{self._format_resume_data(resume_data)}
+{resume_context}
 
 用户薄弱领域：{', '.join(weak_areas) if weak_areas else '无'}
 
@@ -137,18 +137,4 @@ class PersonalizationService:
             "recommended_tasks": focus_areas,
             "focus_areas": focus_areas,
             "learning_plan": learning_plan
-        }
-
-    def _format_resume_data(self, resume_data: Dict) -> str:
-        """格式化简历数据"""
-        result = []
-        if resume_data.get("name"):
-            result.append(f"姓名：{resume_data['name']}")
-        if resume_data.get("education"):
-            result.append(f"教育背景：{resume_data['education']}")
-        if resume_data.get("experience"):
-            result.append(f"工作经历：{resume_data['experience']}")
-        if resume_data.get("skills"):
-            result.append(
-                f"技能：{', '.join(resume_data['skills']) if isinstance(resume_data['skills'], list) else resume_data['skills']}")
-        return "\n".join(result)
\ No newline at end of file
+        }
\ No newline at end of file
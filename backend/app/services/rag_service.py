@@ -1,56 +1,90 @@
 """
 RAG服务：实现检索增强生成，结合知识库回答问题
 """
+import itertools
 import json
+import threading
+import time
 import numpy as np
-from typing import List, Dict, Optional
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Tuple
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.config import settings
 from app.services.llm_service import LLMService
 from app.models.knowledge_base import KnowledgeBase
+from app.models.knowledge_chunk import KnowledgeChunk
+from app.models.knowledge_index_log import KnowledgeIndexLog
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.embedding_cache import EmbeddingCache, normalize_query
+from app.services.embedding_model import embedding_model_loader
+from app.services.vector_index import VectorIndex, SegmentedVectorIndex, PartitionedVectorIndex
+from app.services.reranker import CrossEncoderReranker
+from app.utils.context_packer import ContextPacker
+from app.utils.text_chunker import TextChunker
+
+# 同步变更日志时回看的条数
+_LOG_LOOKBACK = 200
+
+
+@dataclass
+class RetrievalResult:
+    """单次检索结果：同一份检索结果同时用于构建提示词和返回来源"""
+    query: str
+    position_category: Optional[str]
+    documents: List[Dict] = field(default_factory=list)
+    retrieval_ms: float = 0.0
+    packing: Dict = field(default_factory=dict)  # 上下文打包统计（生成答案时填充）
+
 
 class RAGService:
     """RAG服务类：实现知识检索和增强生成"""
 
-    def __init__(self):
-        """初始化RAG服务，延迟加载embedding模型"""
+    def __init__(self, wait_for_model: bool = False):
+        """
+        初始化RAG服务
+
+        Args:
+            wait_for_model: embedding模型未就绪时是否阻塞等待（离线导入使用），否则最多等待配置的秒数
+        """
         self.llm_service = LLMService()
         self.vector_dim = settings.VECTOR_DIMENSION
         self.top_k = settings.TOP_K_RETRIEVAL
-        self._embedding_model = None  # 延迟加载
+        self._embedding_model = None  # 由embedding_model_loader加载
+        self.model_wait_seconds = None if wait_for_model else settings.EMBEDDING_READY_WAIT_SECONDS
+        self.chunker = TextChunker(settings.CHUNK_MAX_TOKENS, settings.CHUNK_OVERLAP_TOKENS)
+        self.context_packer = ContextPacker(settings.RAG_CONTEXT_TOKEN_BUDGET, settings.RAG_CONTEXT_DEDUP_THRESHOLD)
+        self.query_cache = EmbeddingCache(
+            max_size=settings.EMBEDDING_CACHE_SIZE,
+            persist_path=settings.EMBEDDING_CACHE_PATH,
+            model_name=settings.EMBEDDING_MODEL
+        )
+        self.reranker = CrossEncoderReranker()
+        self.answer_cache = SemanticAnswerCache(
+            similarity_threshold=settings.ANSWER_CACHE_SIMILARITY,
+            ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+            max_entries=settings.ANSWER_CACHE_MAX_ENTRIES
+        )
+        # 按岗位类别分区的段落向量索引快照（首次检索时构建，之后按变更日志增量同步）
+        self._index = None
+        self._index_lock = threading.RLock()
+        self._chunk_doc_ids = {}
+        self._doc_chunks = {}  # 文档id -> (分区, 段落id列表)
+        self._applied_log_ids = set()
+        self._next_sync = 0.0
+        self._compacting = set()
+        self._segment_counter = itertools.count()
 
     @property
     def embedding_model(self):
-        """延迟加载embedding模型"""
+        """获取embedding模型（启动时后台加载，未就绪时返回None，使用简化模式）"""
         if self._embedding_model is None:
-            try:
-                from sentence_transformers import SentenceTransformer
-                # 尝试使用中文模型，如果失败则使用备用模型
-                try:
-                    # 使用国内镜像
-                    import os
-                    os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com'
-                    self._embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
-                except Exception as e:
-                    print(f"加载 {settings.EMBEDDING_MODEL} 失败: {e}")
-                    print("使用备用embedding模型...")
-                    # 使用轻量级备用模型
-                    try:
-                        self._embedding_model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-                    except:
-                        # 如果还是失败，使用更简单的模型
-                        self._embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-                        print("使用基础embedding模型")
-            except Exception as e:
-                print(f"初始化embedding模型失败: {e}")
-                print("RAG功能将使用简化模式（仅文本检索）")
-                self._embedding_model = None
-
+            self._embedding_model = embedding_model_loader.get_model(wait=self.model_wait_seconds)
         return self._embedding_model
 
     def get_embedding(self, text: str) -> List[float]:
         """
-        获取文本的embedding向量
+        获取查询文本的embedding向量（经LRU缓存）
 
         Args:
             text: 输入文本
@@ -58,20 +92,152 @@ class RAGService:
         Returns:
             embedding向量列表
         """
+        return self.get_query_embeddings([text])[0].tolist()
+
+    def get_query_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        批量获取查询的embedding向量：先查缓存，未命中的查询合并为一次编码
+
+        Args:
+            texts: 查询文本列表
+
+        Returns:
+            形状为(len(texts), 向量维度)的float32矩阵
+        """
+        if not texts:
+            return np.zeros((0, self.vector_dim), dtype=np.float32)
+
+        keys = [normalize_query(text) for text in texts]
+        vectors = self.query_cache.get_many(texts)
+        missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+
+        if missing:
+            encoded = self.get_embeddings(missing)
+            # 编码失败返回的零向量不写入缓存
+            self.query_cache.put_many({key: vector for key, vector in zip(missing, encoded) if np.any(vector)})
+            vectors.update(zip(missing, encoded))
+
+        return np.stack([vectors[key] for key in keys])
+
+    def get_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        批量获取文本的embedding向量
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            形状为(len(texts), 向量维度)的float32矩阵
+        """
+        if not texts:
+            return np.zeros((0, self.vector_dim), dtype=np.float32)
+
         if self.embedding_model is None:
-            # 如果模型未加载，返回空向量（简化模式）
-            return [0.0] * self.vector_dim
+            return np.zeros((len(texts), self.vector_dim), dtype=np.float32)
 
         try:
-            embedding = self.embedding_model.encode(text, convert_to_numpy=True)
-            return embedding.tolist()
+            embeddings = self.embedding_model.encode(texts, convert_to_numpy=True)
+            return np.asarray(embeddings, dtype=np.float32)
         except Exception as e:
-            print(f"生成embedding失败: {e}")
-            return [0.0] * self.vector_dim
+            print(f"批量生成embedding失败: {e}")
+            return np.zeros((len(texts), self.vector_dim), dtype=np.float32)
+
+    def index_document(self, doc: KnowledgeBase, db: Session, commit: bool = True) -> int:
+        """
+        对知识库文档分块并写入段落表（已有段落会被替换），同时记录索引变更日志
+
+        Args:
+            doc: 知识库文档（需已有id）
+            db: 数据库会话
+            commit: 是否立即提交
+
+        Returns:
+            生成的段落数量
+        """
+        return self.index_documents([doc], db, commit)
+
+    def index_documents(self, docs: List[KnowledgeBase], db: Session, commit: bool = True) -> int:
+        """
+        批量分块并写入段落表：所有文档的段落在一次批量编码中生成向量
+
+        Args:
+            docs: 知识库文档列表（需已有id）
+            db: 数据库会话
+            commit: 是否立即提交
+
+        Returns:
+            生成的段落总数
+        """
+        if not docs:
+            return 0
+        db.query(KnowledgeChunk).filter(
+            KnowledgeChunk.doc_id.in_([doc.id for doc in docs])
+        ).delete(synchronize_session=False)
+
+        doc_chunks = [(doc, chunk) for doc in docs for chunk in self.chunker.chunk(doc.content or "")]
+        embeddings = self.get_embeddings([chunk["content"] for _, chunk in doc_chunks])
+
+        for (doc, chunk), embedding in zip(doc_chunks, embeddings):
+            db.add(KnowledgeChunk(
+                doc_id=doc.id,
+                chunk_index=chunk["chunk_index"],
+                content=chunk["content"],
+                start_offset=chunk["start_offset"],
+                end_offset=chunk["end_offset"],
+                token_count=chunk["token_count"],
+                position_category=doc.position_category,
+                embedding_vector=embedding.tolist()
+            ))
+        for doc in docs:
+            db.add(KnowledgeIndexLog(doc_id=doc.id, position_category=doc.position_category, operation="upsert"))
+
+        if commit:
+            db.commit()
+        # 本进程的写入在下次检索时立即同步，不等待轮询间隔
+        self._next_sync = 0.0
+        return len(doc_chunks)
+
+    def delete_document(self, doc: KnowledgeBase, db: Session, commit: bool = True):
+        """
+        删除知识库文档及其段落，并记录索引变更日志
+
+        Args:
+            doc: 知识库文档
+            db: 数据库会话
+            commit: 是否立即提交
+        """
+        db.query(KnowledgeChunk).filter(KnowledgeChunk.doc_id == doc.id).delete(synchronize_session=False)
+        db.add(KnowledgeIndexLog(doc_id=doc.id, position_category=doc.position_category, operation="delete"))
+        db.delete(doc)
+
+        if commit:
+            db.commit()
+        self._next_sync = 0.0
+
+    def rebuild_chunks(self, db: Session, position_category: Optional[str] = None) -> int:
+        """
+        为已有知识库文档重新生成段落
+
+        Args:
+            db: 数据库会话
+            position_category: 仅处理指定岗位类别（可选）
+
+        Returns:
+            生成的段落总数
+        """
+        query = db.query(KnowledgeBase)
+        if position_category:
+            query = query.filter(KnowledgeBase.position_category == position_category)
+
+        total = 0
+        for doc in query.all():
+            total += self.index_document(doc, db, commit=False)
+        db.commit()
+        return total
 
     def search_knowledge(self, query: str, position_category: Optional[str] = None, db: Optional[Session] = None, top_k: int = None) -> List[Dict]:
         """
-        在知识库中搜索相关文档
+        在知识库中搜索相关段落（段落级检索，每个文档只保留最相关的段落）
 
         Args:
             query: 查询文本
@@ -80,7 +246,7 @@ class RAGService:
             top_k: 返回数量
 
         Returns:
-            相关文档列表
+            相关段落列表
         """
         if top_k is None:
             top_k = self.top_k
@@ -89,30 +255,416 @@ class RAGService:
             return []
 
         try:
-            # 简化版本：直接文本搜索（实际应该使用向量相似度）
-            if position_category:
-                docs = db.query(KnowledgeBase).filter(
-                    KnowledgeBase.position_category == position_category
-                ).limit(top_k).all()
-            else:
-                docs = db.query(KnowledgeBase).limit(top_k).all()
+            query_vector = np.asarray(self.get_embedding(query), dtype=np.float32)
+            index = self._get_index(db)
+            if index is None or not np.any(query_vector):
+                # 尚未分块或embedding不可用时，退化为文档级检索
+                return self._search_documents(position_category, db, top_k)
+
+            # 开启重排且负载允许时先取更多候选文档，交叉编码器打分后再截取top_k
+            use_rerank = self.reranker.should_rerank(settings.RERANK_CANDIDATES)
+            candidate_k = max(top_k, settings.RERANK_CANDIDATES) if use_rerank else top_k
+
+            # 按岗位类别路由到对应分区；多取一些段落候选，按父文档去重后仍能凑够候选文档数
+            hits = index.search(query_vector, candidate_k * settings.CHUNK_CANDIDATE_FACTOR, position_category)
+            results = self._build_results(hits, db, candidate_k)
+
+            if use_rerank:
+                reranked = self.reranker.rerank(query, results, top_k)
+                if reranked is not None:
+                    return reranked
+            return results[:top_k]
+        except Exception as e:
+            print(f"搜索知识库失败: {e}")
+            return []
+
+    def search_knowledge_batch(self, queries: List[str], position_category: Optional[str] = None, db: Optional[Session] = None, top_k: int = None) -> List[List[Dict]]:
+        """
+        批量检索知识库：所有查询一次编码、一次矩阵乘法打分，段落和文档各一次数据库查询
+
+        批量检索不做交叉编码器重排，适合为多个答案或弱项同时补充知识上下文
+
+        Args:
+            queries: 查询文本列表
+            position_category: 岗位类别（可选）
+            db: 数据库会话
+            top_k: 每个查询的返回数量
+
+        Returns:
+            与queries一一对应的相关段落列表
+        """
+        if top_k is None:
+            top_k = self.top_k
+
+        if not queries:
+            return []
+        if db is None:
+            return [[] for _ in queries]
+
+        try:
+            query_vectors = self.get_query_embeddings(queries)
+            index = self._get_index(db)
+            if index is None or not np.any(query_vectors):
+                # 尚未分块或embedding不可用时，退化为文档级检索（各查询结果相同）
+                documents = self._search_documents(position_category, db, top_k)
+                return [list(documents) for _ in queries]
+
+            hits_lists = index.search_batch(query_vectors, top_k * settings.CHUNK_CANDIDATE_FACTOR, position_category)
+            return self._load_results([self._select_best_chunks(hits, top_k) for hits in hits_lists], db)
+        except Exception as e:
+            print(f"批量搜索知识库失败: {e}")
+            return [[] for _ in queries]
+
+    def _build_results(self, hits: List[Tuple[int, float]], db: Session, top_k: int) -> List[Dict]:
+        """
+        将段落命中结果按父文档去重并组装为返回格式
+
+        Args:
+            hits: [(段落id, 分数), ...]，按分数降序
+            db: 数据库会话
+            top_k: 返回的文档数量
+
+        Returns:
+            相关段落列表
+        """
+        return self._load_results([self._select_best_chunks(hits, top_k)], db)[0]
+
+    def _select_best_chunks(self, hits: List[Tuple[int, float]], top_k: int) -> Dict[int, Tuple[int, float]]:
+        """每个父文档只保留得分最高的段落，返回 {文档id: (段落id, 分数)}（保持分数降序）"""
+        best_chunks = {}
+        for chunk_id, score in hits:
+            doc_id = self._chunk_doc_ids.get(chunk_id)
+            if doc_id is not None and doc_id not in best_chunks:
+                best_chunks[doc_id] = (chunk_id, score)
+                if len(best_chunks) >= top_k:
+                    break
+        return best_chunks
+
+    def _load_results(self, best_chunk_lists: List[Dict[int, Tuple[int, float]]], db: Session) -> List[List[Dict]]:
+        """
+        一次性加载多组命中结果涉及的段落和文档，组装为返回格式
+
+        Args:
+            best_chunk_lists: 每组为 {文档id: (段落id, 分数)}
+            db: 数据库会话
 
+        Returns:
+            每组对应的相关段落列表
+        """
+        chunk_ids = {chunk_id for best in best_chunk_lists for chunk_id, _ in best.values()}
+        doc_ids = {doc_id for best in best_chunk_lists for doc_id in best}
+        if not chunk_ids:
+            return [[] for _ in best_chunk_lists]
+
+        chunks = {c.id: c for c in db.query(KnowledgeChunk).filter(KnowledgeChunk.id.in_(list(chunk_ids))).all()}
+        docs = {d.id: d for d in db.query(KnowledgeBase).filter(KnowledgeBase.id.in_(list(doc_ids))).all()}
+
+        results = []
+        for best_chunks in best_chunk_lists:
             result = []
-            for doc in docs:
+            for doc_id, (chunk_id, score) in best_chunks.items():
+                doc, chunk = docs.get(doc_id), chunks.get(chunk_id)
+                if doc is None or chunk is None:
+                    continue
                 result.append({
                     "id": doc.id,
+                    "chunk_id": chunk.id,
                     "title": doc.title,
-                    "content": doc.content[:500],  # 截取前500字符
+                    "content": chunk.content,
                     "category": doc.category,
-                    "position_category": doc.position_category
+                    "position_category": doc.position_category,
+                    "start_offset": chunk.start_offset,
+                    "end_offset": chunk.end_offset,
+                    "score": round(score, 4)
                 })
+            results.append(result)
+        return results
+
+    def _get_index(self, db: Session) -> Optional[PartitionedVectorIndex]:
+        """
+        获取当前的向量索引快照：首次使用时全量构建，之后按轮询间隔增量同步变更日志
+
+        Args:
+            db: 数据库会话
+
+        Returns:
+            分区索引快照，知识库未分块时返回None
+        """
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._build_index(db)
+        elif time.monotonic() >= self._next_sync:
+            # 其他线程正在同步时不等待，直接使用当前快照
+            self.sync_index(db, blocking=False)
+
+        index = self._index
+        return index if len(index) else None
 
-            return result
+    def rebuild_index(self, db: Session):
+        """从段落表全量重建向量索引"""
+        with self._index_lock:
+            self._build_index(db)
+
+    def _build_index(self, db: Session):
+        """从段落表构建全部分区（调用方需持有索引锁）"""
+        # 先读取代数再读取段落：构建期间的新变更代数更大，下次同步时会重放（重放是幂等的）
+        generation = db.query(func.max(KnowledgeIndexLog.id)).scalar() or 0
+        index = PartitionedVectorIndex(generation=generation)
+        chunk_doc_ids, doc_chunks = {}, {}
+
+        categories = [row[0] for row in db.query(KnowledgeChunk.position_category).distinct().all()]
+        keys = {PartitionedVectorIndex.partition_key(category) for category in categories}
+        for key in keys:
+            query = db.query(KnowledgeChunk.id, KnowledgeChunk.doc_id, KnowledgeChunk.embedding_vector)
+            if key:
+                query = query.filter(KnowledgeChunk.position_category == key)
+            else:
+                query = query.filter((KnowledgeChunk.position_category.is_(None)) | (KnowledgeChunk.position_category == ""))
+            rows = query.all()
+            if not rows:
+                continue
+
+            base = VectorIndex(**self._base_index_kwargs(key))
+            base.build(
+                [row.id for row in rows],
+                np.asarray([self._load_vector(row.embedding_vector) for row in rows], dtype=np.float32)
+            )
+            index.set_partition(key, SegmentedVectorIndex(base))
+            for row in rows:
+                chunk_doc_ids[row.id] = row.doc_id
+                doc_chunks.setdefault(row.doc_id, (key, []))[1].append(row.id)
+
+        old_index = self._index
+        self._chunk_doc_ids = chunk_doc_ids
+        self._doc_chunks = doc_chunks
+        self._applied_log_ids = set()
+        self._index = index
+        self._next_sync = time.monotonic() + settings.KNOWLEDGE_INDEX_POLL_SECONDS
+        self._release_bases(old_index, index)
+        self.answer_cache.clear()
+        print(f"段落向量索引已构建: {index.memory_stats()}")
+
+    def sync_index(self, db: Session, blocking: bool = True) -> int:
+        """
+        读取知识库变更日志，将新增/更新/删除的文档增量应用到向量索引
+
+        每个worker进程各自轮询同一张日志表，无需重启即可追上最新代数
+
+        Args:
+            db: 数据库会话
+            blocking: 其他线程正在同步时是否等待
+
+        Returns:
+            本次应用的变更条数
+        """
+        if not self._index_lock.acquire(blocking=blocking):
+            return 0
+        try:
+            self._next_sync = time.monotonic() + settings.KNOWLEDGE_INDEX_POLL_SECONDS
+            if self._index is None:
+                self._build_index(db)
+                return 0
+
+            # 自增id按分配顺序而非提交顺序可见，回看最近一段日志以补上晚提交的事务
+            generation = self._index.generation
+            changes = db.query(
+                KnowledgeIndexLog.id,
+                KnowledgeIndexLog.doc_id,
+                KnowledgeIndexLog.operation
+            ).filter(
+                KnowledgeIndexLog.id > generation - _LOG_LOOKBACK
+            ).order_by(KnowledgeIndexLog.id).limit(settings.KNOWLEDGE_INDEX_SYNC_BATCH + _LOG_LOOKBACK).all()
+            changes = [change for change in changes if change.id not in self._applied_log_ids]
+            if changes:
+                self._apply_changes(db, changes)
+            return len(changes)
         except Exception as e:
-            print(f"搜索知识库失败: {e}")
-            return []
+            print(f"同步向量索引失败: {e}")
+            return 0
+        finally:
+            self._index_lock.release()
+
+    def _apply_changes(self, db: Session, changes: List):
+        """
+        应用一批变更日志（调用方需持有索引锁）：旧段落记删除标记，新段落追加到增量段，生成新的索引快照
+
+        Args:
+            db: 数据库会话
+            changes: 变更日志行（id, doc_id, operation），按id升序
+        """
+        # 同一文档以最后一次变更为准
+        latest = {}
+        for change in changes:
+            latest[change.doc_id] = change.operation
+
+        upsert_doc_ids = [doc_id for doc_id, operation in latest.items() if operation == "upsert"]
+        rows = []
+        if upsert_doc_ids:
+            rows = db.query(
+                KnowledgeChunk.id,
+                KnowledgeChunk.doc_id,
+                KnowledgeChunk.position_category,
+                KnowledgeChunk.embedding_vector
+            ).filter(KnowledgeChunk.doc_id.in_(upsert_doc_ids)).all()
+
+        removed, added, doc_chunks = {}, {}, {}
+        for doc_id in latest:
+            key, chunk_ids = self._doc_chunks.get(doc_id, (None, []))
+            if chunk_ids:
+                removed.setdefault(key, set()).update(chunk_ids)
+        for row in rows:
+            key = PartitionedVectorIndex.partition_key(row.position_category)
+            if row.id in removed.get(key, ()):
+                # 段落未变化（构建索引时已包含），保留原向量
+                removed[key].discard(row.id)
+            else:
+                added.setdefault(key, ([], []))
+                added[key][0].append(row.id)
+                added[key][1].append(self._load_vector(row.embedding_vector))
+            doc_chunks.setdefault(row.doc_id, (key, []))[1].append(row.id)
+
+        index = self._index.copy(generation=max(self._index.generation, max(change.id for change in changes)))
+        compact_keys = []
+        for key in set(removed) | set(added):
+            ids, vectors = added.get(key, ([], []))
+            partition = index.get_partition(key) or SegmentedVectorIndex()
+            partition = partition.upsert(ids, np.asarray(vectors, dtype=np.float32) if ids else None, list(removed.get(key, ())))
+            if len(partition):
+                index.set_partition(key, partition)
+            else:
+                index.drop_partition(key)
+            if partition.needs_compaction(settings.VECTOR_DELTA_MAX_RATIO, settings.VECTOR_DELTA_MIN_SIZE):
+                compact_keys.append(key)
+
+        for row in rows:
+            self._chunk_doc_ids[row.id] = row.doc_id
+        for doc_id in latest:
+            self._doc_chunks.pop(doc_id, None)
+        self._doc_chunks.update(doc_chunks)
+
+        # 发布新快照；正在检索的请求继续使用旧快照
+        self._index = index
+        self.answer_cache.invalidate(set(removed) | set(added))
+        for chunk_ids in removed.values():
+            for chunk_id in chunk_ids:
+                self._chunk_doc_ids.pop(chunk_id, None)
+
+        self._applied_log_ids.update(change.id for change in changes)
+        self._applied_log_ids = {i for i in self._applied_log_ids if index.generation - i < _LOG_LOOKBACK}
+        for key in compact_keys:
+            self._schedule_compaction(key)
+
+    def _schedule_compaction(self, key: str):
+        """在后台线程中合并分区的增量段"""
+        with self._index_lock:
+            if key in self._compacting:
+                return
+            self._compacting.add(key)
+        threading.Thread(target=self._compact_partition, args=(key,), name="vector-index-compactor", daemon=True).start()
+
+    def _compact_partition(self, key: str):
+        """合并分区：在快照上构建新主段（不持有锁），再衔接合并期间的写入后替换"""
+        try:
+            source = self._index.get_partition(key)
+            if source is None:
+                return
+            start = time.perf_counter()
+            compacted = source.compact(**self._base_index_kwargs(key))
+
+            with self._index_lock:
+                current = self._index.get_partition(key)
+                rebased = current.rebase(compacted, source) if current is not None else None
+                if rebased is None:
+                    # 分区已被重建或删除，放弃本次合并结果
+                    if compacted.base is not None:
+                        compacted.base.release()
+                    return
+                index = self._index.copy()
+                if len(rebased):
+                    index.set_partition(key, rebased)
+                else:
+                    index.drop_partition(key)
+                self._index = index
+
+            if source.base is not None:
+                source.base.release()
+            print(f"向量索引分区 {key or '(default)'} 已合并: {len(rebased)} 个向量，耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+        except Exception as e:
+            print(f"合并向量索引分区失败: {e}")
+        finally:
+            self._compacting.discard(key)
+
+    def _base_index_kwargs(self, key: str) -> Dict:
+        """主段VectorIndex的构造参数，落盘文件名带序号，避免覆盖读者仍在使用的旧文件"""
+        return {
+            "quantization": settings.VECTOR_QUANTIZATION,
+            "rescore_factor": settings.VECTOR_RESCORE_FACTOR,
+            "store_dir": settings.VECTOR_INDEX_DIR,
+            "name": f"knowledge_chunks_{abs(hash(key))}_{next(self._segment_counter)}"
+        }
+
+    @staticmethod
+    def _release_bases(old_index: Optional[PartitionedVectorIndex], new_index: PartitionedVectorIndex):
+        """删除旧索引中不再使用的主段文件"""
+        if old_index is None:
+            return
+        in_use = {id(new_index.get_partition(key).base) for key in new_index.partition_keys()}
+        for key in old_index.partition_keys():
+            base = old_index.get_partition(key).base
+            if base is not None and id(base) not in in_use:
+                base.release()
+
+    def _search_documents(self, position_category: Optional[str], db: Session, top_k: int) -> List[Dict]:
+        """文档级检索（未分块时的兼容模式）"""
+        if position_category:
+            docs = db.query(KnowledgeBase).filter(
+                KnowledgeBase.position_category == position_category
+            ).limit(top_k).all()
+        else:
+            docs = db.query(KnowledgeBase).limit(top_k).all()
+
+        return [
+            {
+                "id": doc.id,
+                "title": doc.title,
+                "content": doc.content[:500],  # 截取前500字符
+                "category": doc.category,
+                "position_category": doc.position_category
+            }
+            for doc in docs
+        ]
+
+    @staticmethod
+    def _load_vector(value) -> List[float]:
+        """解析数据库中存储的向量（兼容JSON字符串和列表两种格式）"""
+        if isinstance(value, str):
+            value = json.loads(value)
+        return value or []
+
+    def retrieve(self, query: str, position_category: Optional[str], db: Session, top_k: int = None) -> RetrievalResult:
+        """
+        执行一次检索并记录耗时
+
+        Args:
+            query: 查询文本
+            position_category: 岗位类别
+            db: 数据库会话
+            top_k: 返回数量
+
+        Returns:
+            检索结果对象
+        """
+        start = time.perf_counter()
+        documents = self.search_knowledge(query, position_category, db, top_k)
+        return RetrievalResult(
+            query=query,
+            position_category=position_category,
+            documents=documents,
+            retrieval_ms=(time.perf_counter() - start) * 1000
+        )
 
-    def generate_answer_with_context(self, question: str, position_category: str, db: Session) -> str:
+    def generate_answer_with_context(self, question: str, position_category: str, db: Session, retrieval: Optional[RetrievalResult] = None) -> str:
         """
         基于检索到的知识生成答案
 
@@ -120,15 +672,19 @@ class RAGService:
             question: 问题
             position_category: 岗位类别
             db: 数据库会话
+            retrieval: 已有的检索结果（为空时重新检索）
 
         Returns:
             生成的答案
         """
         # 检索相关知识
-        context_docs = self.search_knowledge(question, position_category, db)
+        if retrieval is None:
+            retrieval = self.retrieve(question, position_category, db)
 
-        # 构建上下文
-        context = "\n".join([f"{doc['title']}: {doc['content']}" for doc in context_docs])
+        # 在token预算内挑选最相关的句子构建上下文
+        packing = self.context_packer.pack(question, retrieval.documents)
+        retrieval.packing = {key: value for key, value in packing.items() if key != "context"}
+        context = packing["context"]
 
         system_prompt = f"你是一位专业的面试导师，擅长回答{position_category}相关的面试问题。"
         prompt = f"""
@@ -141,4 +697,70 @@ class RAGService:
 请结合知识库内容，给出专业、准确的回答。
 """
 
-        return self.llm_service.generate(prompt, system_prompt, temperature=0.5)
\ No newline at end of file
+        return self.llm_service.generate(prompt, system_prompt, temperature=0.5)
+
+    def answer_question(self, question: str, position_category: str, db: Session) -> Dict:
+        """
+        RAG问答：先查语义答案缓存，未命中时一次检索同时用于构建提示词和返回来源
+
+        Args:
+            question: 问题
+            position_category: 岗位类别
+            db: 数据库会话
+
+        Returns:
+            {"answer": 答案, "sources": 来源文档, "trace": 各阶段耗时}
+        """
+        start = time.perf_counter()
+        query_vector = self.get_query_embeddings([question])[0]
+        if settings.ANSWER_CACHE_ENABLED:
+            # 先同步知识库变更，保证知识库更新后不会返回过期答案
+            self._get_index(db)
+            cached = self.answer_cache.get(position_category, query_vector)
+            if cached is not None:
+                return {
+                    "answer": cached["answer"],
+                    "sources": cached["sources"],
+                    "trace": {
+                        "cache_hit": True,
+                        "similarity": cached["similarity"],
+                        "matched_question": cached["question"],
+                        "total_ms": round((time.perf_counter() - start) * 1000, 2)
+                    }
+                }
+
+        # 检索前取缓存版本，生成期间知识库变化（缓存被清除）时不缓存这次的答案
+        cache_version = self.answer_cache.version(position_category) if settings.ANSWER_CACHE_ENABLED else None
+        retrieval = self.retrieve(question, position_category, db)
+
+        generation_start = time.perf_counter()
+        answer = self.generate_answer_with_context(question, position_category, db, retrieval=retrieval)
+        generation_ms = (time.perf_counter() - generation_start) * 1000
+
+        if settings.ANSWER_CACHE_ENABLED and answer and not answer.startswith("生成失败"):
+            self.answer_cache.put(position_category, question, query_vector, answer, retrieval.documents,
+                                  version=cache_version)
+
+        return {
+            "answer": answer,
+            "sources": retrieval.documents,
+            "trace": {
+                "cache_hit": False,
+                "retrieval_ms": round(retrieval.retrieval_ms, 2),
+                "generation_ms": round(generation_ms, 2),
+                "total_ms": round((time.perf_counter() - start) * 1000, 2),
+                "documents": len(retrieval.documents),
+                "context_tokens": retrieval.packing.get("packed_tokens", 0),
+                "dropped_tokens": retrieval.packing.get("dropped_tokens", 0)
+            }
+        }
+
+    def get_stats(self) -> Dict:
+        """返回RAG服务运行指标"""
+        return {
+            "embedding_model": embedding_model_loader.status(),
+            "query_embedding_cache": self.query_cache.stats(),
+            "vector_index": self._index.memory_stats() if self._index is not None else None,
+            "reranker": self.reranker.stats(),
+            "answer_cache": self.answer_cache.stats()
+        }
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""
+重排服务：用交叉编码器对双塔检索的候选段落重新打分
+"""
+import os
+import threading
+import time
+import numpy as np
+from typing import Dict, List, Optional
+from app.config import settings
+from app.services.embedding_cache import normalize_query
+from app.utils.lru_cache import LRUCache
+
+
+class CrossEncoderReranker:
+    """
+    交叉编码器重排器
+
+    - 所有(查询, 段落)对在一次批量前向计算中打分
+    - 按历史单对耗时估算本次耗时，超出延迟预算或并发过高时跳过重排，直接使用双塔结果
+    - 缓存最近的(查询, 段落)分数，热门问题无需重复计算
+    """
+
+    def __init__(self):
+        self.enabled = settings.RERANK_ENABLED
+        self._model = None
+        self._load_started = False
+        self._load_lock = threading.Lock()
+        self._score_cache = LRUCache(settings.RERANK_CACHE_SIZE)
+        self._in_flight = 0
+        self._counter_lock = threading.Lock()
+        self._ms_per_pair = None  # 单对打分耗时的指数移动平均
+        self._stats = {"reranked": 0, "skipped_not_ready": 0, "skipped_budget": 0, "skipped_load": 0}
+
+    @property
+    def model(self):
+        """获取交叉编码器模型，首次调用时在后台线程加载，未就绪时返回None"""
+        if self._model is None and not self._load_started:
+            with self._load_lock:
+                if not self._load_started:
+                    self._load_started = True
+                    threading.Thread(target=self._load, name="reranker-loader", daemon=True).start()
+        return self._model
+
+    def load(self) -> bool:
+        """同步加载模型（离线评估等场景使用），返回是否加载成功"""
+        with self._load_lock:
+            self._load_started = True
+        if self._model is None:
+            self._load()
+        return self._model is not None
+
+    def should_rerank(self, candidate_count: int) -> bool:
+        """
+        判断本次请求是否执行重排
+
+        Args:
+            candidate_count: 待重排的候选数
+
+        Returns:
+            是否重排
+        """
+        if not self.enabled:
+            return False
+        if self.model is None:
+            self._stats["skipped_not_ready"] += 1
+            return False
+        if self._in_flight >= settings.RERANK_MAX_CONCURRENT:
+            self._stats["skipped_load"] += 1
+            return False
+        if self._ms_per_pair is not None and self._ms_per_pair * candidate_count > settings.RERANK_LATENCY_BUDGET_MS:
+            self._stats["skipped_budget"] += 1
+            # 逐步衰减估计值，负载回落后能重新尝试重排
+            self._ms_per_pair *= 0.95
+            return False
+        return True
+
+    def rerank(self, query: str, passages: List[Dict], top_k: int) -> Optional[List[Dict]]:
+        """
+        对候选段落重排
+
+        Args:
+            query: 查询文本
+            passages: 候选段落（需包含content，最好包含chunk_id）
+            top_k: 返回数量
+
+        Returns:
+            重排后的前top_k个段落（附带rerank_score），失败时返回None
+        """
+        if not passages:
+            return []
+
+        with self._counter_lock:
+            self._in_flight += 1
+        try:
+            query_key = normalize_query(query)
+            keys = [(query_key, passage.get("chunk_id") or passage["content"]) for passage in passages]
+            cached = self._score_cache.get_many(keys)
+
+            missing = [i for i, key in enumerate(keys) if key not in cached]
+            if missing:
+                start = time.perf_counter()
+                pairs = [(query, passages[i]["content"]) for i in missing]
+                scores = self._model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+                self._record_latency((time.perf_counter() - start) * 1000 / len(pairs))
+                for i, score in zip(missing, np.asarray(scores, dtype=np.float32)):
+                    self._score_cache.put(keys[i], float(score))
+                    cached[keys[i]] = float(score)
+
+            ranked = sorted(
+                (dict(passage, rerank_score=round(cached[key], 4)) for passage, key in zip(passages, keys)),
+                key=lambda passage: passage["rerank_score"],
+                reverse=True
+            )
+            self._stats["reranked"] += 1
+            return ranked[:top_k]
+        except Exception as e:
+            print(f"重排失败: {e}")
+            return None
+        finally:
+            with self._counter_lock:
+                self._in_flight -= 1
+
+    def stats(self) -> Dict:
+        """返回重排统计"""
+        return {
+            "enabled": self.enabled,
+            "ready": self._model is not None,
+            "ms_per_pair": round(self._ms_per_pair, 3) if self._ms_per_pair is not None else None,
+            "score_cache": self._score_cache.stats(),
+            **self._stats
+        }
+
+    def _record_latency(self, ms_per_pair: float):
+        """更新单对耗时的指数移动平均"""
+        if self._ms_per_pair is None:
+            self._ms_per_pair = ms_per_pair
+        else:
+            self._ms_per_pair = 0.8 * self._ms_per_pair + 0.2 * ms_per_pair
+
+    def _load(self):
+        """加载交叉编码器模型"""
+        try:
+            from sentence_transformers import CrossEncoder
+            from app.services.embedding_model import resolve_cached_model
+
+            model_path = settings.RERANK_MODEL_PATH
+            if model_path and os.path.isdir(model_path):
+                self._model = CrossEncoder(model_path, device="cpu")
+            elif not settings.EMBEDDING_ALLOW_DOWNLOAD:
+                # 只从本地缓存目录加载，避免无网络时卡住
+                cached_path = resolve_cached_model(settings.RERANK_MODEL)
+                if cached_path is None:
+                    raise RuntimeError(f"本地未找到重排模型 {settings.RERANK_MODEL}")
+                self._model = CrossEncoder(cached_path, device="cpu")
+            else:
+                self._model = CrossEncoder(settings.RERANK_MODEL, device="cpu")
+            print(f"重排模型已加载: {model_path or settings.RERANK_MODEL}")
+        except Exception as e:
+            print(f"加载重排模型失败，将跳过重排: {e}")
+            self.enabled = False
@@ -5,8 +5,79 @@ import os
 import json
 from typing import Dict, Optional
 from sqlalchemy.orm import Session
+from app.config import settings
 from app.services.llm_service import LLMService
 from app.models.resume import Resume
+from app.utils.token_counter import estimate_tokens
+
+# 简历摘要的字段：(字段名, 标签, 列表最多取的条数)，按优先级排列，超出token上限时先舍弃靠后的字段
+_SNIPPET_FIELDS = [
+    ("name", "姓名", None),
+    ("education", "教育背景", None),
+    ("experience", "工作经历", 3),
+    ("skills", "技能", 8),
+    ("projects", "项目经历", 3),
+]
+
+
+def render_resume_snippet(parsed_data: Optional[Dict], max_tokens: int = 300) -> str:
+    """
+    把解析后的简历渲染成紧凑的摘要文本
+
+    Args:
+        parsed_data: 解析后的简历数据
+        max_tokens: 摘要的token上限（按 estimate_tokens 估算）
+
+    Returns:
+        每行一个字段的摘要，没有可用字段时返回空字符串
+    """
+    lines, used = [], 0
+    for key, label, limit in _SNIPPET_FIELDS:
+        value = (parsed_data or {}).get(key)
+        if not value:
+            continue
+        if isinstance(value, list):
+            value = ", ".join(str(item) for item in value[:limit])
+        line = f"{label}：{value}"
+        remaining = max_tokens - used
+        tokens = estimate_tokens(line) + 1
+        if tokens > remaining:
+            # 二分查找能放下的最长前缀，放不下标签时停止
+            low, high = 0, len(line)
+            while low < high:
+                middle = (low + high + 1) // 2
+                if estimate_tokens(line[:middle] + "…") + 1 <= remaining:
+                    low = middle
+                else:
+                    high = middle - 1
+            if low <= len(label) + 1:
+                break
+            line, tokens = line[:low] + "…", remaining
+        lines.append(line)
+        used += tokens
+    return "\n".join(lines)
+
+
+def resume_snippet(resume: Resume, db: Optional[Session] = None) -> str:
+    """
+    获取简历的摘要，早于该字段创建的简历在首次使用时渲染并回填
+
+    Args:
+        resume: 简历
+        db: 数据库会话（提供时随会话的下一次提交写回）
+
+    Returns:
+        简历摘要
+    """
+    if resume.context_snippet is not None:
+        return resume.context_snippet
+    snippet = render_resume_snippet(resume.parsed_data, settings.RESUME_SNIPPET_MAX_TOKENS)
+    if db is not None:
+        db.query(Resume).filter(Resume.id == resume.id).update({
+            Resume.context_snippet: snippet,
+            Resume.updated_at: Resume.updated_at
+        }, synchronize_session=False)
+    return snippet
 
 
 class ResumeService:
@@ -106,6 +177,7 @@ class ResumeService:
             file_type=file_type,
             parsed_data=parsed_data,
             raw_text=raw_text,
+            context_snippet=render_resume_snippet(parsed_data, settings.RESUME_SNIPPET_MAX_TOKENS),
             is_active=1,
             version=1
         )
@@ -0,0 +1,138 @@
+"""
+用户上下文缓存：按用户id缓存对话用的用户上下文，用户相关数据写入时通过版本号失效
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Set
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.utils.lru_cache import LRUCache
+
+# 写入后需要使用户上下文失效的表
+_TRACKED_TABLES = ("users", "tasks", "interviews", "resumes", "user_preferences")
+_PENDING_KEY = "user_context_pending"
+
+
+class UserContextCache:
+    """
+    用户上下文缓存
+
+    - 每个用户维护一个版本号，任务、面试、简历、偏好或用户信息写入并提交后版本号加一
+    - 缓存条目记录生成时的版本号，版本号不一致或超过有效期（兜底多worker部署）时重新加载
+    - 由上下文派生的结果（系统提示词、简历摘要）随条目一起缓存，天然与版本号绑定
+    """
+
+    def __init__(self, ttl_seconds: float = 300, max_users: int = 5000, enabled: bool = True):
+        """
+        Args:
+            ttl_seconds: 条目有效期（秒）
+            max_users: 最多缓存的用户数
+            enabled: 是否启用缓存
+        """
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries = LRUCache(max_users)
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.invalidations = 0
+
+    def version(self, user_id: int) -> int:
+        """返回用户当前的上下文版本号"""
+        return self._versions.get(user_id, 0)
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        """
+        获取仍然有效的缓存条目
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            {"version", "context", "memo", "created_at"}，未命中时返回None
+        """
+        if not self.enabled:
+            return None
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry["version"] != self.version(user_id) or time.monotonic() - entry["created_at"] > self.ttl_seconds:
+            self._entries.pop(user_id)
+            return None
+        return entry
+
+    def put(self, user_id: int, version: int, context: Dict) -> Dict:
+        """
+        缓存加载好的上下文
+
+        Args:
+            user_id: 用户ID
+            version: 开始加载前读取的版本号（加载期间发生写入时该条目会在下次读取时失效）
+            context: 用户上下文
+
+        Returns:
+            缓存条目
+        """
+        entry = {"version": version, "context": context, "memo": {}, "created_at": time.monotonic()}
+        if self.enabled:
+            self._entries.put(user_id, entry)
+        return entry
+
+    @staticmethod
+    def memoize(entry: Dict, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """在条目上缓存派生结果，条目失效后随之失效"""
+        if key not in entry["memo"]:
+            entry["memo"][key] = factory()
+        return entry["memo"][key]
+
+    def invalidate(self, user_ids: Set[int]):
+        """递增用户版本号并丢弃缓存条目"""
+        with self._lock:
+            for user_id in user_ids:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+                self._entries.pop(user_id)
+                self.invalidations += 1
+
+    def stats(self) -> Dict:
+        """返回命中统计"""
+        return dict(self._entries.stats(), enabled=self.enabled, ttl_seconds=self.ttl_seconds,
+                    invalidations=self.invalidations)
+
+
+user_context_cache = UserContextCache(
+    ttl_seconds=settings.USER_CONTEXT_CACHE_TTL_SECONDS,
+    max_users=settings.USER_CONTEXT_CACHE_MAX_USERS,
+    enabled=settings.USER_CONTEXT_CACHE_ENABLED
+)
+
+
+def _owner_id(instance) -> Optional[int]:
+    """返回写入对象所属的用户id，与用户上下文无关的表返回None"""
+    table = getattr(instance, "__tablename__", None)
+    if table not in _TRACKED_TABLES:
+        return None
+    return instance.id if table == "users" else getattr(instance, "user_id", None)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_written_users(session: Session, flush_context):
+    """记录本次事务中写入过上下文相关数据的用户"""
+    changed = [instance for instance in session.dirty if session.is_modified(instance)]
+    user_ids = {_owner_id(instance) for instance in (*session.new, *changed, *session.deleted)}
+    user_ids.discard(None)
+    if user_ids:
+        session.info.setdefault(_PENDING_KEY, set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_written_users(session: Session):
+    """事务提交后使相关用户的上下文失效"""
+    user_ids = session.info.pop(_PENDING_KEY, None)
+    if user_ids:
+        user_context_cache.invalidate(user_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_written_users(session: Session):
+    """事务回滚时数据未变化，无需失效"""
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,550 @@
+"""
+向量索引：内存中的段落向量索引，支持int8标量量化和1-bit符号码，粗排后用float32精确重排
+"""
+import os
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+# 每次处理的行数，限制量化码反量化时的临时内存
+_BLOCK_SIZE = 4096
+# 0-255每个字节中1的个数，用于计算汉明距离
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+QUANTIZATION_MODES = ("none", "int8", "binary")
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2归一化，使内积等于余弦相似度"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorIndex:
+    """
+    量化向量索引
+
+    - none:   float32暴力检索
+    - int8:   每个向量按最大绝对值缩放到int8，内存约为float32的1/4
+    - binary: 每维只保留符号位，内存约为float32的1/32，先按汉明距离粗排
+
+    量化模式下先在压缩码上取 top_k * rescore_factor 个候选，再用float32向量精确打分。
+    指定 store_dir 时float32向量写入磁盘并以mmap只读方式打开，常驻内存的只有量化码，
+    精排时由操作系统按需读入候选行；未指定时float32向量与量化码同时常驻内存。
+    """
+
+    def __init__(self, quantization: str = "int8", rescore_factor: int = 4, store_dir: Optional[str] = None, name: str = "index"):
+        """
+        Args:
+            quantization: 量化方式 none / int8 / binary
+            rescore_factor: 粗排候选数相对top_k的倍数
+            store_dir: float32向量的落盘目录（为空时float32向量常驻内存）
+            name: 索引名，用于落盘文件名
+        """
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"不支持的量化方式: {quantization}")
+        self.quantization = quantization
+        self.rescore_factor = max(1, rescore_factor)
+        self.store_dir = store_dir
+        self.name = name
+
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.dim = 0
+        self._vectors = None   # float32向量（内存或mmap）
+        self._int8_codes = None
+        self._int8_scales = None
+        self._binary_codes = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def build(self, ids: List[int], vectors: np.ndarray):
+        """
+        构建索引
+
+        Args:
+            ids: 向量对应的id
+            vectors: 形状为(len(ids), dim)的向量矩阵
+        """
+        vectors = normalize_rows(vectors).reshape(len(ids), -1)
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.dim = vectors.shape[1]
+        self._vectors = self._store_vectors(vectors)
+
+        if self.quantization == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._int8_codes = np.round(vectors / scales[:, None]).astype(np.int8)
+            self._int8_scales = scales.astype(np.float32)
+        elif self.quantization == "binary":
+            self._binary_codes = np.packbits(vectors > 0, axis=1)
+
+    def search(self, query: np.ndarray, top_k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        检索最相似的向量
+
+        Args:
+            query: 查询向量
+            top_k: 返回数量
+            mask: 可选的布尔数组，只在为True的行中检索
+
+        Returns:
+            [(id, 余弦相似度), ...]，按相似度降序
+        """
+        if len(self.ids) == 0 or top_k <= 0:
+            return []
+        query = normalize_rows(query).reshape(-1)
+
+        if self.quantization == "none":
+            rows = np.arange(len(self.ids))
+        else:
+            coarse = self._coarse_scores(query[None, :])[:, 0]
+            rows = self._top_rows(coarse, top_k * self.rescore_factor, mask)
+            mask = None
+
+        # float32精确打分（mmap时只会读入候选行）
+        scores = np.asarray(self._vectors[rows]) @ query
+        if mask is not None:
+            scores = np.where(mask[rows], scores, -np.inf)
+        order = self._top_rows(scores, top_k, None)
+        return [(int(self.ids[rows[i]]), float(scores[i])) for i in order if np.isfinite(scores[i])]
+
+    def get_vectors(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """读取归一化后的float32向量（可只读取指定行）"""
+        if self._vectors is None:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.asarray(self._vectors if rows is None else self._vectors[rows], dtype=np.float32)
+
+    def release(self):
+        """删除落盘的向量文件（打开后未能立即删除时使用，已打开的mmap仍可继续读取）"""
+        if isinstance(self._vectors, np.memmap) and os.path.exists(self._vectors.filename):
+            try:
+                os.remove(self._vectors.filename)
+            except OSError:
+                pass
+
+    def search_batch(self, queries: np.ndarray, top_k: int) -> List[List[Tuple[int, float]]]:
+        """
+        批量检索：所有查询在一次矩阵乘法中完成粗排（none模式下直接完成精确打分）
+
+        Args:
+            queries: 形状为(查询数, dim)的查询矩阵
+            top_k: 每个查询的返回数量
+
+        Returns:
+            每个查询的[(id, 余弦相似度), ...]
+        """
+        queries = normalize_rows(queries).reshape(len(queries), -1)
+        if len(self.ids) == 0 or top_k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        if self.quantization == "none":
+            scores = np.asarray(self._vectors) @ queries.T
+            results = []
+            for j in range(len(queries)):
+                order = self._top_rows(scores[:, j], top_k, None)
+                results.append([(int(self.ids[i]), float(scores[i, j])) for i in order])
+            return results
+
+        coarse = self._coarse_scores(queries)
+        results = []
+        for j, query in enumerate(queries):
+            rows = self._top_rows(coarse[:, j], top_k * self.rescore_factor, None)
+            scores = np.asarray(self._vectors[rows]) @ query
+            order = self._top_rows(scores, top_k, None)
+            results.append([(int(self.ids[rows[i]]), float(scores[i])) for i in order])
+        return results
+
+    def exact_search(self, query: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        """float32暴力检索，作为召回率评估的基准"""
+        query = normalize_rows(query).reshape(-1)
+        scores = np.asarray(self._vectors) @ query
+        order = self._top_rows(scores, top_k, None)
+        return [(int(self.ids[i]), float(scores[i])) for i in order]
+
+    def measure_recall(self, queries: np.ndarray, top_k: int = 5) -> float:
+        """
+        评估量化检索相对精确检索的召回率
+
+        Args:
+            queries: 查询向量矩阵
+            top_k: 评估的k值
+
+        Returns:
+            recall@k（0-1）
+        """
+        if len(self.ids) == 0 or len(queries) == 0:
+            return 1.0
+        hit, total = 0, 0
+        for query in queries:
+            expected = {i for i, _ in self.exact_search(query, top_k)}
+            found = {i for i, _ in self.search(query, top_k)}
+            hit += len(expected & found)
+            total += len(expected)
+        return hit / total if total else 1.0
+
+    def memory_stats(self) -> Dict:
+        """
+        返回索引内存占用（字节）
+
+        resident_bytes 是索引实际常驻的内存：量化码、id，以及未落盘时的float32向量；
+        落盘的float32向量计入 disk_bytes（精排读入的候选行由操作系统页缓存管理，可被回收）。
+        compression 是同规模float32索引的内存与 resident_bytes 之比。
+        """
+        float_bytes = len(self.ids) * self.dim * 4
+        if self.quantization == "int8":
+            code_bytes = self._int8_codes.nbytes + self._int8_scales.nbytes
+        elif self.quantization == "binary":
+            code_bytes = self._binary_codes.nbytes
+        else:
+            code_bytes = 0
+        on_disk = isinstance(self._vectors, np.memmap)
+        resident_bytes = code_bytes + (0 if on_disk else float_bytes) + self.ids.nbytes
+        return {
+            "vectors": len(self.ids),
+            "quantization": self.quantization,
+            "float32_bytes": float_bytes,
+            "code_bytes": code_bytes,
+            "disk_bytes": float_bytes if on_disk else 0,
+            "resident_bytes": resident_bytes,
+            "compression": round((float_bytes + self.ids.nbytes) / resident_bytes, 1) if resident_bytes else 1.0
+        }
+
+    def _coarse_scores(self, queries: np.ndarray) -> np.ndarray:
+        """在量化码上计算粗排分数（越大越相似），返回形状为(向量数, 查询数)的矩阵"""
+        scores = np.empty((len(self.ids), len(queries)), dtype=np.float32)
+        if self.quantization == "int8":
+            for start in range(0, len(self.ids), _BLOCK_SIZE):
+                block = self._int8_codes[start:start + _BLOCK_SIZE].astype(np.float32)
+                scores[start:start + _BLOCK_SIZE] = (block @ queries.T) * self._int8_scales[start:start + _BLOCK_SIZE, None]
+        else:
+            query_codes = np.packbits(queries > 0, axis=1)
+            for start in range(0, len(self.ids), _BLOCK_SIZE):
+                block = self._binary_codes[start:start + _BLOCK_SIZE]
+                for j, query_code in enumerate(query_codes):
+                    xor = np.bitwise_xor(block, query_code)
+                    # 汉明距离越小越相似，取负数作为分数
+                    scores[start:start + _BLOCK_SIZE, j] = -_POPCOUNT_TABLE[xor].sum(axis=1, dtype=np.int32)
+        return scores
+
+    @staticmethod
+    def _top_rows(scores: np.ndarray, k: int, mask: Optional[np.ndarray]) -> np.ndarray:
+        """取分数最高的k行，按分数降序"""
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+            k = min(k, int(mask.sum()))
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        rows = np.argpartition(-scores, k - 1)[:k]
+        return rows[np.argsort(-scores[rows], kind="stable")]
+
+    def _store_vectors(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        保存float32向量：配置了落盘目录时写文件并mmap打开
+
+        打开后立即删除文件名（已打开的mmap仍可读取，映射释放时空间自动回收），
+        进程退出或主段被替换后不会在目录中残留文件；无法删除打开中文件的系统上由 release() 删除。
+        """
+        if not self.store_dir or self.quantization == "none" or len(vectors) == 0:
+            return vectors
+        os.makedirs(self.store_dir, exist_ok=True)
+        path = os.path.join(self.store_dir, f"{self.name}.{os.getpid()}.f32")
+        memmap = np.memmap(path, dtype=np.float32, mode="w+", shape=vectors.shape)
+        memmap[:] = vectors
+        memmap.flush()
+        del memmap
+        stored = np.memmap(path, dtype=np.float32, mode="r", shape=vectors.shape)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return stored
+
+
+class SegmentedVectorIndex:
+    """
+    可增量更新的向量索引：不可变的量化主段 + 追加写入的增量段 + 删除标记
+
+    - 新增/更新的向量追加到float32增量段，检索时暴力扫描
+    - 删除的向量只记录id标记，检索结果中过滤
+    - 每次写入返回新的实例（写时复制），正在检索的读者不受影响
+    - 增量段或删除标记过多时在后台合并为新的主段（compact），再用rebase衔接合并期间的新写入
+    """
+
+    def __init__(self, base: Optional[VectorIndex] = None, delta_ids: Optional[np.ndarray] = None,
+                 delta_vectors: Optional[np.ndarray] = None, tombstones: frozenset = frozenset()):
+        """
+        Args:
+            base: 量化主段（可为空）
+            delta_ids: 增量段id
+            delta_vectors: 增量段归一化向量
+            tombstones: 已删除的id
+        """
+        self.base = base
+        self.delta_ids = delta_ids if delta_ids is not None else np.zeros(0, dtype=np.int64)
+        self.delta_vectors = delta_vectors
+        self.tombstones = tombstones
+
+    def __len__(self) -> int:
+        base_size = len(self.base) if self.base is not None else 0
+        return base_size + len(self.delta_ids) - len(self.tombstones)
+
+    @property
+    def ids(self) -> np.ndarray:
+        """当前有效的全部id"""
+        base_ids = self.base.ids if self.base is not None else np.zeros(0, dtype=np.int64)
+        ids = np.concatenate([base_ids, self.delta_ids])
+        if self.tombstones:
+            ids = ids[~np.isin(ids, list(self.tombstones))]
+        return ids
+
+    def upsert(self, ids: List[int], vectors: np.ndarray, removed_ids: List[int] = ()) -> "SegmentedVectorIndex":
+        """
+        追加向量并删除旧向量
+
+        Args:
+            ids: 新向量id（不能与已有id重复）
+            vectors: 新向量矩阵
+            removed_ids: 需要删除的旧id
+
+        Returns:
+            新的索引实例
+        """
+        delta_ids, delta_vectors = self.delta_ids, self.delta_vectors
+        if len(ids):
+            vectors = normalize_rows(vectors).reshape(len(ids), -1)
+            delta_ids = np.concatenate([delta_ids, np.asarray(ids, dtype=np.int64)])
+            delta_vectors = vectors if delta_vectors is None else np.vstack([delta_vectors, vectors])
+        tombstones = self.tombstones | frozenset(int(i) for i in removed_ids) if removed_ids else self.tombstones
+        return SegmentedVectorIndex(self.base, delta_ids, delta_vectors, tombstones)
+
+    def delete(self, ids: List[int]) -> "SegmentedVectorIndex":
+        """删除向量，返回新的索引实例"""
+        return self.upsert([], None, ids)
+
+    def search(self, query: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        """
+        检索最相似的向量（合并主段与增量段，过滤已删除id）
+
+        Args:
+            query: 查询向量
+            top_k: 返回数量
+
+        Returns:
+            [(id, 余弦相似度), ...]，按相似度降序
+        """
+        return self.search_batch(np.asarray(query, dtype=np.float32).reshape(1, -1), top_k)[0]
+
+    def search_batch(self, queries: np.ndarray, top_k: int) -> List[List[Tuple[int, float]]]:
+        """
+        批量检索：主段和增量段各用一次矩阵乘法为所有查询打分
+
+        Args:
+            queries: 形状为(查询数, dim)的查询矩阵
+            top_k: 每个查询的返回数量
+
+        Returns:
+            每个查询的[(id, 余弦相似度), ...]
+        """
+        results = [[] for _ in range(len(queries))]
+        if top_k <= 0:
+            return results
+        # 多取与删除标记数量相同的结果，过滤后仍能凑够top_k
+        candidate_k = top_k + len(self.tombstones)
+        if self.base is not None:
+            for hits, base_hits in zip(results, self.base.search_batch(queries, candidate_k)):
+                hits.extend(base_hits)
+        if len(self.delta_ids):
+            scores = self.delta_vectors @ normalize_rows(queries).reshape(len(queries), -1).T
+            for j, hits in enumerate(results):
+                order = VectorIndex._top_rows(scores[:, j], candidate_k, None)
+                hits.extend((int(self.delta_ids[i]), float(scores[i, j])) for i in order)
+
+        for j, hits in enumerate(results):
+            hits = [hit for hit in hits if hit[0] not in self.tombstones]
+            hits.sort(key=lambda hit: hit[1], reverse=True)
+            results[j] = hits[:top_k]
+        return results
+
+    def needs_compaction(self, max_delta_ratio: float, min_delta_size: int) -> bool:
+        """增量段与删除标记之和超过主段规模的一定比例时需要合并"""
+        pending = len(self.delta_ids) + len(self.tombstones)
+        base_size = len(self.base) if self.base is not None else 0
+        return pending >= max(min_delta_size, max_delta_ratio * base_size)
+
+    def compact(self, **index_kwargs) -> "SegmentedVectorIndex":
+        """
+        将主段、增量段合并为新的量化主段（耗时操作，应在后台线程执行）
+
+        Args:
+            index_kwargs: 新主段的VectorIndex构造参数
+
+        Returns:
+            只有主段的新实例
+        """
+        ids, vectors = [], []
+        if self.base is not None and len(self.base):
+            ids.append(self.base.ids)
+            vectors.append(self.base.get_vectors())
+        if len(self.delta_ids):
+            ids.append(self.delta_ids)
+            vectors.append(self.delta_vectors)
+        if not ids:
+            return SegmentedVectorIndex()
+
+        all_ids = np.concatenate(ids)
+        all_vectors = np.vstack(vectors)
+        if self.tombstones:
+            keep = ~np.isin(all_ids, list(self.tombstones))
+            all_ids, all_vectors = all_ids[keep], all_vectors[keep]
+        if len(all_ids) == 0:
+            return SegmentedVectorIndex()
+
+        base = VectorIndex(**index_kwargs)
+        base.build(all_ids, all_vectors)
+        return SegmentedVectorIndex(base)
+
+    def rebase(self, compacted: "SegmentedVectorIndex", source: "SegmentedVectorIndex") -> Optional["SegmentedVectorIndex"]:
+        """
+        将合并期间发生的写入衔接到合并结果上
+
+        Args:
+            compacted: source.compact() 的结果
+            source: 合并时使用的快照（必须是当前实例的历史版本）
+
+        Returns:
+            衔接后的新实例；主段已被其他操作替换时返回None
+        """
+        if self.base is not source.base:
+            return None
+        # 增量段只追加、删除标记只增加，合并之后的写入就是两者的差集
+        new_ids = self.delta_ids[len(source.delta_ids):]
+        new_vectors = self.delta_vectors[len(source.delta_ids):] if len(new_ids) else None
+        live = set(compacted.ids.tolist()) | set(new_ids.tolist())
+        tombstones = frozenset(i for i in self.tombstones - source.tombstones if i in live)
+        return SegmentedVectorIndex(compacted.base, new_ids, new_vectors, tombstones)
+
+    def memory_stats(self) -> Dict:
+        """返回主段与增量段的内存占用"""
+        stats = self.base.memory_stats() if self.base is not None else {
+            "vectors": 0, "quantization": None, "float32_bytes": 0, "code_bytes": 0, "disk_bytes": 0,
+            "resident_bytes": 0, "compression": 1.0
+        }
+        delta_bytes = self.delta_vectors.nbytes + self.delta_ids.nbytes if len(self.delta_ids) else 0
+        resident_bytes = stats["resident_bytes"] + delta_bytes
+        # 同规模float32索引的内存：主段float32向量和id + 增量段（增量段本身就是float32）
+        float_equivalent = stats["float32_bytes"] + (self.base.ids.nbytes if self.base is not None else 0) + delta_bytes
+        return dict(
+            stats,
+            vectors=len(self),
+            delta_vectors=len(self.delta_ids),
+            tombstones=len(self.tombstones),
+            resident_bytes=resident_bytes,
+            compression=round(float_equivalent / resident_bytes, 1) if resident_bytes else 1.0
+        )
+
+
+class PartitionedVectorIndex:
+    """
+    按岗位类别分区的向量索引
+
+    每个类别一个独立的索引（VectorIndex或SegmentedVectorIndex），带类别过滤的检索只扫描对应分区；
+    不带过滤的全局检索在各分区上分别取top_k后合并，不额外保存一份全量副本。
+    分区可以单独替换，某个类别的文档变化时只需重建该分区。
+    """
+
+    # 没有岗位类别的段落归入此分区
+    DEFAULT_PARTITION = ""
+
+    def __init__(self, partitions: Optional[Dict] = None, generation: int = 0):
+        """
+        Args:
+            partitions: 初始分区 {类别: 索引}
+            generation: 索引对应的知识库变更代数
+        """
+        self._partitions = dict(partitions or {})
+        self.generation = generation
+
+    def copy(self, generation: Optional[int] = None) -> "PartitionedVectorIndex":
+        """浅拷贝分区表，用于写时复制生成新快照"""
+        return PartitionedVectorIndex(self._partitions, self.generation if generation is None else generation)
+
+    @classmethod
+    def partition_key(cls, position_category: Optional[str]) -> str:
+        return position_category or cls.DEFAULT_PARTITION
+
+    def set_partition(self, position_category: Optional[str], index):
+        """替换分区（读者持有的旧分区引用不受影响）"""
+        self._partitions[self.partition_key(position_category)] = index
+
+    def drop_partition(self, position_category: Optional[str]):
+        self._partitions.pop(self.partition_key(position_category), None)
+
+    def get_partition(self, position_category: Optional[str]):
+        return self._partitions.get(self.partition_key(position_category))
+
+    def partition_keys(self) -> List[str]:
+        return list(self._partitions)
+
+    def __len__(self) -> int:
+        return sum(len(index) for index in list(self._partitions.values()))
+
+    def search(self, query: np.ndarray, top_k: int, position_category: Optional[str] = None) -> List[Tuple[int, float]]:
+        """
+        检索最相似的向量
+
+        Args:
+            query: 查询向量
+            top_k: 返回数量
+            position_category: 指定时只检索该类别分区，否则检索全部分区
+
+        Returns:
+            [(id, 余弦相似度), ...]，按相似度降序
+        """
+        if position_category:
+            index = self.get_partition(position_category)
+            return index.search(query, top_k) if index is not None else []
+
+        hits = []
+        for index in list(self._partitions.values()):
+            hits.extend(index.search(query, top_k))
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return hits[:top_k]
+
+    def search_batch(self, queries: np.ndarray, top_k: int, position_category: Optional[str] = None) -> List[List[Tuple[int, float]]]:
+        """
+        批量检索
+
+        Args:
+            queries: 形状为(查询数, dim)的查询矩阵
+            top_k: 每个查询的返回数量
+            position_category: 指定时只检索该类别分区，否则检索全部分区
+
+        Returns:
+            每个查询的[(id, 余弦相似度), ...]
+        """
+        if position_category:
+            index = self.get_partition(position_category)
+            return index.search_batch(queries, top_k) if index is not None else [[] for _ in range(len(queries))]
+
+        results = [[] for _ in range(len(queries))]
+        for index in list(self._partitions.values()):
+            for hits, partition_hits in zip(results, index.search_batch(queries, top_k)):
+                hits.extend(partition_hits)
+        for hits in results:
+            hits.sort(key=lambda hit: hit[1], reverse=True)
+            del hits[top_k:]
+        return results
+
+    def memory_stats(self) -> Dict:
+        """返回各分区及合计的内存占用"""
+        partitions = {key or "(default)": index.memory_stats() for key, index in list(self._partitions.items())}
+        return {
+            "partitions": partitions,
+            "generation": self.generation,
+            "vectors": sum(stats["vectors"] for stats in partitions.values()),
+            "disk_bytes": sum(stats["disk_bytes"] for stats in partitions.values()),
+            "resident_bytes": sum(stats["resident_bytes"] for stats in partitions.values())
+        }
@@ -0,0 +1,97 @@
+"""
+上下文打包工具：在token预算内为RAG提示词挑选最相关的句子
+"""
+from typing import Dict, List
+from app.utils.text_chunker import split_sentences
+from app.utils.text_features import char_bigrams, jaccard
+from app.utils.token_counter import estimate_tokens
+
+
+class ContextPacker:
+    """
+    上下文打包器
+
+    1. 将检索到的段落拆成句子，按所属段落得分和与问题的字面重合度打分
+    2. 按分数从高到低装入，超出token预算或与已选句子近似重复的句子被丢弃
+    3. 已选句子按段落排名和原文顺序输出，保证上下文可读
+    """
+
+    def __init__(self, token_budget: int = 1200, dedup_threshold: float = 0.8, query_weight: float = 0.5):
+        """
+        Args:
+            token_budget: 上下文最大token数
+            dedup_threshold: 二元组Jaccard相似度达到该值视为重复句
+            query_weight: 与问题字面重合度在句子得分中的权重
+        """
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+        self.query_weight = query_weight
+
+    def pack(self, query: str, documents: List[Dict]) -> Dict:
+        """
+        打包上下文
+
+        Args:
+            query: 用户问题
+            documents: 检索结果（按相关度降序，需包含title和content）
+
+        Returns:
+            {"context": 上下文文本, "packed_tokens", "dropped_tokens", "packed_sentences", "dropped_sentences", "duplicate_sentences"}
+        """
+        query_grams = char_bigrams(query)
+        candidates = []
+        for rank, doc in enumerate(documents):
+            doc_score = self._document_score(doc, rank)
+            content = doc.get("content") or ""
+            for order, (start, end) in enumerate(split_sentences(content)):
+                sentence = content[start:end]
+                grams = char_bigrams(sentence)
+                overlap = len(query_grams & grams) / len(query_grams) if query_grams else 0.0
+                candidates.append({
+                    "rank": rank,
+                    "order": order,
+                    "text": sentence,
+                    "grams": grams,
+                    "tokens": estimate_tokens(sentence),
+                    "score": doc_score + self.query_weight * overlap
+                })
+
+        selected = []
+        used_tokens = 0
+        dropped_tokens = 0
+        duplicates = 0
+        for candidate in sorted(candidates, key=lambda c: (-c["score"], c["rank"], c["order"])):
+            if any(jaccard(candidate["grams"], chosen["grams"]) >= self.dedup_threshold for chosen in selected):
+                duplicates += 1
+                dropped_tokens += candidate["tokens"]
+                continue
+            if used_tokens + candidate["tokens"] > self.token_budget:
+                dropped_tokens += candidate["tokens"]
+                continue
+            selected.append(candidate)
+            used_tokens += candidate["tokens"]
+
+        # 按段落排名分组，组内保持原文顺序
+        lines = []
+        for rank, doc in enumerate(documents):
+            sentences = sorted((c for c in selected if c["rank"] == rank), key=lambda c: c["order"])
+            if sentences:
+                lines.append(f"{doc.get('title', '')}: {''.join(c['text'] for c in sentences)}")
+
+        return {
+            "context": "\n".join(lines),
+            "packed_tokens": used_tokens,
+            "dropped_tokens": dropped_tokens,
+            "packed_sentences": len(selected),
+            "dropped_sentences": len(candidates) - len(selected),
+            "duplicate_sentences": duplicates
+        }
+
+    @staticmethod
+    def _document_score(doc: Dict, rank: int) -> float:
+        """段落得分：优先使用重排分数和检索分数，都没有时按排名递减"""
+        if doc.get("rerank_score") is not None:
+            return float(doc["rerank_score"])
+        if doc.get("score") is not None:
+            return float(doc["score"])
+        return 1.0 / (rank + 1)
@@ -78,13 +78,14 @@ class DataLoader:
             position_categories: 岗位类别列表
         """
         from app.services.rag_service import RAGService
-        rag = RAGService()
+        # 离线导入时等待模型加载完成
+        rag = RAGService(wait_for_model=True)
 
         for category in position_categories:
             items = DataLoader.load_knowledge_base_data(category)
             for item in items:
                 # 生成embedding
-                embedding = rag.get_embedding(item["content"])
+                embedding = rag.get_embeddings([item["content"]])[0].tolist()
 
                 kb_item = KnowledgeBase(
                     title=item["title"],
@@ -94,5 +95,24 @@ class DataLoader:
                     embedding_vector=json.dumps(embedding)
                 )
                 db.add(kb_item)
+                db.flush()
 
-        db.commit()
\ No newline at end of file
+                # 分块并生成段落向量，用于段落级检索
+                rag.index_document(kb_item, db, commit=False)
+
+        db.commit()
+
+    @staticmethod
+    def ingest_knowledge_directory(db: Session, root: str = None) -> Dict:
+        """
+        从知识库目录导入Markdown/JSONL/TXT文件（增量、可断点续传）
+
+        Args:
+            db: 数据库会话
+            root: 知识库目录（默认为配置的KNOWLEDGE_BASE_DIR）
+
+        Returns:
+            导入统计
+        """
+        from app.utils.knowledge_ingester import KnowledgeIngester
+        return KnowledgeIngester(root).run(db)
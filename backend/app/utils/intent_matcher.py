@@ -0,0 +1,255 @@
+"""
+意图识别工具：由关键词表构建 Aho–Corasick 自动机，一次扫描得到带权重的多标签意图
+"""
+import json
+import re
+import threading
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# 默认关键词表：意图 -> {关键词: 权重}，意图的先后顺序即得分相同时的优先级
+DEFAULT_INTENT_KEYWORDS = {
+    "learning": {"学习": 1.0, "任务": 1.0, "练习": 1.0, "知识": 1.0},
+    "personalized": {"简历": 1.0, "上传": 1.0, "个性化": 1.0, "定制": 1.0},
+    "interview": {"面试": 1.0, "模拟": 1.0, "测试": 1.0},
+    "feedback": {"反馈": 1.0, "建议": 1.0, "改进": 1.0},
+    "help": {"帮助": 1.0, "功能": 1.0, "介绍": 1.0, "怎么用": 1.0}
+}
+
+DEFAULT_INTENT = "general"
+
+# 不超过该字符数的消息走原来的逐个关键词子串查找（关键词较少时比自动机和多标签打分更快）
+SHORT_MESSAGE_CHARS = 200
+# 关键词超过该数量时子串查找的耗时随关键词数线性增长，所有消息都使用自动机
+SHORT_PATH_MAX_KEYWORDS = 64
+
+
+class AhoCorasick:
+    """
+    Aho–Corasick 多模式匹配自动机
+
+    - 构建时把失配转移展开成完整的状态转移表，扫描时每个字符只做一次字典查找
+    - 回到根状态后用正则（C实现）跳到下一个可能作为模式开头的字符，长文本中大部分字符不进入Python循环
+    - 忽略大小写时在转移表中同时登记大写字符，扫描前不需要复制一份小写文本
+    """
+
+    def __init__(self, patterns: List[str], ignore_case: bool = False):
+        """
+        Args:
+            patterns: 模式串列表（匹配结果中用下标表示）
+            ignore_case: 是否忽略大小写
+        """
+        self.patterns = list(patterns)
+        goto = [{}]
+        outputs = [[]]
+        for index, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            if ignore_case:
+                pattern = pattern.lower()
+            state = 0
+            for char in pattern:
+                if char not in goto[state]:
+                    goto.append({})
+                    outputs.append([])
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            outputs[state].append(index)
+
+        # 按层序计算失配指针，并把失配转移合并进转移表
+        fail = [0] * len(goto)
+        transitions = [dict(edges) for edges in goto]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            for char, target in transitions[fail[state]].items():
+                transitions[state].setdefault(char, target)
+            for char, child in goto[state].items():
+                fail[child] = transitions[fail[state]].get(char, 0)
+                queue.append(child)
+
+        if ignore_case:
+            for edges in transitions:
+                for char, target in list(edges.items()):
+                    upper = char.upper()
+                    if len(upper) == 1 and upper != char:
+                        edges.setdefault(upper, target)
+
+        self._transitions = transitions
+        self._outputs = [tuple(output) for output in outputs]
+        starts = sorted(transitions[0])
+        self._starts = re.compile("[" + "".join(re.escape(char) for char in starts) + "]") if starts else None
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        扫描文本，返回所有（含重叠的）匹配
+
+        Args:
+            text: 文本
+
+        Yields:
+            (匹配结束位置, 模式下标)
+        """
+        if self._starts is None:
+            return
+        transitions, outputs = self._transitions, self._outputs
+        search = self._starts.search
+        length = len(text)
+        position = 0
+        while True:
+            found = search(text, position)
+            if found is None:
+                return
+            # 从候选开头逐字符转移，回到根状态说明当前位置之前不存在未完成的匹配
+            state = 0
+            position = found.start()
+            while position < length:
+                state = transitions[state].get(text[position], 0)
+                position += 1
+                for index in outputs[state]:
+                    yield position, index
+                if not state:
+                    break
+
+
+class IntentEngine:
+    """
+    意图识别引擎
+
+    - 所有意图的关键词编译进同一个自动机，消息只扫描一遍
+    - 意图得分 = 命中关键词权重 × 命中次数之和，返回按得分排序的多个意图
+    - 短消息沿用原实现：按意图顺序查找关键词，只返回第一个命中的意图（单标签）；
+      长消息的主意图按得分选出，与原实现的结果可能不同
+    - 累计每个意图的命中消息数和关键词命中次数，用于观察关键词表效果
+    """
+
+    def __init__(self, keyword_table: Optional[Dict[str, Dict[str, float]]] = None,
+                 short_message_chars: int = SHORT_MESSAGE_CHARS):
+        """
+        Args:
+            keyword_table: 意图 -> {关键词: 权重}，为空时使用默认关键词表
+            short_message_chars: 不超过该字符数的消息使用子串查找（0表示始终使用自动机）
+        """
+        self.keyword_table = keyword_table or DEFAULT_INTENT_KEYWORDS
+        self._intent_order = {intent: order for order, intent in enumerate(self.keyword_table)}
+        self._keywords = []  # [(意图, 关键词, 权重)]，与自动机模式下标一一对应
+        for intent, keywords in self.keyword_table.items():
+            for keyword, weight in keywords.items():
+                self._keywords.append((intent, keyword.lower(), float(weight)))
+        self._automaton = AhoCorasick([keyword for _, keyword, _ in self._keywords], ignore_case=True)
+        self.short_message_chars = short_message_chars if len(self._keywords) <= SHORT_PATH_MAX_KEYWORDS else 0
+        self._intent_keywords = [  # [(意图, [(关键词, 权重)])]，按意图优先级排列
+            (intent, [(keyword, weight) for kw_intent, keyword, weight in self._keywords
+                      if kw_intent == intent and keyword and weight > 0])
+            for intent in self.keyword_table
+        ]
+        self._lock = threading.Lock()
+        self._counts = {intent: {"messages": 0, "matches": 0} for intent in self.keyword_table}
+        self._counts[DEFAULT_INTENT] = {"messages": 0, "matches": 0}
+
+    @classmethod
+    def from_file(cls, path: Optional[str]) -> "IntentEngine":
+        """
+        从JSON关键词表文件构建引擎，文件不存在或格式错误时使用默认关键词表
+
+        Args:
+            path: JSON文件路径，格式同 DEFAULT_INTENT_KEYWORDS（关键词也可以是列表，权重记为1）
+        """
+        if not path:
+            return cls()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                table = json.load(f)
+            normalized = {
+                intent: keywords if isinstance(keywords, dict) else {keyword: 1.0 for keyword in keywords}
+                for intent, keywords in table.items()
+            }
+            return cls(normalized)
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"加载意图关键词表失败，使用默认关键词表: {e}")
+            return cls()
+
+    def detect(self, message: str) -> Dict:
+        """
+        识别消息意图
+
+        Args:
+            message: 用户消息
+
+        Returns:
+            {"intent": 主意图, "intents": [{"intent", "score", "confidence", "matches"}], "keywords": 命中的关键词}
+        """
+        message = message or ""
+        if len(message) <= self.short_message_chars:
+            return self._detect_first_match(message)
+
+        scores, matches, keywords = {}, {}, {}
+        for _, index in self._automaton.iter_matches(message):
+            intent, keyword, weight = self._keywords[index]
+            scores[intent] = scores.get(intent, 0.0) + weight
+            matches[intent] = matches.get(intent, 0) + 1
+            keywords.setdefault(intent, set()).add(keyword)
+
+        total = sum(scores.values())
+        intents = sorted(
+            (
+                {
+                    "intent": intent,
+                    "score": round(score, 4),
+                    "confidence": round(score / total, 4) if total else 0.0,
+                    "matches": matches[intent]
+                }
+                for intent, score in scores.items() if score > 0
+            ),
+            key=lambda item: (-item["score"], self._intent_order[item["intent"]])
+        )
+        primary = intents[0]["intent"] if intents else DEFAULT_INTENT
+
+        with self._lock:
+            if not intents:
+                self._counts[DEFAULT_INTENT]["messages"] += 1
+            for item in intents:
+                self._counts[item["intent"]]["messages"] += 1
+                self._counts[item["intent"]]["matches"] += item["matches"]
+
+        return {
+            "intent": primary,
+            "intents": intents,
+            "keywords": {intent: sorted(words) for intent, words in keywords.items()}
+        }
+
+    def _detect_first_match(self, message: str) -> Dict:
+        """原实现的子串查找：按意图顺序返回第一个命中关键词的意图，得分只计算该意图"""
+        lowered = message.lower()
+        for intent, keywords in self._intent_keywords:
+            found = [(keyword, weight) for keyword, weight in keywords if keyword in lowered]
+            if not found:
+                continue
+            counts = [lowered.count(keyword) for keyword, _ in found]
+            matches = sum(counts)
+            with self._lock:
+                self._counts[intent]["messages"] += 1
+                self._counts[intent]["matches"] += matches
+            return {
+                "intent": intent,
+                "intents": [{
+                    "intent": intent,
+                    "score": round(sum(weight * count for (_, weight), count in zip(found, counts)), 4),
+                    "confidence": 1.0,
+                    "matches": matches
+                }],
+                "keywords": {intent: sorted(keyword for keyword, _ in found)}
+            }
+
+        with self._lock:
+            self._counts[DEFAULT_INTENT]["messages"] += 1
+        return {"intent": DEFAULT_INTENT, "intents": [], "keywords": {}}
+
+    def stats(self) -> Dict:
+        """返回每个意图的累计命中统计"""
+        with self._lock:
+            return {
+                "keywords": len(self._keywords),
+                "intents": {intent: dict(counts) for intent, counts in self._counts.items()}
+            }
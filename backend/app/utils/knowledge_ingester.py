@@ -0,0 +1,397 @@
+"""
+知识库目录导入工具：流式读取 data/knowledge_base 下的 Markdown/JSONL/TXT 文件，分批写入知识库并建立段落索引
+
+用法：
+    python -m app.utils.knowledge_ingester [目录]
+"""
+import hashlib
+import json
+import mmap
+import os
+import sys
+import time
+from typing import Dict, Iterator, List, Optional
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.knowledge_base import KnowledgeBase
+
+SUPPORTED_EXTENSIONS = (".md", ".markdown", ".jsonl", ".txt")
+MANIFEST_NAME = ".ingest_manifest.json"
+
+# 计算哈希时每次读取的字节数
+_HASH_BLOCK_SIZE = 1024 * 1024
+# knowledge_base.content 为MySQL TEXT类型，最多65535字节
+_TEXT_COLUMN_BYTES = 65535
+
+
+def file_sha256(path: str) -> str:
+    """分块计算文件内容的sha256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def split_utf8(text: str, max_bytes: int) -> List[str]:
+    """
+    按UTF-8字节数切分文本，不会切断多字节字符
+
+    Args:
+        text: 文本
+        max_bytes: 每段的最大字节数
+
+    Returns:
+        切分后的文本段
+    """
+    data = text.encode("utf-8")
+    pieces = []
+    while len(data) > max_bytes:
+        cut = max_bytes
+        # 回退到字符起始字节（UTF-8后续字节形如10xxxxxx）
+        while cut > 0 and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        if cut == 0:
+            # max_bytes小于一个字符的字节数时整字符切出
+            cut = max_bytes
+            while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+                cut += 1
+        pieces.append(data[:cut].decode("utf-8"))
+        data = data[cut:]
+    pieces.append(data.decode("utf-8"))
+    return pieces
+
+
+def iter_lines(path: str, mmap_threshold: int) -> Iterator[str]:
+    """
+    逐行读取文件，大文件通过mmap读取，内存占用与文件大小无关
+
+    Args:
+        path: 文件路径
+        mmap_threshold: 超过该字节数的文件使用mmap
+
+    Yields:
+        去掉行尾换行符的文本行
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+    if size < mmap_threshold:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                yield line.rstrip("\r\n")
+        return
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        for line in iter(mapped.readline, b""):
+            yield line.decode("utf-8", errors="replace").rstrip("\r\n")
+
+
+class KnowledgeIngester:
+    """
+    知识库目录导入器
+
+    - 每个文件按格式切成若干条知识记录（Markdown按一、二级标题，TXT按空行分段，JSONL每行一条），
+      超过最大字节数的记录（包括JSONL记录）拆分为多条
+    - 以文件内容哈希判断是否变化，未变化的文件直接跳过；变化或删除的文件会先删除其旧文档
+    - 每导入一批记录就提交事务并写入检查点，中断后重新运行会从断点继续；检查点落后于数据库时
+      （提交后、写清单前中断），按文档 meta_data 中的 (source, record) 跳过已提交的记录
+    """
+
+    def __init__(self, root: Optional[str] = None, batch_size: Optional[int] = None):
+        """
+        Args:
+            root: 知识库目录（默认为配置的KNOWLEDGE_BASE_DIR）
+            batch_size: 每批导入的记录数
+        """
+        self.root = os.path.abspath(root or settings.KNOWLEDGE_BASE_DIR)
+        self.batch_size = batch_size or settings.KNOWLEDGE_INGEST_BATCH_SIZE
+        self.mmap_threshold = settings.KNOWLEDGE_INGEST_MMAP_THRESHOLD_MB * 1024 * 1024
+        self.max_doc_bytes = min(settings.KNOWLEDGE_INGEST_MAX_DOC_BYTES, _TEXT_COLUMN_BYTES)
+        self.manifest_path = os.path.join(self.root, MANIFEST_NAME)
+        self.manifest = self._load_manifest()
+
+    def iter_files(self) -> Iterator[str]:
+        """按固定顺序遍历目录下支持的文件，返回相对路径"""
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = sorted(name for name in dirnames if not name.startswith("."))
+            for filename in sorted(filenames):
+                if filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                    yield os.path.relpath(os.path.join(dirpath, filename), self.root)
+
+    def iter_records(self, rel_path: str) -> Iterator[Dict]:
+        """
+        将文件解析为知识记录
+
+        Args:
+            rel_path: 相对知识库目录的文件路径
+
+        Yields:
+            {"title", "content", "category", "position_category"}
+        """
+        path = os.path.join(self.root, rel_path)
+        parts = rel_path.replace("\\", "/").split("/")
+        # 一级子目录名作为岗位类别，文件名作为默认分类
+        defaults = {
+            "position_category": parts[0] if len(parts) > 1 else None,
+            "category": os.path.splitext(parts[-1])[0]
+        }
+        lines = iter_lines(path, self.mmap_threshold)
+        extension = os.path.splitext(path)[1].lower()
+
+        if extension == ".jsonl":
+            records = self._parse_jsonl(lines, rel_path)
+        elif extension in (".md", ".markdown"):
+            records = self._parse_sections(lines, defaults["category"], heading=True)
+        else:
+            records = self._parse_sections(lines, defaults["category"], heading=False)
+
+        for record in records:
+            content = (record.get("content") or "").strip()
+            if not content:
+                continue
+            title = record.get("title") or defaults["category"]
+            parts = [{"title": title, "content": content}]
+            if len(content.encode("utf-8")) > self.max_doc_bytes:
+                # JSONL记录没有经过分段，超长时按同样的规则拆分
+                parts = self._parse_sections(iter(content.split("\n")), title, heading=False)
+            for part in parts:
+                yield {
+                    "title": part["title"][:200],
+                    "content": part["content"],
+                    "category": record.get("category") or defaults["category"],
+                    "position_category": record.get("position_category") or defaults["position_category"]
+                }
+
+    def run(self, db: Session, rag=None) -> Dict:
+        """
+        导入目录中新增或变化的文件
+
+        Args:
+            db: 数据库会话
+            rag: RAGService实例（为空时新建，并等待embedding模型加载完成）
+
+        Returns:
+            导入统计
+        """
+        if rag is None:
+            from app.services.rag_service import RAGService
+            rag = RAGService(wait_for_model=True)
+
+        start = time.perf_counter()
+        stats = {"files": 0, "skipped": 0, "ingested": 0, "removed": 0, "documents": 0, "chunks": 0}
+        files = self.manifest["files"]
+        seen = set()
+
+        for rel_path in self.iter_files():
+            seen.add(rel_path)
+            stats["files"] += 1
+            sha256 = file_sha256(os.path.join(self.root, rel_path))
+            entry = files.get(rel_path)
+
+            if entry and entry["sha256"] == sha256 and entry.get("completed"):
+                stats["skipped"] += 1
+                continue
+
+            resumed = entry is not None and entry["sha256"] == sha256
+            if entry and entry["sha256"] != sha256:
+                # 文件内容变化：删除旧版本导入的文档后重新导入
+                self._delete_documents(db, rag, self._file_doc_ids(db, rel_path, entry))
+                entry = None
+            if entry is None:
+                entry = {"sha256": sha256, "doc_ids": [], "records_done": 0, "completed": False}
+                files[rel_path] = entry
+                self._save_manifest()
+
+            documents, chunks = self._ingest_file(db, rag, rel_path, entry, resumed)
+            stats["ingested"] += 1
+            stats["documents"] += documents
+            stats["chunks"] += chunks
+
+        for rel_path in [path for path in files if path not in seen]:
+            self._delete_documents(db, rag, self._file_doc_ids(db, rel_path, files.pop(rel_path)))
+            self._save_manifest()
+            stats["removed"] += 1
+
+        stats["elapsed_seconds"] = round(time.perf_counter() - start, 2)
+        print(f"知识库目录导入完成: {stats}")
+        return stats
+
+    def _ingest_file(self, db: Session, rag, rel_path: str, entry: Dict, resumed: bool = False):
+        """
+        导入单个文件，跳过检查点之前已提交的记录
+
+        Args:
+            resumed: 是否为上次中断的导入，是时额外查询数据库中已提交的记录
+        """
+        committed = {}
+        if resumed:
+            committed = self._committed_records(db, rel_path, entry["sha256"])
+            known = set(entry["doc_ids"])
+            entry["doc_ids"].extend(doc_id for doc_id in committed.values() if doc_id not in known)
+
+        documents, chunks = 0, 0
+        batch = []
+        for record_index, record in enumerate(self.iter_records(rel_path)):
+            if record_index < entry["records_done"] or record_index in committed:
+                continue
+            batch.append((record_index, record))
+            if len(batch) >= self.batch_size:
+                chunks += self._ingest_batch(db, rag, rel_path, entry, batch)
+                documents += len(batch)
+                batch = []
+        if batch:
+            chunks += self._ingest_batch(db, rag, rel_path, entry, batch)
+            documents += len(batch)
+
+        entry["completed"] = True
+        self._save_manifest()
+        return documents, chunks
+
+    def _ingest_batch(self, db: Session, rag, rel_path: str, entry: Dict, batch: List) -> int:
+        """写入一批 (记录序号, 记录)：批量生成文档向量和段落向量，提交后更新检查点"""
+        embeddings = rag.get_embeddings([record["content"] for _, record in batch])
+        docs = []
+        for (record_index, record), embedding in zip(batch, embeddings):
+            doc = KnowledgeBase(
+                title=record["title"],
+                content=record["content"],
+                category=record["category"],
+                position_category=record["position_category"],
+                embedding_vector=json.dumps(embedding.tolist()),
+                meta_data={"source": rel_path, "sha256": entry["sha256"], "record": record_index}
+            )
+            db.add(doc)
+            docs.append(doc)
+        db.flush()
+
+        try:
+            chunks = rag.index_documents(docs, db, commit=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        entry["doc_ids"].extend(doc.id for doc in docs)
+        entry["records_done"] = batch[-1][0] + 1
+        self._save_manifest()
+        return chunks
+
+    @staticmethod
+    def _source_documents(db: Session, rel_path: str):
+        """按 meta_data.source 查询某个文件导入的文档（无索引，只在中断恢复和删除时调用）"""
+        return db.query(KnowledgeBase.id, KnowledgeBase.meta_data).filter(
+            KnowledgeBase.meta_data["source"].as_string() == rel_path
+        ).all()
+
+    def _committed_records(self, db: Session, rel_path: str, sha256: str) -> Dict[int, int]:
+        """数据库中某个文件版本已提交的记录 {记录序号: 文档id}"""
+        return {
+            row.meta_data["record"]: row.id
+            for row in self._source_documents(db, rel_path)
+            if row.meta_data.get("sha256") == sha256 and isinstance(row.meta_data.get("record"), int)
+        }
+
+    def _file_doc_ids(self, db: Session, rel_path: str, entry: Dict) -> List[int]:
+        """某个文件导入的全部文档id：清单记录的id加上检查点之后已提交的文档"""
+        doc_ids = set(entry["doc_ids"])
+        doc_ids.update(row.id for row in self._source_documents(db, rel_path))
+        return sorted(doc_ids)
+
+    def _delete_documents(self, db: Session, rag, doc_ids: List[int]):
+        """删除某个文件此前导入的文档"""
+        if not doc_ids:
+            return
+        for doc in db.query(KnowledgeBase).filter(KnowledgeBase.id.in_(doc_ids)).all():
+            rag.delete_document(doc, db, commit=False)
+        db.commit()
+
+    def _parse_jsonl(self, lines: Iterator[str], rel_path: str) -> Iterator[Dict]:
+        """JSONL：每行一个JSON对象，content字段必填"""
+        for line_no, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"跳过无效的JSONL行 {rel_path}:{line_no}: {e}")
+                continue
+            if isinstance(record, dict):
+                yield record
+
+    def _parse_sections(self, lines: Iterator[str], default_title: str, heading: bool) -> Iterator[Dict]:
+        """
+        Markdown按一、二级标题切分，TXT按空行分段后合并；单条记录不超过最大字节数，
+        超过一半后在段落边界（空行）处拆分，放不下下一行时在行边界处拆分，单行超长时按字节切断
+
+        Args:
+            lines: 文本行
+            default_title: 没有标题时使用的标题
+            heading: 是否按Markdown标题切分
+        """
+        title = default_title
+        buffer, size, part = [], 0, 0
+
+        def flush():
+            nonlocal part
+            part += 1
+            text = "\n".join(buffer).strip()
+            return {"title": title if part == 1 else f"{title}（{part}）", "content": text}
+
+        for line in lines:
+            stripped = line.strip()
+            if heading and (stripped.startswith("# ") or stripped.startswith("## ")):
+                if buffer:
+                    yield flush()
+                title = stripped.lstrip("#").strip() or default_title
+                buffer, size, part = [], 0, 0
+                continue
+
+            # 大小按UTF-8字节计，保证写入TEXT字段时不会超长
+            line_size = len(line.encode("utf-8")) + 1
+            if buffer and (size + line_size > self.max_doc_bytes or (not stripped and size >= self.max_doc_bytes // 2)):
+                yield flush()
+                buffer, size = [], 0
+                if not stripped:
+                    continue
+            if line_size > self.max_doc_bytes:
+                pieces = split_utf8(line, self.max_doc_bytes - 1)
+                for piece in pieces[:-1]:
+                    buffer = [piece]
+                    yield flush()
+                buffer, size = [pieces[-1]], len(pieces[-1].encode("utf-8")) + 1
+                continue
+            buffer.append(line)
+            size += line_size
+
+        if buffer:
+            yield flush()
+
+    def _load_manifest(self) -> Dict:
+        """读取导入清单（记录每个文件的哈希、文档id和检查点）"""
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+                if isinstance(manifest.get("files"), dict):
+                    return manifest
+            except (OSError, ValueError) as e:
+                print(f"读取导入清单失败，将重新导入: {e}")
+        return {"files": {}}
+
+    def _save_manifest(self):
+        """原子写入导入清单"""
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+
+if __name__ == "__main__":
+    from app.database.connection import SessionLocal
+
+    session = SessionLocal()
+    try:
+        KnowledgeIngester(sys.argv[1] if len(sys.argv) > 1 else None).run(session)
+    finally:
+        session.close()
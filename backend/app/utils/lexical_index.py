@@ -0,0 +1,229 @@
+"""
+词法检索工具：基于二元组的BM25倒排索引，以及多路检索结果的倒数排名融合
+"""
+import math
+import numpy as np
+from array import array
+from collections import Counter
+from typing import Dict, Hashable, List, Optional, Tuple
+from app.utils.text_features import bigram_tokens
+
+
+class BM25Index:
+    """BM25倒排索引（中文按相邻二字切分，英文按整词）"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+        """
+        self.k1 = k1
+        self.b = b
+        self.ids = []
+        self._postings = {}  # 词 -> (行号数组, 词频数组)
+        self._idf = {}
+        self._doc_lengths = np.zeros(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def build(self, ids: List[Hashable], texts: List[str]):
+        """
+        构建索引
+
+        Args:
+            ids: 文本id
+            texts: 文本内容
+        """
+        postings = {}
+        lengths = []
+        for row, text in enumerate(texts):
+            counts = Counter(bigram_tokens(text))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(row)
+                postings[term][1].append(tf)
+
+        total = len(texts)
+        self.ids = list(ids)
+        self._doc_lengths = np.asarray(lengths, dtype=np.float32)
+        self._postings = {
+            term: (np.asarray(rows, dtype=np.int64), np.asarray(tfs, dtype=np.float32))
+            for term, (rows, tfs) in postings.items()
+        }
+        self._idf = {
+            term: math.log(1 + (total - len(rows) + 0.5) / (len(rows) + 0.5))
+            for term, (rows, _) in postings.items()
+        }
+
+    def search(self, query: str, top_k: int) -> List[Tuple[Hashable, float]]:
+        """
+        检索与查询最相关的文本
+
+        Args:
+            query: 查询文本
+            top_k: 返回数量
+
+        Returns:
+            [(id, BM25分数), ...]，按分数降序
+        """
+        if not self.ids or top_k <= 0:
+            return []
+        avg_length = float(self._doc_lengths.mean()) or 1.0
+        norms = self.k1 * (1 - self.b + self.b * self._doc_lengths / avg_length)
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(bigram_tokens(query)):
+            if term not in self._postings:
+                continue
+            rows, tfs = self._postings[term]
+            scores[rows] += self._idf[term] * tfs * (self.k1 + 1) / (tfs + norms[rows])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) == 0:
+            return []
+        k = min(top_k, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.ids[row], float(scores[row])) for row in top]
+
+
+class IncrementalBM25Index:
+    """
+    支持逐条追加的BM25倒排索引（切分方式同 BM25Index）
+
+    - 倒排表用 array 存储，追加时不重建；检索时通过 np.frombuffer 零拷贝转成numpy数组计算分数
+    - idf 和平均文档长度在检索时按当前文档数计算，追加文档后立即生效
+    - 非线程安全，由调用方加锁
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+        """
+        self.k1 = k1
+        self.b = b
+        self.ids = []
+        self.groups = array("i")  # 每个文档的分组编号（如所属会话），用于检索时过滤
+        self._postings = {}  # 词 -> (行号array, 词频array)
+        self._doc_lengths = array("f")
+        self._total_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, doc_id: Hashable, text: str, group: int = 0):
+        """
+        追加一个文档
+
+        Args:
+            doc_id: 文档id
+            text: 文档内容
+            group: 分组编号
+        """
+        self.add_many([doc_id], [text], [group])
+
+    def add_many(self, ids: List[Hashable], texts: List[str], groups: List[int]):
+        """
+        批量追加文档：词频统计用numpy排序完成，每个词的倒排表每批只扩展一次
+
+        Args:
+            ids: 文档id
+            texts: 文档内容
+            groups: 分组编号
+        """
+        count = len(texts)
+        if not count:
+            return
+        tokens, lengths = [], []
+        for text in texts:
+            terms = bigram_tokens(text)
+            tokens.extend(terms)
+            lengths.append(len(terms))
+
+        start_row = len(self.ids)
+        self.ids.extend(ids)
+        self.groups.extend(groups)
+        self._doc_lengths.extend(lengths)
+        self._total_length += len(tokens)
+        if not tokens:
+            return
+
+        vocab = {}
+        codes = np.fromiter((vocab.setdefault(term, len(vocab)) for term in tokens), dtype=np.int64, count=len(tokens))
+        rows = np.repeat(np.arange(count, dtype=np.int64), lengths)
+        # (词, 行) 唯一化得到词频，结果按词再按行有序
+        keys, tfs = np.unique(codes * count + rows, return_counts=True)
+        term_codes = keys // count
+        rows = (keys % count + start_row).astype(np.int32)
+        tfs = tfs.astype(np.float32)
+        bounds = np.flatnonzero(np.diff(term_codes)) + 1
+        terms = list(vocab)
+        for begin, end in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(keys)]))):
+            term = terms[term_codes[begin]]
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = (array("i"), array("f"))
+            posting[0].frombytes(rows[begin:end].tobytes())
+            posting[1].frombytes(tfs[begin:end].tobytes())
+
+    def search(self, query: str, top_k: int, group: Optional[int] = None) -> List[Tuple[Hashable, float]]:
+        """
+        检索与查询最相关的文档
+
+        Args:
+            query: 查询文本
+            top_k: 返回数量
+            group: 只返回该分组的文档（为空时不过滤）
+
+        Returns:
+            [(id, BM25分数), ...]，按分数降序（分数相同时新文档在前）
+        """
+        total = len(self.ids)
+        if not total or top_k <= 0:
+            return []
+        doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.float32)
+        avg_length = self._total_length / total or 1.0
+        scores = np.zeros(total, dtype=np.float32)
+        for term in set(bigram_tokens(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            rows = np.frombuffer(posting[0], dtype=np.int32)
+            tfs = np.frombuffer(posting[1], dtype=np.float32)
+            idf = math.log(1 + (total - len(rows) + 0.5) / (len(rows) + 0.5))
+            norms = self.k1 * (1 - self.b + self.b * doc_lengths[rows] / avg_length)
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norms)
+
+        if group is not None:
+            scores[np.frombuffer(self.groups, dtype=np.int32) != group] = 0
+        matched = np.flatnonzero(scores)
+        if len(matched) == 0:
+            return []
+        k = min(top_k, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        # 分数相同时较新的文档（行号大）排在前面
+        top = top[np.lexsort((-top, -scores[top]))]
+        return [(self.ids[row], float(scores[row])) for row in top]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Tuple[Hashable, float]]], top_k: int, k: int = 60) -> List[Tuple[Hashable, float]]:
+    """
+    倒数排名融合：按各路结果中的名次合并，不依赖各路分数的量纲
+
+    Args:
+        rankings: 多路检索结果，每路为按相关度降序的[(id, 分数), ...]
+        top_k: 返回数量
+        k: 平滑常数
+
+    Returns:
+        [(id, 融合分数), ...]，按分数降序
+    """
+    fused: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, (item_id, _) in enumerate(ranking):
+            fused[item_id] = fused.get(item_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
@@ -0,0 +1,86 @@
+"""
+LRU缓存工具：线程安全的有界缓存，带命中率统计
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable
+
+
+class LRUCache:
+    """线程安全的LRU缓存"""
+
+    def __init__(self, max_size: int = 1024):
+        """
+        初始化缓存
+
+        Args:
+            max_size: 最大条目数，超过后淘汰最久未使用的条目
+        """
+        self.max_size = max(1, max_size)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存，命中时将条目移到最近使用位置"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """批量读取缓存，只返回命中的条目"""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    found[key] = self._data[key]
+                else:
+                    self.misses += 1
+        return found
+
+    def put(self, key: Hashable, value: Any):
+        """写入缓存"""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """删除并返回条目"""
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+    def items(self):
+        """返回当前条目快照（从最久未使用到最近使用）"""
+        with self._lock:
+            return list(self._data.items())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def stats(self) -> Dict:
+        """返回命中统计"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
@@ -0,0 +1,123 @@
+"""
+文本分块工具：将知识库文档切分为带字符偏移的段落，用于段落级检索
+"""
+import re
+from typing import List, Dict, Tuple
+from app.utils.token_counter import estimate_tokens
+
+# 句子边界：中英文句末标点（可带右引号/右括号）、换行或文本结尾
+_SENTENCE_PATTERN = re.compile(
+    r'.+?(?:[。！？!?；;…]+[”’"\'」』）)]*|\.(?=\s)|\n|$)',
+    re.S
+)
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """
+    按中英文标点切分句子
+
+    Args:
+        text: 输入文本
+
+    Returns:
+        句子在原文中的(起始偏移, 结束偏移)列表，已去除首尾空白
+    """
+    spans = []
+    for match in _SENTENCE_PATTERN.finditer(text):
+        start, end = match.start(), match.end()
+        # 去除首尾空白，保证偏移指向实际内容
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            spans.append((start, end))
+    return spans
+
+
+class TextChunker:
+    """文本分块器：句子感知、滑动窗口重叠、按token长度限制"""
+
+    def __init__(self, max_tokens: int = 256, overlap_tokens: int = 48):
+        """
+        初始化分块器
+
+        Args:
+            max_tokens: 每个分块的最大token数
+            overlap_tokens: 相邻分块之间的重叠token数
+        """
+        if max_tokens <= 0:
+            raise ValueError("max_tokens必须大于0")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+
+    def chunk(self, text: str) -> List[Dict]:
+        """
+        将文本切分为重叠的段落
+
+        Args:
+            text: 文档全文
+
+        Returns:
+            分块列表：[{"chunk_index", "content", "start_offset", "end_offset", "token_count"}, ...]
+        """
+        if not text or not text.strip():
+            return []
+
+        # 句子切分，超长句子按token上限再切
+        sentences = []
+        for start, end in split_sentences(text):
+            for piece in self._split_long_sentence(text, start, end):
+                sentences.append((piece[0], piece[1], estimate_tokens(text[piece[0]:piece[1]])))
+
+        chunks = []
+        i = 0
+        while i < len(sentences):
+            # 从第i句开始尽量填满窗口
+            j = i
+            tokens = 0
+            while j < len(sentences) and (j == i or tokens + sentences[j][2] <= self.max_tokens):
+                tokens += sentences[j][2]
+                j += 1
+
+            start_offset = sentences[i][0]
+            end_offset = sentences[j - 1][1]
+            chunks.append({
+                "chunk_index": len(chunks),
+                "content": text[start_offset:end_offset],
+                "start_offset": start_offset,
+                "end_offset": end_offset,
+                "token_count": tokens
+            })
+
+            if j >= len(sentences):
+                break
+
+            # 下一个窗口回退若干句作为重叠，但至少前进一句
+            next_i = j
+            overlap = 0
+            while next_i - 1 > i and overlap + sentences[next_i - 1][2] <= self.overlap_tokens:
+                overlap += sentences[next_i - 1][2]
+                next_i -= 1
+            i = next_i
+
+        return chunks
+
+    def _split_long_sentence(self, text: str, start: int, end: int) -> List[Tuple[int, int]]:
+        """将超过token上限的句子按字符硬切分"""
+        if estimate_tokens(text[start:end]) <= self.max_tokens:
+            return [(start, end)]
+
+        pieces = []
+        piece_start = start
+        tokens = 0
+        for pos in range(start, end):
+            char_tokens = estimate_tokens(text[pos])
+            if tokens + char_tokens > self.max_tokens and pos > piece_start:
+                pieces.append((piece_start, pos))
+                piece_start = pos
+                tokens = 0
+            tokens += char_tokens
+        if piece_start < end:
+            pieces.append((piece_start, end))
+        return pieces
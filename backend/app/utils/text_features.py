@@ -0,0 +1,43 @@
+"""
+文本特征工具：字符n-gram切分与相似度计算（适用于中文等无空格分词的文本）
+"""
+import re
+from typing import Set, List
+
+# 中文逐字切分，英文/数字按整词保留
+_TOKEN_PATTERN = re.compile(r'[\u4e00-\u9fff\u3400-\u4dbf]|[A-Za-z0-9_]+')
+
+
+def text_units(text: str) -> List[str]:
+    """将文本切分为基本单元：单个汉字或完整的英文单词（小写）"""
+    return [unit.lower() for unit in _TOKEN_PATTERN.findall(text or "")]
+
+
+def bigram_tokens(text: str) -> List[str]:
+    """
+    将文本切分为二元组序列（保留重复，用于词频统计）
+
+    汉字取相邻两字组成二元组，英文单词整体作为一个单元；只有一个单元时返回该单元本身
+
+    Args:
+        text: 输入文本
+
+    Returns:
+        二元组列表
+    """
+    units = text_units(text)
+    if len(units) == 1:
+        return units
+    return [units[i] + units[i + 1] for i in range(len(units) - 1)]
+
+
+def char_bigrams(text: str) -> Set[str]:
+    """提取文本的二元组集合"""
+    return set(bigram_tokens(text))
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    """计算两个集合的Jaccard相似度"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
@@ -0,0 +1,158 @@
+"""
+Token计数工具：估算文本的token数量，用于分块和提示词长度控制
+"""
+import json
+import re
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from app.utils.lru_cache import LRUCache
+
+# 中日韩字符（含全角标点）
+_CJK_PATTERN = re.compile('[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+# 连续的拉丁字母/数字
+_WORD_PATTERN = re.compile('[A-Za-z0-9_]+')
+# 其余非空白符号
+_SYMBOL_PATTERN = re.compile('[^\\sA-Za-z0-9_\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的token数量（近似值，不依赖分词器）
+
+    规则：每个中文字符计1个token，英文单词按每4个字符1个token计，其余符号各计1个token
+
+    Args:
+        text: 输入文本
+
+    Returns:
+        估算的token数
+    """
+    return sum(token_features(text))
+
+
+def token_features(text: str) -> List[int]:
+    """
+    统计估算token数用到的三类计数
+
+    Returns:
+        [中文字符数, 英文单词按每4字符计的单元数, 其余符号数]
+    """
+    if not text:
+        return [0, 0, 0]
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    word_tokens = sum((len(word) + 3) // 4 for word in _WORD_PATTERN.findall(text))
+    symbol_count = len(_SYMBOL_PATTERN.findall(text))
+    return [cjk_count, word_tokens, symbol_count]
+
+
+def fit_calibration(texts: List[str], token_counts: List[int]) -> Dict[str, float]:
+    """
+    用真实分词器的计数拟合三类计数的系数（非负最小二乘的近似：负系数截断为0后重新拟合）
+
+    Args:
+        texts: 样本文本
+        token_counts: 分词器对每个样本的token数
+
+    Returns:
+        {"cjk": 系数, "word": 系数, "symbol": 系数}
+    """
+    names = ["cjk", "word", "symbol"]
+    features = np.asarray([token_features(text) for text in texts], dtype=np.float64)
+    targets = np.asarray(token_counts, dtype=np.float64)
+    active = list(range(len(names)))
+    coefficients = np.zeros(len(names))
+    while active:
+        solution, *_ = np.linalg.lstsq(features[:, active], targets, rcond=None)
+        if (solution >= 0).all():
+            coefficients[active] = solution
+            break
+        active = [column for column, value in zip(active, solution) if value > 0]
+    return {name: round(float(value), 4) for name, value in zip(names, coefficients)}
+
+
+class TokenCounter:
+    """
+    提示词token计数
+
+    - 配置了本地分词器目录（如Qwen的tokenizer.json所在目录）时用分词器精确计数，首次使用时加载
+    - 否则按 token_features 的三类计数加权估算，权重可由 fit_calibration 针对目标模型拟合；
+      未校准时权重均为1，与 estimate_tokens 相同（对中文偏保守，宁可少放历史也不超出上下文）
+    - 相同文本的计数结果缓存，历史消息每轮只需计数一次
+    """
+
+    # 对话模板中每条消息的额外token（角色标记、起止符和换行）
+    MESSAGE_OVERHEAD = 4
+
+    def __init__(self, tokenizer_path: Optional[str] = None, calibration_path: Optional[str] = None,
+                 cache_size: int = 4096):
+        """
+        Args:
+            tokenizer_path: 本地分词器目录
+            calibration_path: fit_calibration 结果的JSON文件
+            cache_size: 计数结果缓存条数
+        """
+        self.tokenizer_path = tokenizer_path
+        self.weights = {"cjk": 1.0, "word": 1.0, "symbol": 1.0}
+        if calibration_path:
+            try:
+                with open(calibration_path, "r", encoding="utf-8") as f:
+                    self.weights.update({key: float(value) for key, value in json.load(f).items() if key in self.weights})
+            except (OSError, ValueError, AttributeError) as e:
+                print(f"加载token估算校准文件失败，使用默认权重: {e}")
+        self._tokenizer = None
+        self._tokenizer_failed = tokenizer_path is None
+        self._lock = threading.Lock()
+        self._cache = LRUCache(cache_size)
+
+    @property
+    def backend(self) -> str:
+        """当前使用的计数方式：tokenizer 或 estimate"""
+        return "tokenizer" if self._get_tokenizer() is not None else "estimate"
+
+    def count(self, text: str) -> int:
+        """
+        计算文本的token数
+
+        Args:
+            text: 文本
+
+        Returns:
+            token数
+        """
+        if not text:
+            return 0
+        cached = self._cache.get(text)
+        if cached is not None:
+            return cached
+        tokenizer = self._get_tokenizer()
+        if tokenizer is not None:
+            tokens = len(tokenizer.encode(text, add_special_tokens=False))
+        else:
+            cjk_count, word_tokens, symbol_count = token_features(text)
+            tokens = int(round(
+                cjk_count * self.weights["cjk"]
+                + word_tokens * self.weights["word"]
+                + symbol_count * self.weights["symbol"]
+            ))
+        self._cache.put(text, tokens)
+        return tokens
+
+    def count_message(self, message: Dict) -> int:
+        """计算一条对话消息（含模板开销）的token数"""
+        return self.count(message["content"]) + self.MESSAGE_OVERHEAD
+
+    def _get_tokenizer(self):
+        """懒加载分词器，加载失败后不再重试"""
+        if self._tokenizer is not None or self._tokenizer_failed:
+            return self._tokenizer
+        with self._lock:
+            if self._tokenizer is None and not self._tokenizer_failed:
+                try:
+                    from transformers import AutoTokenizer
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_path, trust_remote_code=True)
+                    print(f"已加载分词器: {self.tokenizer_path}")
+                except Exception as e:
+                    self._tokenizer_failed = True
+                    print(f"加载分词器失败，使用估算计数: {e}")
+        return self._tokenizer
@@ -0,0 +1,162 @@
+"""
+意图识别Benchmark：对比原关键词逐个扫描实现与 Aho–Corasick 意图引擎在长消息上的耗时和结果一致性
+
+用法（在backend目录下运行）：
+    python -m training.intent_benchmark --lengths 200 2000 20000 --messages 200 --output intent_results.json
+    python -m training.intent_benchmark --lengths 20 50 100 200 400 --short-message-chars 0   # 只测自动机，确定短消息阈值
+    python -m training.intent_benchmark --extra-keywords 500
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import numpy as np
+from typing import Callable, Dict, List, Optional
+from app.utils.intent_matcher import DEFAULT_INTENT, DEFAULT_INTENT_KEYWORDS, SHORT_MESSAGE_CHARS, IntentEngine
+
+# 生成填充文本用的常见汉字（不含关键词中的字）
+_FILLER_CHARS = "的一是在不了有和人这中大为国我以要他时来们生到作地于出就分对成会可主发年动同工也下过子说产种而方后多行"
+
+
+def legacy_detect_intent(message: str, keyword_table: Optional[Dict[str, Dict[str, float]]] = None) -> str:
+    """原 ChatService._detect_intent 的实现：按意图顺序逐个关键词做子串查找，返回第一个命中的意图"""
+    message_lower = message.lower()
+    for intent, keywords in (keyword_table or DEFAULT_INTENT_KEYWORDS).items():
+        if any(word in message_lower for word in keywords):
+            return intent
+    return DEFAULT_INTENT
+
+
+def expand_keyword_table(extra: int, seed: int = 42) -> Dict[str, Dict[str, float]]:
+    """在默认关键词表上为每个意图补充随机关键词，评估关键词规模对耗时的影响"""
+    rng = random.Random(seed)
+    table = {intent: dict(keywords) for intent, keywords in DEFAULT_INTENT_KEYWORDS.items()}
+    intents = list(table)
+    for i in range(extra):
+        # 用生僻字区段生成关键词，避免与填充文本重叠
+        keyword = "".join(chr(rng.randint(0x4e00 + 0x3000, 0x4e00 + 0x4000)) for _ in range(rng.randint(2, 4)))
+        table[intents[i % len(intents)]][keyword] = 1.0
+    return table
+
+
+def generate_messages(count: int, length: int, keyword_table: Dict[str, Dict[str, float]], seed: int = 42) -> List[str]:
+    """
+    生成指定长度的消息：约四分之一不含关键词（原实现需扫描全部关键词的最坏情况），其余在随机位置插入1~3个关键词
+
+    Args:
+        count: 消息数
+        length: 每条消息的字符数
+        keyword_table: 关键词表
+        seed: 随机种子
+    """
+    rng = random.Random(seed + length)
+    keywords = [keyword for words in keyword_table.values() for keyword in words]
+    messages = []
+    for i in range(count):
+        chars = [rng.choice(_FILLER_CHARS) for _ in range(length)]
+        if i % 4:
+            for _ in range(rng.randint(1, 3)):
+                keyword = rng.choice(keywords)
+                position = rng.randint(0, max(0, length - len(keyword)))
+                chars[position:position + len(keyword)] = keyword
+        messages.append("".join(chars[:length]))
+    return messages
+
+
+def percentile(values: List[float], q: float) -> float:
+    return round(float(np.percentile(values, q)), 3) if values else 0.0
+
+
+def time_calls(func: Callable[[str], object], messages: List[str], repeat: int) -> Dict:
+    """逐条计时，返回每条消息的耗时分布（微秒）"""
+    latencies = []
+    for _ in range(repeat):
+        for message in messages:
+            start = time.perf_counter()
+            func(message)
+            latencies.append((time.perf_counter() - start) * 1e6)
+    return {
+        "mean_us": round(float(np.mean(latencies)), 3),
+        "p50_us": percentile(latencies, 50),
+        "p95_us": percentile(latencies, 95),
+        "p99_us": percentile(latencies, 99)
+    }
+
+
+def run_case(length: int, count: int, repeat: int, keyword_table: Dict[str, Dict[str, float]], seed: int,
+             short_message_chars: int = SHORT_MESSAGE_CHARS) -> Dict:
+    """评估一种消息长度"""
+    messages = generate_messages(count, length, keyword_table, seed=seed)
+    build_start = time.perf_counter()
+    engine = IntentEngine(keyword_table, short_message_chars=short_message_chars)
+    build_ms = (time.perf_counter() - build_start) * 1000
+
+    legacy = [legacy_detect_intent(message, keyword_table) for message in messages]
+    detected = [engine.detect(message) for message in messages]
+    primary_agree = sum(1 for old, new in zip(legacy, detected) if old == new["intent"])
+    # 原实现返回的意图应出现在新引擎的多标签结果中
+    covered = sum(
+        1 for old, new in zip(legacy, detected)
+        if old == new["intent"] or old in {item["intent"] for item in new["intents"]}
+    )
+    multi_label = sum(1 for new in detected if len(new["intents"]) > 1)
+
+    legacy_timing = time_calls(lambda message: legacy_detect_intent(message, keyword_table), messages, repeat)
+    engine_timing = time_calls(engine.detect, messages, repeat)
+    return {
+        "length": length,
+        "messages": count,
+        "engine_path": "substring" if length <= engine.short_message_chars else "automaton",
+        "keywords": sum(len(words) for words in keyword_table.values()),
+        "engine_build_ms": round(build_ms, 3),
+        "legacy": legacy_timing,
+        "engine": engine_timing,
+        "speedup_mean": round(legacy_timing["mean_us"] / engine_timing["mean_us"], 3) if engine_timing["mean_us"] else None,
+        "primary_agreement": round(primary_agree / count, 4),
+        "legacy_intent_covered": round(covered / count, 4),
+        "multi_label_rate": round(multi_label / count, 4)
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="意图识别Benchmark")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[50, 500, 5000, 20000], help="消息长度（字符数）")
+    parser.add_argument("--messages", type=int, default=200, help="每种长度的消息数")
+    parser.add_argument("--repeat", type=int, default=3, help="重复计时次数")
+    parser.add_argument("--extra-keywords", type=int, default=0, help="在默认关键词表上补充的随机关键词数")
+    parser.add_argument("--short-message-chars", type=int, default=SHORT_MESSAGE_CHARS,
+                        help="引擎对不超过该长度的消息使用原实现的子串查找（0表示始终使用自动机）")
+    parser.add_argument("--output", help="结果JSON路径（不指定时只打印）")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    keyword_table = expand_keyword_table(args.extra_keywords, seed=args.seed) if args.extra_keywords else DEFAULT_INTENT_KEYWORDS
+    results = []
+    for length in args.lengths:
+        result = run_case(length, args.messages, args.repeat, keyword_table, args.seed, args.short_message_chars)
+        results.append(result)
+        print(
+            f"长度 {length:>6}: 原实现 {result['legacy']['mean_us']:>10.1f}us  "
+            f"引擎({result['engine_path']}) {result['engine']['mean_us']:>10.1f}us  加速 {result['speedup_mean']}x  "
+            f"主意图一致 {result['primary_agreement']:.2%}  多标签 {result['multi_label_rate']:.2%}"
+        )
+
+    if not args.output:
+        return 0
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "keywords": sum(len(words) for words in keyword_table.values()),
+            "seed": args.seed
+        },
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,460 @@
+"""
+检索Benchmark：评估RAG检索在不同检索方式和语料规模下的召回质量与延迟
+
+用法（在backend目录下运行）：
+    python -m training.retrieval_benchmark --sizes 1000 10000 --queries 200 --output retrieval_results.json
+    python -m training.retrieval_benchmark --corpus ../data/knowledge_base --baseline last_release.json
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import zlib
+import numpy as np
+from typing import Dict, List, Optional
+from app.config import settings
+from app.services.reranker import CrossEncoderReranker
+from app.services.vector_index import VectorIndex, normalize_rows
+from app.utils.lexical_index import BM25Index, reciprocal_rank_fusion
+from app.utils.text_chunker import TextChunker, split_sentences
+from app.utils.text_features import bigram_tokens, text_units
+
+MODES = ("brute", "ann_int8", "ann_binary", "hybrid", "reranked")
+RECALL_KS = (1, 5, 10)
+
+# 合成语料时每个主题的词汇量
+_TOPIC_VOCABULARY = 40
+
+
+class HashingEncoder:
+    """确定性的二元组哈希编码器：没有embedding模型时使用，保证benchmark可离线运行、结果可复现"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def encode(self, texts, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        texts = [texts] if single else texts
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in bigram_tokens(text):
+                code = zlib.crc32(token.encode("utf-8"))
+                vectors[row, code % self.dim] += 1.0 if code & 0x80000000 else -1.0
+        vectors = normalize_rows(vectors)
+        return vectors[0] if single else vectors
+
+
+def load_encoder(name: str):
+    """
+    获取编码器
+
+    Args:
+        name: model（使用配置的embedding模型，加载失败时退回哈希编码）或 hashing
+
+    Returns:
+        (编码器, 编码器名称)
+    """
+    if name == "model":
+        from app.services.embedding_model import embedding_model_loader
+        model = embedding_model_loader.get_model(wait=None)
+        if model is not None:
+            return model, settings.EMBEDDING_MODEL_PATH or settings.EMBEDDING_MODEL
+        print("embedding模型不可用，使用哈希编码器")
+    return HashingEncoder(), "hashing"
+
+
+def synthesize_corpus(size: int, seed: int = 42, start_id: int = 0) -> List[Dict]:
+    """
+    生成合成语料：每篇文档围绕一个主题的词汇组句，主题之间词汇不重叠
+
+    Args:
+        size: 文档数量
+        seed: 随机种子
+        start_id: 文档id起始值
+
+    Returns:
+        [{"id", "title", "content"}, ...]
+    """
+    rng = random.Random(seed)
+
+    def word():
+        return "".join(chr(rng.randint(0x4e00, 0x9fa5)) for _ in range(rng.randint(2, 4)))
+
+    topics = [[word() for _ in range(_TOPIC_VOCABULARY)] for _ in range(max(1, size // 20))]
+    docs = []
+    for i in range(size):
+        vocabulary = topics[rng.randrange(len(topics))]
+        sentences = ["".join(rng.sample(vocabulary, 8)) + "。" for _ in range(rng.randint(4, 12))]
+        docs.append({"id": start_id + i, "title": f"合成文档{start_id + i}", "content": "".join(sentences)})
+    return docs
+
+
+def load_corpus(source: str, limit: Optional[int] = None) -> List[Dict]:
+    """
+    加载评估语料
+
+    Args:
+        source: JSONL文件（每行包含id/title/content）、知识库目录，或 "db" 表示读取knowledge_base表
+        limit: 最多加载的文档数
+
+    Returns:
+        [{"id", "title", "content"}, ...]
+    """
+    docs = []
+    if source == "db":
+        from app.database.connection import SessionLocal
+        from app.models.knowledge_base import KnowledgeBase
+        db = SessionLocal()
+        try:
+            query = db.query(KnowledgeBase.id, KnowledgeBase.title, KnowledgeBase.content).order_by(KnowledgeBase.id)
+            for row in (query.limit(limit) if limit else query):
+                docs.append({"id": row.id, "title": row.title, "content": row.content})
+        finally:
+            db.close()
+    elif os.path.isdir(source):
+        from app.utils.knowledge_ingester import KnowledgeIngester
+        ingester = KnowledgeIngester(source)
+        for rel_path in ingester.iter_files():
+            for record_index, record in enumerate(ingester.iter_records(rel_path)):
+                docs.append({"id": f"{rel_path}#{record_index}", "title": record["title"], "content": record["content"]})
+                if limit and len(docs) >= limit:
+                    return docs
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    docs.append(json.loads(line))
+                    if limit and len(docs) >= limit:
+                        break
+    return docs
+
+
+def generate_queries(docs: List[Dict], count: int, seed: int = 7, drop_rate: float = 0.3) -> List[Dict]:
+    """
+    从文档中抽取句子并随机删减字词作为查询，该文档即为相关文档
+
+    Args:
+        docs: 文档列表
+        count: 查询数量
+        seed: 随机种子
+        drop_rate: 删除字词的比例，模拟用户的不同表述
+
+    Returns:
+        [{"query", "relevant": [文档id]}, ...]
+    """
+    rng = random.Random(seed)
+    queries = []
+    candidates = [doc for doc in docs if doc.get("content")]
+    for _ in range(min(count, len(candidates) * 4)):
+        doc = rng.choice(candidates)
+        spans = split_sentences(doc["content"])
+        start, end = rng.choice(spans)
+        units = text_units(doc["content"][start:end])
+        kept = [unit for unit in units if rng.random() > drop_rate] or units
+        if kept:
+            queries.append({"query": "".join(kept), "relevant": [doc["id"]]})
+    return queries
+
+
+def load_queries(path: str) -> List[Dict]:
+    """加载标注查询（JSONL，每行 {"query": ..., "relevant": [文档id, ...]}）"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values: List[float], q: float) -> float:
+    return round(float(np.percentile(values, q)), 3) if values else 0.0
+
+
+class RetrievalBenchmark:
+    """
+    检索Benchmark
+
+    在同一份分块语料上构建各种检索方式，逐条执行查询并统计：
+    recall@k、MRR、检索延迟的p50/p95/p99和单线程QPS（延迟不含查询编码，编码耗时单独统计）
+    """
+
+    def __init__(self, encoder, top_k: int = 10, rerank_candidates: Optional[int] = None, reranker: Optional[CrossEncoderReranker] = None):
+        """
+        Args:
+            encoder: 具有encode方法的编码器
+            top_k: 每个查询返回的文档数
+            rerank_candidates: 重排的候选文档数
+            reranker: 已加载的重排器（为空时跳过reranked模式）
+        """
+        self.encoder = encoder
+        self.top_k = top_k
+        self.rerank_candidates = rerank_candidates or settings.RERANK_CANDIDATES
+        self.reranker = reranker
+        self.chunker = TextChunker(settings.CHUNK_MAX_TOKENS, settings.CHUNK_OVERLAP_TOKENS)
+        self.indexes = {}
+        self.build_ms = {}
+        self.chunk_texts = []
+        self.chunk_doc_ids = []
+
+    def build(self, docs: List[Dict], batch_size: int = 256):
+        """分块、编码并构建各检索方式的索引"""
+        self.chunk_texts, self.chunk_doc_ids = [], []
+        for doc in docs:
+            for chunk in self.chunker.chunk(doc.get("content") or ""):
+                self.chunk_texts.append(chunk["content"])
+                self.chunk_doc_ids.append(doc["id"])
+
+        vectors = np.vstack([
+            np.asarray(self.encoder.encode(self.chunk_texts[i:i + batch_size], convert_to_numpy=True), dtype=np.float32)
+            for i in range(0, len(self.chunk_texts), batch_size)
+        ])
+        chunk_ids = list(range(len(self.chunk_texts)))
+
+        for mode, quantization in (("brute", "none"), ("ann_int8", "int8"), ("ann_binary", "binary")):
+            start = time.perf_counter()
+            index = VectorIndex(quantization=quantization, rescore_factor=settings.VECTOR_RESCORE_FACTOR,
+                                store_dir=settings.VECTOR_INDEX_DIR, name=f"benchmark_{mode}")
+            index.build(chunk_ids, vectors)
+            self.indexes[mode] = index
+            self.build_ms[mode] = round((time.perf_counter() - start) * 1000, 1)
+
+        start = time.perf_counter()
+        lexical = BM25Index()
+        lexical.build(chunk_ids, self.chunk_texts)
+        self.indexes["lexical"] = lexical
+        self.build_ms["hybrid"] = round((time.perf_counter() - start) * 1000 + self.build_ms["ann_int8"], 1)
+        self.build_ms["reranked"] = self.build_ms["ann_int8"]
+
+    def search(self, mode: str, query: str, query_vector: np.ndarray) -> List:
+        """
+        按指定方式检索，返回按相关度排序的文档id（每个文档只保留最相关的段落）
+
+        Args:
+            mode: 检索方式
+            query: 查询文本
+            query_vector: 查询向量
+
+        Returns:
+            文档id列表
+        """
+        doc_k = self.rerank_candidates if mode == "reranked" else self.top_k
+        chunk_k = doc_k * settings.CHUNK_CANDIDATE_FACTOR
+
+        if mode in ("brute", "ann_int8", "ann_binary"):
+            hits = self.indexes[mode].search(query_vector, chunk_k)
+        elif mode == "hybrid":
+            hits = reciprocal_rank_fusion([
+                self.indexes["ann_int8"].search(query_vector, chunk_k),
+                self.indexes["lexical"].search(query, chunk_k)
+            ], chunk_k)
+        elif mode == "reranked":
+            hits = self.indexes["ann_int8"].search(query_vector, chunk_k)
+        else:
+            raise ValueError(f"不支持的检索方式: {mode}")
+
+        best = {}
+        for chunk_id, _ in hits:
+            doc_id = self.chunk_doc_ids[chunk_id]
+            if doc_id not in best:
+                best[doc_id] = chunk_id
+                if len(best) >= doc_k:
+                    break
+
+        if mode == "reranked":
+            passages = [{"doc_id": doc_id, "chunk_id": chunk_id, "content": self.chunk_texts[chunk_id]} for doc_id, chunk_id in best.items()]
+            reranked = self.reranker.rerank(query, passages, self.top_k)
+            return [passage["doc_id"] for passage in reranked or passages[:self.top_k]]
+        return list(best)
+
+    def evaluate(self, mode: str, queries: List[Dict], query_vectors: np.ndarray, warmup: int = 5) -> Dict:
+        """
+        评估单个检索方式
+
+        Args:
+            mode: 检索方式
+            queries: 标注查询
+            query_vectors: 查询向量矩阵
+            warmup: 不计时的预热查询数
+
+        Returns:
+            指标字典
+        """
+        for item, vector in list(zip(queries, query_vectors))[:warmup]:
+            self.search(mode, item["query"], vector)
+
+        latencies = []
+        recalls = {k: 0.0 for k in RECALL_KS}
+        reciprocal_ranks = 0.0
+        for item, vector in zip(queries, query_vectors):
+            start = time.perf_counter()
+            ranked = self.search(mode, item["query"], vector)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            relevant = set(item["relevant"])
+            for k in RECALL_KS:
+                recalls[k] += len(relevant & set(ranked[:k])) / len(relevant)
+            for rank, doc_id in enumerate(ranked[:self.top_k], 1):
+                if doc_id in relevant:
+                    reciprocal_ranks += 1.0 / rank
+                    break
+
+        total = len(queries)
+        metrics = {f"recall@{k}": round(recalls[k] / total, 4) for k in RECALL_KS}
+        metrics.update({
+            f"mrr@{self.top_k}": round(reciprocal_ranks / total, 4),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "qps": round(total / (sum(latencies) / 1000), 1) if sum(latencies) else 0.0,
+            "build_ms": self.build_ms.get(mode)
+        })
+        index = self.indexes.get("ann_int8" if mode in ("hybrid", "reranked") else mode)
+        if index is not None:
+            metrics["index_bytes"] = index.memory_stats()["resident_bytes"]
+        return metrics
+
+    def run(self, docs: List[Dict], queries: List[Dict], modes: List[str]) -> List[Dict]:
+        """
+        在一份语料上评估多个检索方式
+
+        Args:
+            docs: 语料
+            queries: 标注查询（相关文档需在语料中）
+            modes: 检索方式列表
+
+        Returns:
+            每个检索方式一条结果
+        """
+        self.build(docs)
+        start = time.perf_counter()
+        query_vectors = np.asarray(self.encoder.encode([item["query"] for item in queries], convert_to_numpy=True), dtype=np.float32)
+        encode_ms = (time.perf_counter() - start) * 1000 / max(1, len(queries))
+
+        results = []
+        for mode in modes:
+            if mode == "reranked" and self.reranker is None:
+                print("未加载重排模型，跳过reranked模式")
+                continue
+            metrics = self.evaluate(mode, queries, query_vectors)
+            results.append({
+                "corpus_size": len(docs),
+                "chunks": len(self.chunk_texts),
+                "queries": len(queries),
+                "mode": mode,
+                "encode_ms_per_query": round(encode_ms, 3),
+                **metrics
+            })
+            print(f"[{len(docs)} docs] {mode}: {metrics}")
+        return results
+
+
+def compare_with_baseline(results: List[Dict], baseline: List[Dict], recall_tolerance: float = 0.02, latency_tolerance: float = 0.2) -> List[str]:
+    """
+    与基线结果对比，找出召回下降或延迟上升超过容忍度的项
+
+    Args:
+        results: 本次结果
+        baseline: 基线结果
+        recall_tolerance: 允许的召回率绝对下降
+        latency_tolerance: 允许的p95延迟相对上升
+
+    Returns:
+        回归描述列表
+    """
+    previous = {(item["corpus_size"], item["mode"]): item for item in baseline}
+    regressions = []
+    for item in results:
+        base = previous.get((item["corpus_size"], item["mode"]))
+        if base is None:
+            continue
+        name = f"{item['mode']}@{item['corpus_size']}"
+        for k in RECALL_KS:
+            key = f"recall@{k}"
+            if key in base and item[key] < base[key] - recall_tolerance:
+                regressions.append(f"{name} {key}: {base[key]} -> {item[key]}")
+        if base.get("p95_ms") and item["p95_ms"] > base["p95_ms"] * (1 + latency_tolerance):
+            regressions.append(f"{name} p95_ms: {base['p95_ms']} -> {item['p95_ms']}")
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="RAG检索Benchmark")
+    parser.add_argument("--corpus", help="语料来源：JSONL文件、知识库目录或db；为空时生成合成语料")
+    parser.add_argument("--queries-file", help="标注查询JSONL；为空时从语料自动生成")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="评估的语料规模（不足时用合成文档补齐）")
+    parser.add_argument("--queries", type=int, default=200, help="自动生成的查询数")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--encoder", choices=("model", "hashing"), default="model")
+    parser.add_argument("--output", default="retrieval_benchmark_results.json")
+    parser.add_argument("--baseline", help="基线结果文件，发现回归时返回非0退出码")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    encoder, encoder_name = load_encoder(args.encoder)
+    reranker = None
+    if "reranked" in args.modes:
+        reranker = CrossEncoderReranker()
+        if not reranker.load():
+            reranker = None
+
+    sizes = sorted(args.sizes)
+    corpus = load_corpus(args.corpus, sizes[-1]) if args.corpus else []
+    if len(corpus) < sizes[-1]:
+        corpus += synthesize_corpus(sizes[-1] - len(corpus), seed=args.seed, start_id=len(corpus))
+
+    # 自动生成的查询取自最小规模的语料，保证在每个规模下都有相关文档
+    if args.queries_file:
+        all_queries = load_queries(args.queries_file)
+    else:
+        all_queries = generate_queries(corpus[:sizes[0]], args.queries, seed=args.seed)
+
+    results = []
+    for size in sizes:
+        docs = corpus[:size]
+        doc_ids = {doc["id"] for doc in docs}
+        queries = [item for item in all_queries if set(item["relevant"]) <= doc_ids]
+        if not queries:
+            print(f"语料规模 {size} 下没有可评估的查询，跳过")
+            continue
+        benchmark = RetrievalBenchmark(encoder, top_k=args.top_k, reranker=reranker)
+        results.extend(benchmark.run(docs, queries, args.modes))
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": _git_commit(),
+            "encoder": encoder_name,
+            "top_k": args.top_k,
+            "vector_rescore_factor": settings.VECTOR_RESCORE_FACTOR,
+            "chunk_max_tokens": settings.CHUNK_MAX_TOKENS,
+            "rerank_model": settings.RERANK_MODEL_PATH or settings.RERANK_MODEL if reranker else None,
+            "corpus": args.corpus or "synthetic",
+            "seed": args.seed
+        },
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_with_baseline(results, json.load(f)["results"])
+        if regressions:
+            print("发现性能回归：")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("与基线相比无回归")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Token估算校准：用真实分词器（如Qwen）对样本文本计数，拟合 TokenCounter 估算时三类计数的权重
+
+用法（在backend目录下运行，需要能加载分词器的环境）：
+    python -m training.token_calibration --tokenizer ./models/qwen-tokenizer --texts ../data/knowledge_base --output ./data/token_calibration.json
+    python -m training.token_calibration --tokenizer Qwen/Qwen2-7B-Instruct --from-db 5000
+
+生成的文件通过 TOKEN_CALIBRATION_PATH 配置，供未部署分词器的CPU主机使用
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import numpy as np
+from typing import Dict, List, Optional
+from app.utils.token_counter import estimate_tokens, fit_calibration, token_features
+
+_TEXT_EXTENSIONS = (".md", ".markdown", ".txt", ".jsonl")
+
+
+def load_texts(paths: List[str]) -> List[str]:
+    """读取样本文本：Markdown/TXT按段落切分，JSONL取 content/text/question/answer 字段"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names) if name.endswith(_TEXT_EXTENSIONS))
+        else:
+            files.append(path)
+
+    texts = []
+    for file_path in files:
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+            if file_path.endswith(".jsonl"):
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    texts.extend(
+                        record[key] for key in ("content", "text", "question", "answer")
+                        if isinstance(record.get(key), str) and record[key].strip()
+                    )
+            else:
+                texts.extend(part.strip() for part in f.read().split("\n\n") if part.strip())
+    return texts
+
+
+def load_chat_messages(limit: int) -> List[str]:
+    """从数据库读取最近的对话消息"""
+    from app.database.connection import SessionLocal
+    from app.models.chat import ChatMessage
+
+    db = SessionLocal()
+    try:
+        rows = db.query(ChatMessage.content).order_by(ChatMessage.id.desc()).limit(limit).all()
+        return [row.content for row in rows if row.content]
+    finally:
+        db.close()
+
+
+def relative_error(estimates: List[float], actual: List[int]) -> Dict:
+    """估算值相对真实token数的误差（按总量和逐条）"""
+    estimates = np.asarray(estimates, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    per_text = np.abs(estimates - actual) / np.maximum(actual, 1)
+    return {
+        "total_ratio": round(float(estimates.sum() / max(actual.sum(), 1)), 4),
+        "mean_abs_error": round(float(per_text.mean()), 4),
+        "p95_abs_error": round(float(np.percentile(per_text, 95)), 4),
+        # 低估会让提示词超出预算，单独统计
+        "underestimate_rate": round(float((estimates < actual).mean()), 4)
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Token估算校准")
+    parser.add_argument("--tokenizer", required=True, help="分词器目录或模型名")
+    parser.add_argument("--texts", nargs="*", default=[], help="样本文件或目录（Markdown/TXT/JSONL）")
+    parser.add_argument("--from-db", type=int, default=0, help="额外从数据库读取的最近对话消息数")
+    parser.add_argument("--holdout", type=float, default=0.2, help="用于评估的样本比例")
+    parser.add_argument("--output", default="token_calibration.json")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    texts = load_texts(args.texts)
+    if args.from_db:
+        texts.extend(load_chat_messages(args.from_db))
+    if len(texts) < 10:
+        print("样本文本太少，至少需要10条")
+        return 1
+
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer, trust_remote_code=True)
+    start = time.perf_counter()
+    actual = [len(tokenizer.encode(text, add_special_tokens=False)) for text in texts]
+    print(f"分词器计数 {len(texts)} 条样本，耗时 {time.perf_counter() - start:.1f}s")
+
+    order = list(range(len(texts)))
+    random.Random(args.seed).shuffle(order)
+    split = max(1, int(len(order) * (1 - args.holdout)))
+    train, test = order[:split], order[split:] or order[:split]
+
+    weights = fit_calibration([texts[i] for i in train], [actual[i] for i in train])
+    calibrated = [
+        sum(value * weights[name] for name, value in zip(("cjk", "word", "symbol"), token_features(texts[i])))
+        for i in test
+    ]
+    report = {
+        "weights": weights,
+        "samples": {"train": len(train), "test": len(test)},
+        "uncalibrated": relative_error([estimate_tokens(texts[i]) for i in test], [actual[i] for i in test]),
+        "calibrated": relative_error(calibrated, [actual[i] for i in test])
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(weights, f, ensure_ascii=False, indent=2)
+    print(f"校准权重已写入 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,8 @@
+-- 对话冷存储归档：长期未活跃会话的消息压缩写入按用户划分的归档文件，并从 chat_messages 删除
+-- 归档任务：python -m app.services.chat_archive（需先开启 CHAT_ARCHIVE_ENABLED）
+ALTER TABLE chat_sessions
+    ADD COLUMN archived_at TIMESTAMP NULL COMMENT '消息归档时间，为空表示未归档',
+    ADD COLUMN archive_info JSON COMMENT '归档位置: file, offset, length, messages, last_message_at';
+
+-- 首次归档大量消息后可回收表空间（归档任务加 --optimize 参数时自动执行）
+-- OPTIMIZE TABLE chat_messages;
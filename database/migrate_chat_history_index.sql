@@ -0,0 +1,5 @@
+-- 对话历史按会话倒序读取最近N条消息（键集查询 session_id = ? ORDER BY id DESC LIMIT N）
+-- 新的复合索引覆盖原 idx_session 的前缀，删除旧索引以减少写入开销
+ALTER TABLE chat_messages
+    ADD INDEX idx_session_message (session_id, id),
+    DROP INDEX idx_session;
@@ -0,0 +1,5 @@
+-- 会话列表按 (updated_at, id) 倒序键集分页：WHERE user_id = ? AND context_type = ? AND (updated_at, id) < 游标
+-- 新索引覆盖原 idx_user_context 的前缀，删除旧索引以减少写入开销
+ALTER TABLE chat_sessions
+    ADD INDEX idx_user_context_updated (user_id, context_type, updated_at, id),
+    DROP INDEX idx_user_context;
@@ -0,0 +1,4 @@
+-- 不按模块过滤的会话列表分页：WHERE user_id = ? AND (updated_at, id) < 游标 ORDER BY updated_at DESC, id DESC
+-- idx_user_context_updated 的第二列是 context_type，不带 context_type 条件时无法按 updated_at 顺序读取
+ALTER TABLE chat_sessions
+    ADD INDEX idx_user_updated (user_id, updated_at, id);
@@ -0,0 +1,5 @@
+-- 对话滚动摘要：较早的消息合并进会话摘要，提示词只带摘要和最近的消息
+-- summary 字段仍作为会话显示名称使用
+ALTER TABLE chat_sessions
+    ADD COLUMN context_summary TEXT COMMENT '较早对话的滚动摘要，用于构建对话提示词',
+    ADD COLUMN summarized_until_id INT NOT NULL DEFAULT 0 COMMENT '已合并进滚动摘要的最后一条消息ID';
@@ -0,0 +1,16 @@
+-- 创建知识库段落表（段落级检索）
+CREATE TABLE IF NOT EXISTS knowledge_chunks (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    doc_id INT NOT NULL COMMENT '所属文档ID',
+    chunk_index INT NOT NULL COMMENT '段落在文档中的序号',
+    content TEXT NOT NULL COMMENT '段落内容',
+    start_offset INT NOT NULL COMMENT '段落在原文中的起始字符偏移',
+    end_offset INT NOT NULL COMMENT '段落在原文中的结束字符偏移',
+    token_count INT DEFAULT 0 COMMENT '估算token数',
+    position_category VARCHAR(100) COMMENT '岗位类别',
+    embedding_vector JSON COMMENT '段落向量',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_doc_chunk (doc_id, chunk_index),
+    INDEX idx_position (position_category),
+    FOREIGN KEY (doc_id) REFERENCES knowledge_base(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='知识库段落表';
@@ -0,0 +1,9 @@
+-- 创建知识库索引变更日志表（向量索引增量同步）
+CREATE TABLE IF NOT EXISTS knowledge_index_log (
+    id INT AUTO_INCREMENT PRIMARY KEY COMMENT '自增ID，即索引代数',
+    doc_id INT NOT NULL COMMENT '变更的文档ID（文档删除后仍保留）',
+    position_category VARCHAR(100) COMMENT '变更前后涉及的岗位类别',
+    operation VARCHAR(20) NOT NULL COMMENT '变更类型：upsert/delete',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_doc (doc_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='知识库索引变更日志表';
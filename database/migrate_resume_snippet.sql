@@ -0,0 +1,4 @@
+-- 简历摘要：保存简历时渲染一次，对话和出题提示词直接使用
+-- 已有简历的摘要在首次使用时渲染并回填
+ALTER TABLE resumes
+    ADD COLUMN context_snippet TEXT COMMENT '保存时渲染的简历摘要，供各类提示词直接使用';
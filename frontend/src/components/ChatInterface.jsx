@@ -19,6 +19,8 @@ function ChatInterface({
   const [sessionId, setSessionId] = useState(null)
   const [recommendations, setRecommendations] = useState([])
   const [savedSessions, setSavedSessions] = useState([])
+  const [sessionsCursor, setSessionsCursor] = useState(null)
+  const [loadingMoreSessions, setLoadingMoreSessions] = useState(false)
   const [showSessionList, setShowSessionList] = useState(false)
   const [sessionName, setSessionName] = useState('')
   const [showSaveDialog, setShowSaveDialog] = useState(false)
@@ -147,19 +149,25 @@ function ChatInterface({
     }
   }
 
-  const loadSavedSessions = async () => {
+  // 会话列表分页加载：不传cursor时重新加载第一页，传入上一页的next_cursor时追加下一页
+  const loadSavedSessions = async (cursor = null) => {
     try {
       const token = localStorage.getItem('token')
       if (!token) return
 
+      if (cursor) setLoadingMoreSessions(true)
       const response = await axios.get(`${API_BASE_URL}/chat/sessions`, {
         headers: { Authorization: `Bearer ${token}` },
-        params: { context_type: contextType },
+        params: cursor ? { context_type: contextType, cursor } : { context_type: contextType },
         timeout: 10000
       })
-      setSavedSessions(response.data.sessions || [])
+      const sessions = response.data.sessions || []
+      setSavedSessions(prev => (cursor ? [...prev, ...sessions] : sessions))
+      setSessionsCursor(response.data.next_cursor || null)
     } catch (error) {
       console.error('加载会话列表失败:', error)
+    } finally {
+      setLoadingMoreSessions(false)
     }
   }
 
@@ -424,6 +432,15 @@ function ChatInterface({
                     <div className="session-time">{new Date(session.updated_at).toLocaleString()}</div>
                   </div>
                 ))}
+                {sessionsCursor && (
+                  <button
+                    className="load-more-sessions"
+                    onClick={() => loadSavedSessions(sessionsCursor)}
+                    disabled={loadingMoreSessions}
+                  >
+                    {loadingMoreSessions ? '加载中...' : '加载更多'}
+                  </button>
+                )}
               </div>
             )}
           </div>